@@ -0,0 +1,259 @@
+# synthetic clash royale api payloads (players, clans, cards, rankings, battlelogs) for offline benchmarks
+# payloads are built on request from (seed, player index), so a 10k+ player population needs no upfront generation;
+# recorded api responses (--record) can stand in as templates so synthetic payloads carry the real field set / size:
+#     python -m benchmarks.api_fixtures --record benchmarks/fixtures/recorded.json --players 20
+
+# set up environment
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import base64
+import copy
+import json
+import os
+import random
+
+battle_time_format = '%Y%m%dT%H%M%S.000Z' # api battleTime format
+epoch = datetime(2024, 1, 1, tzinfo=timezone.utc) # battle slot grid origin; slots are fixed in time, so new battles appear as time passes
+activity_minutes = [4, 8, 20, 60, 240] # minutes between battles, cycled over player pairs (very active -> mostly idle)
+
+# fallback templates shaped like live api responses; replaced by recorded responses when fixtures are given
+default_templates = {
+    'player': {'tag': '', 'name': '', 'expLevel': 60, 'trophies': 9000, 'bestTrophies': 9500, 'wins': 0, 'losses': 0,
+               'battleCount': 0, 'threeCrownWins': 4000, 'challengeCardsWon': 20000, 'challengeMaxWins': 20,
+               'tournamentCardsWon': 0, 'tournamentBattleCount': 300, 'role': 'member', 'donations': 120,
+               'donationsReceived': 80, 'totalDonations': 90000, 'warDayWins': 100, 'clanCardsCollected': 50000,
+               'arena': {'id': 54000031, 'name': 'Legendary Arena'}, 'currentDeck': [], 'currentFavouriteCard': {}},
+    'clan': {'tag': '', 'name': '', 'type': 'inviteOnly', 'description': 'synthetic benchmark clan', 'badgeId': 16000000,
+             'clanScore': 70000, 'clanWarTrophies': 3000, 'location': {'id': 57000000, 'name': 'International', 'isCountry': False},
+             'requiredTrophies': 8000, 'donationsPerWeek': 4000, 'clanChestLevel': 1, 'clanChestMaxLevel': 0,
+             'members': 0, 'memberList': []},
+    'battle': {'type': 'pathOfLegend', 'battleTime': '', 'isLadderTournament': False,
+               'arena': {'id': 54000031, 'name': 'Legendary Arena'},
+               'gameMode': {'id': 72000464, 'name': 'Ranked1v1_NewArena2'}, 'deckSelection': 'collection',
+               'leagueNumber': 7, 'isHostedMatch': False, 'team': [{}], 'opponent': [{}]}
+}
+
+# create class to serve a deterministic synthetic api population
+# shared_every: every nth battle slot of a player pair is played between the pair (appears in both battlelogs)
+# missing_every: every nth player answers 404 like a deleted / banned account (0 = none)
+class SyntheticApi:
+    def __init__(self, n_players=260, n_cards=121, battles_per_log=30, members_per_clan=25, shared_every=10,
+                 missing_every=0, seed=0, now=None, fixtures=None):
+        self.n_players = n_players
+        self.battles_per_log = battles_per_log
+        self.members_per_clan = members_per_clan
+        self.shared_every = shared_every
+        self.missing_every = missing_every
+        self.seed = seed
+        self.now = now # None follows the wall clock
+        self.templates = dict(default_templates)
+        self.rankings_cache = {}
+
+        if fixtures:
+            self.templates.update(load_templates(fixtures))
+
+        rng = random.Random(seed)
+        self.cards = [{'name': f'synthetic_card_{i}', 'id': 26000000 + i, 'maxLevel': 16, 'rarity': rng.choice(['common', 'rare', 'epic', 'legendary']),
+                       'elixirCost': rng.randint(1, 9), 'iconUrls': {'medium': f'https://api-assets.clashroyale.com/cards/300/{i}.png'},
+                       **({'maxEvolutionLevel': 1} if i % 12 == 0 else {})
+                      } for i in range(n_cards)]
+
+    # || IDENTITIES || #
+
+    def player_tag(self, i):
+        return f'#SYN{i:06d}'
+
+    def clan_tag(self, c):
+        return f'#SYNC{c:05d}'
+
+    def player_tags(self, url_encoded=False):
+        tags = [self.player_tag(i) for i in range(self.n_players)]
+        return [t.replace('#', '%23') for t in tags] if url_encoded else tags
+
+    def player_index(self, tag):
+        tag = tag.replace('%23', '#')
+        if not tag.startswith('#SYN') or not tag[4:].isdigit():
+            return None
+        i = int(tag[4:])
+        return i if i < self.n_players else None
+
+    def is_missing(self, i):
+        return bool(self.missing_every) and i % self.missing_every == self.missing_every - 1
+
+    # || PAYLOADS || #
+
+    def card_payload(self):
+        return {'items': self.cards, 'supportItems': []}
+
+    def deck(self, rng):
+        return [{**self.cards[c], 'level': rng.randint(13, 16), 'starLevel': rng.randint(0, 3)}
+                for c in rng.sample(range(len(self.cards)), 8)]
+
+    def player_payload(self, i):
+        rng = random.Random(f'{self.seed}-player-{i}')
+        player = copy.deepcopy(self.templates['player'])
+        wins, losses = rng.randint(5000, 20000), rng.randint(3000, 15000)
+        player.update({'tag': self.player_tag(i), 'name': f'synthetic_player_{i}', 'expLevel': rng.randint(50, 80),
+                       'trophies': rng.randint(8000, 10000), 'bestTrophies': 10000, 'wins': wins, 'losses': losses,
+                       'battleCount': wins + losses + rng.randint(0, 2000), 'challengeMaxWins': rng.randint(0, 20),
+                       'clan': {'tag': self.clan_tag(i // self.members_per_clan), 'name': f'synthetic_clan_{i // self.members_per_clan}',
+                                'badgeId': 16000000},
+                       'currentDeck': self.deck(rng)})
+        return player
+
+    def clan_payload(self, c):
+        members = range(c * self.members_per_clan, min((c + 1) * self.members_per_clan, self.n_players))
+        rng = random.Random(f'{self.seed}-clan-{c}')
+        clan = copy.deepcopy(self.templates['clan'])
+        clan.update({'tag': self.clan_tag(c), 'name': f'synthetic_clan_{c}', 'badgeId': 16000000 + c % 200,
+                     'clanScore': rng.randint(50000, 90000), 'clanWarTrophies': rng.randint(1000, 5000),
+                     'requiredTrophies': rng.choice([6000, 7000, 8000]), 'members': len(members),
+                     'memberList': [{'tag': self.player_tag(i), 'name': f'synthetic_player_{i}', 'role': 'member',
+                                     'expLevel': 60, 'trophies': 9000, 'clanRank': rank + 1, 'donations': 100
+                                    } for rank, i in enumerate(members)]})
+        return clan
+
+    def side(self, rng, tag, crowns, opp_crowns):
+        return {'tag': tag, 'name': tag.replace('#', 'player_'), 'startingTrophies': rng.randint(2000, 3000),
+                'trophyChange': 30 if crowns > opp_crowns else -30, 'crowns': crowns,
+                'kingTowerHitPoints': 0 if opp_crowns == 3 else rng.randint(1, 4824),
+                'princessTowersHitPoints': [rng.randint(1, 3052) for _ in range(2 - min(opp_crowns, 2))],
+                'clan': {'tag': '#SYNCLAN', 'name': 'synthetic', 'badgeId': 16000000},
+                'cards': self.deck(rng), 'supportCards': [{'name': 'Tower Princess', 'id': 159000000, 'level': 16}],
+                'globalRank': rng.choice([None, rng.randint(1, 10000)]), 'elixirLeaked': round(rng.random() * 5, 2)}
+
+    # battle slot j of player i; a shared slot is generated once per pair and mirrored into both battlelogs
+    def battle(self, i, j, battle_time):
+        partner = i ^ 1 if (i ^ 1) < self.n_players else None
+        shared = partner is not None and self.shared_every and j % self.shared_every == 0
+        key = f'pair-{i // 2}' if shared else f'player-{i}'
+        rng = random.Random(f'{self.seed}-{key}-{j}')
+
+        first, second = (min(i, partner), max(i, partner)) if shared else (i, None)
+        second_tag = self.player_tag(second) if shared else f'#OPP{rng.randint(0, 10**7):07d}'
+        crowns, opp_crowns = rng.choice([(1, 0), (3, 1), (0, 1), (2, 2), (1, 3), (3, 0)])
+        sides = [self.side(rng, self.player_tag(first), crowns, opp_crowns), self.side(rng, second_tag, opp_crowns, crowns)]
+        if i != first:
+            sides.reverse() # the battlelog owner is always the team side
+
+        battle = copy.deepcopy(self.templates['battle'])
+        battle.update({'type': 'PvP' if j % 5 == 4 else 'pathOfLegend', # every 5th battle is unranked (filtered by parsing)
+                       'battleTime': battle_time.strftime(battle_time_format),
+                       'team': [sides[0]], 'opponent': [sides[1]]})
+        return battle
+
+    # latest battles_per_log battles up to now, newest first (like the live battlelog endpoint)
+    def battlelog_payload(self, i):
+        now = self.now or datetime.now(timezone.utc)
+        spacing = timedelta(minutes=activity_minutes[(i // 2) % len(activity_minutes)])
+        offset = timedelta(seconds=(i // 2) * 37 % int(spacing.total_seconds())) # pairs share a slot grid
+        last_slot = int((now - epoch - offset) / spacing)
+        return [self.battle(i, j, epoch + offset + j * spacing)
+                for j in range(last_slot, max(last_slot - self.battles_per_log, -1), -1)]
+
+    # every player ranked each season (season-seeded order); paged with limit / after cursors like the live endpoint
+    def rankings_payload(self, season_id, limit=None, after=None):
+        if season_id not in self.rankings_cache:
+            order = list(range(self.n_players))
+            random.Random(f'{self.seed}-season-{season_id}').shuffle(order)
+            self.rankings_cache[season_id] = order
+
+        order = self.rankings_cache[season_id]
+        start = json.loads(base64.urlsafe_b64decode(after + '=' * (-len(after) % 4)))['pos'] if after else 0
+        end = min(start + (limit or len(order)), len(order))
+        items = [{'tag': self.player_tag(i), 'name': f'synthetic_player_{i}', 'expLevel': 60,
+                  'eloRating': 4000 - rank // 3, 'rank': rank + 1,
+                  'clan': {'tag': self.clan_tag(i // self.members_per_clan), 'name': f'synthetic_clan_{i // self.members_per_clan}', 'badgeId': 16000000}
+                 } for rank, i in zip(range(start, end), order[start:end])]
+
+        cursors = {}
+        if end < len(order):
+            cursors['after'] = base64.urlsafe_b64encode(json.dumps({'pos': end}).encode()).decode().rstrip('=')
+        return {'items': items, 'paging': {'cursors': cursors}}
+
+    # || ROUTING || #
+
+    # create function to answer one api request path; returns (status code, json body)
+    def route(self, path):
+        url = urlsplit(path)
+        parts = url.path.strip('/').split('/')
+        if parts and parts[0] == 'v1':
+            parts = parts[1:] # tolerate base urls that include the api version
+
+        not_found = (404, {'reason': 'notFound'})
+        if parts == ['cards']:
+            return 200, self.card_payload()
+
+        if len(parts) in (2, 3) and parts[0] == 'players':
+            i = self.player_index(parts[1])
+            if i is None or self.is_missing(i):
+                return not_found
+            if len(parts) == 3:
+                return (200, self.battlelog_payload(i)) if parts[2] == 'battlelog' else not_found
+            return 200, self.player_payload(i)
+
+        if len(parts) == 2 and parts[0] == 'clans':
+            tag = parts[1].replace('%23', '#')
+            if not tag.startswith('#SYNC') or not tag[5:].isdigit() or int(tag[5:]) * self.members_per_clan >= self.n_players:
+                return not_found
+            return 200, self.clan_payload(int(tag[5:]))
+
+        if len(parts) == 6 and parts[:3] == ['locations', 'global', 'pathoflegend'] and parts[4:] == ['rankings', 'players']:
+            query = parse_qs(url.query)
+            limit = int(query['limit'][0]) if 'limit' in query else None
+            return 200, self.rankings_payload(parts[3], limit, query.get('after', [None])[0])
+
+        return not_found
+
+# create function to read recorded responses ({path: json body}) into payload templates
+def load_templates(fixtures_path):
+    with open(fixtures_path) as f:
+        recorded = json.load(f)
+
+    templates = {}
+    for path, body in recorded.items():
+        if path.endswith('/battlelog'):
+            ranked = [b for b in body if b.get('type') == 'pathOfLegend']
+            if ranked:
+                templates['battle'] = ranked[0]
+        elif path.startswith('/players/'):
+            templates['player'] = body
+        elif path.startswith('/clans/'):
+            templates['clan'] = body
+    return templates
+
+# create function to record live api responses for the top players of a season (needs a real api key)
+def record_fixtures(path, n_players, season_id):
+    from src.api_extract import client # imported here so building synthetic payloads never needs api credentials
+
+    recorded = {}
+    def fetch(request_path):
+        response = client.get(request_path)
+        if response.status_code == 200:
+            recorded[request_path] = response.json()
+        return recorded.get(request_path)
+
+    fetch('/cards')
+    rankings = fetch(f'/locations/global/pathoflegend/{season_id}/rankings/players?limit={n_players}') or {'items': []}
+    for item in rankings['items']:
+        tag = item['tag'].replace('#', '%23')
+        player = fetch(f'/players/{tag}')
+        fetch(f'/players/{tag}/battlelog')
+        if player and player.get('clan'):
+            fetch(f"/clans/{player['clan']['tag'].replace('#', '%23')}")
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(recorded, f)
+    print(f'Recorded {len(recorded)} responses to {path}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record live api responses to use as synthetic payload templates.')
+    parser.add_argument('--record', required=True, help='output json file')
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--season', default=(datetime.now(timezone.utc) - timedelta(days=35)).strftime('%Y-%m'),
+                        help='completed season to take players from (default: roughly last month)')
+    args = parser.parse_args()
+
+    record_fixtures(args.record, args.players, args.season)
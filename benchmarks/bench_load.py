@@ -0,0 +1,60 @@
+# benchmark load-stage throughput (upserts, matches insert with returned ids, match_cards insert) across storage backends
+# each config must point at a SCRATCH database; --create-schema rebuilds all tables first (drops existing data):
+#     python -m benchmarks.bench_load --configs configs/bench_sqlite.json configs/bench_mssql.json --create-schema
+
+# set up environment
+from benchmarks.synthetic import synthetic_cards, synthetic_matches, synthetic_players, synthetic_seasons
+from src.db_ops import (create_schema, get_engine, insert_match_cards, insert_matches, insert_new_rows, upsert_card_info,
+                        upsert_player_info
+)
+import pandas as pd
+import argparse
+import time
+
+# create function to time one loader call; returns (seconds, loader result)
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+# create function to run every loader once against one engine
+def bench_backend(engine, n_players, n_matches):
+    players = synthetic_players(n_players)
+    cards = synthetic_cards()
+    matches, match_cards = synthetic_matches(players, n_matches, cards)
+    results = []
+
+    def record(step, rows, secs):
+        results.append({'backend': engine.dialect.name, 'step': step, 'rows': rows,
+                        'secs': round(secs, 3), 'rows_per_sec': round(rows / secs) if secs else None})
+
+    record('seasons', 1, timed(insert_new_rows, engine, synthetic_seasons(), 'seasons', 'multi')[0])
+    record('players upsert', n_players, timed(upsert_player_info, engine, players)[0])
+    record('cards upsert', len(cards), timed(upsert_card_info, engine, cards)[0])
+
+    secs, match_key_map = timed(insert_matches, engine, matches)
+    record('matches insert', n_matches, secs)
+
+    match_cards = match_cards.merge(match_key_map, on='match_key').merge(matches[['match_key', 'season_id', 'is_win']], on='match_key')
+    record('match_cards insert', len(match_cards), timed(insert_match_cards, engine, match_cards)[0])
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare load-stage throughput across storage backends.')
+    parser.add_argument('--configs', nargs='+', required=True, help='db config json per backend (scratch databases)')
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--matches', type=int, default=20000)
+    parser.add_argument('--create-schema', action='store_true', help='rebuild all tables before loading')
+    args = parser.parse_args()
+
+    results = []
+    for config_path in args.configs:
+        engine = get_engine(config_path)
+        if args.create_schema:
+            create_schema(engine)
+        results.extend(bench_backend(engine, args.players, args.matches))
+
+    print(pd.DataFrame(results).to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+# offline benchmark suite: times extractors, season mapping and db loaders against a synthetic api population served by
+# benchmarks/stub_server.py (in a separate process, so serving payloads does not compete with the code being timed)
+# every population loads into its own scratch sqlite database; --e2e also runs the full pipeline against the stub:
+#     python -m benchmarks.bench_suite --players 260 1000 10000 --e2e --out bench_results.json
+# --parse-workers times battlelog parsing (raw bytes -> matches / match_cards dfs) in-process and on 1..n worker processes:
+#     python -m benchmarks.bench_suite --players 10000 --parse-workers 1 2 4 8
+
+# set up environment
+from benchmarks.api_fixtures import SyntheticApi
+from src.api_client import ApiClient, TokenBucket
+from src.api_extract import (build_matches, get_card_info, get_clan_info, get_match_card_info, get_matches_info, get_player_info,
+                             parse_battlelog
+)
+from src.parallel_parse import BattlelogParser
+from src.helper_functions import SeasonCalendar, battle_time_to_sid
+from src.db_ops import (create_schema, get_engine, insert_match_cards, insert_matches, insert_new_rows, upsert_card_info, upsert_clan_info,
+                        upsert_player_info
+)
+import pandas as pd
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# create function to time one call; returns (seconds, result)
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+# create function to start the stub server in a child process; returns (process, base url)
+def start_stub(n_players, latency_ms=0, fixtures=None):
+    command = [sys.executable, '-m', 'benchmarks.stub_server', '--players', str(n_players), '--port', '0',
+               '--latency-ms', str(latency_ms)] + (['--fixtures', fixtures] if fixtures else [])
+    process = subprocess.Popen(command, cwd=project_root, stdout=subprocess.PIPE, text=True)
+    first_line = process.stdout.readline() # 'Serving n synthetic players at <url>'
+    if not first_line:
+        raise RuntimeError('Stub server failed to start')
+    return process, first_line.split()[-1]
+
+# create function to write a scratch sqlite db config and return (engine, config path)
+def scratch_engine(directory, name):
+    config_path = os.path.join(directory, f'{name}.json')
+    with open(config_path, 'w') as f:
+        json.dump({'backend': 'sqlite', 'sqlite_path': os.path.join(directory, f'{name}.db')}, f)
+    engine = get_engine(config_path)
+    create_schema(engine)
+    return engine, config_path
+
+# create function to run per-function benchmarks for one population size
+def bench_functions(n_players, url, directory, args):
+    client = ApiClient(url, {}, rate_limit=args.rate_limit, max_workers=args.workers)
+    api = SyntheticApi(n_players, fixtures=args.fixtures) # same population as the stub, for untimed local payloads
+    calendar = SeasonCalendar()
+    player_ids = api.player_tags(url_encoded=True)
+    results = []
+
+    def record(group, step, rows, secs):
+        results.append({'players': n_players, 'group': group, 'step': step, 'rows': rows,
+                        'secs': round(secs, 3), 'rows_per_sec': round(rows / secs) if secs else None})
+
+    # extract (http round trip + parsing)
+    secs, (players, _, _) = timed(get_player_info, player_ids, client=client)
+    record('extract', 'get_player_info', len(players), secs)
+    clan_ids = players['clan_id'].dropna().str.replace('#', '%23').unique().tolist()
+    secs, (clans, _) = timed(get_clan_info, clan_ids, client=client)
+    record('extract', 'get_clan_info', len(clans), secs)
+    secs, cards = timed(get_card_info, client=client)
+    record('extract', 'get_card_info', len(cards), secs)
+    secs, (matches, match_cards, _) = timed(get_matches_info, player_ids, client=client, calendar=calendar)
+    record('extract', 'get_matches_info', len(matches), secs)
+
+    # transform (no http)
+    card_rows = [row for i in range(n_players) for _, rows in parse_battlelog(api.battlelog_payload(i)) for row in rows]
+    secs, _ = timed(get_match_card_info, card_rows)
+    record('transform', 'get_match_card_info', len(card_rows), secs)
+
+    sample = matches['battle_time'].head(args.sid_sample) # scalar mapping rebuilds the calendar per call, so only a sample is timed
+    secs, _ = timed(lambda: sample.apply(battle_time_to_sid))
+    record('transform', 'battle_time_to_sid', len(sample), secs)
+    secs, _ = timed(calendar.assign, matches['battle_time'])
+    record('transform', 'SeasonCalendar.assign', len(matches), secs)
+
+    # load (scratch sqlite db)
+    engine, _ = scratch_engine(directory, f'functions_{n_players}')
+    seasons = pd.concat([calendar.completed(), calendar.current()], ignore_index=True).drop_duplicates(subset='season_id')
+    insert_new_rows(engine, seasons, 'seasons', 'multi')
+    secs, _ = timed(upsert_clan_info, engine, clans)
+    record('load', 'upsert_clan_info', len(clans), secs)
+    secs, _ = timed(upsert_player_info, engine, players)
+    record('load', 'upsert_player_info', len(players), secs)
+    secs, _ = timed(upsert_card_info, engine, cards)
+    record('load', 'upsert_card_info', len(cards), secs)
+    secs, match_key_map = timed(insert_matches, engine, matches)
+    record('load', 'insert_matches', len(matches), secs)
+    match_cards = match_cards.merge(match_key_map, on='match_key').merge(matches[['match_key', 'season_id', 'is_win']], on='match_key')
+    secs, _ = timed(insert_match_cards, engine, match_cards)
+    record('load', 'insert_match_cards', len(match_cards), secs)
+
+    client.close()
+    return results
+
+# create function to time parsing every battlelog of a population from raw response bytes, in-process (json + one
+# thread) and on each number of parse worker processes; pool start-up is not timed, as a pool is kept across runs
+def bench_parse(n_players, args):
+    api = SyntheticApi(n_players, fixtures=args.fixtures)
+    calendar = SeasonCalendar()
+    tags = api.player_tags()
+    tracked = set(tags)
+    payloads = [(tag, None, json.dumps(api.battlelog_payload(i)).encode()) for i, tag in enumerate(tags)]
+    results = []
+
+    def record(step, rows, secs):
+        results.append({'players': n_players, 'group': 'parse', 'step': step, 'rows': rows,
+                        'secs': round(secs, 3), 'rows_per_sec': round(rows / secs) if secs else None})
+
+    def in_process():
+        matches_info, card_rows, seen = [], [], set()
+        for _, watermark, raw in payloads:
+            for match_row, rows in parse_battlelog(json.loads(raw), watermark=watermark, tracked=tracked, seen=seen):
+                matches_info.append(match_row)
+                card_rows.extend(rows)
+        return build_matches(matches_info, calendar), get_match_card_info(card_rows)
+
+    secs, (matches, _) = timed(in_process)
+    record('in-process', len(matches), secs)
+
+    for workers in args.parse_workers:
+        parser = BattlelogParser(workers)
+        def parallel():
+            batch = parser.batch(tracked=tracked)
+            for payload in payloads:
+                batch.add(*payload)
+            match_rows, card_rows, _, _ = batch.results()
+            return build_matches(match_rows, calendar), get_match_card_info(card_rows)
+        secs, (matches, _) = timed(parallel)
+        record(f'{workers} worker(s)', len(matches), secs)
+        parser.close()
+    return results
+
+# create function to run the whole pipeline against the stub: run 1 fills an empty db (battlelogs of the players its rankings
+# stage stored included), run 2 is an incremental run; tracked players are capped by the ranking depth (CR_RANKING_DEPTH,
+# top 100 by default)
+def bench_e2e(n_players, url, directory, args):
+    engine, config_path = scratch_engine(directory, f'e2e_{n_players}')
+    os.environ.setdefault('CR_DB_CONFIG', config_path) # lets the pipeline module import without configs/config.json
+    os.environ.setdefault('CR_LOG_DIR', os.path.join(directory, 'logs'))
+    import etl_pipeline_script as etl
+    import src.api_extract as api_extract
+    import src.metrics as run_metrics
+
+    # point the pipeline's module-level state at scratch locations so the repo's own files are never touched
+    dropped_path = os.path.join(directory, 'dropped_players.json')
+    with open(dropped_path, 'w') as f:
+        json.dump([], f)
+    etl.engine = engine
+    etl.dropped_players_path = api_extract.dropped_players_path = dropped_path
+    etl.entity_cache_path = os.path.join(directory, f'entity_cache_{n_players}.json')
+    etl.spool_dir = os.path.join(directory, f'spool_{n_players}')
+    etl.retry_queue_path = os.path.join(etl.spool_dir, 'retry_queue.json')
+    etl.archive_dir = os.path.join(directory, f'archive_{n_players}')
+    etl.extract_dir = os.path.join(directory, f'extract_{n_players}')
+    run_metrics.metrics_dir = os.path.join(directory, 'metrics')
+    api_extract.client.base_url = url
+    api_extract.client.limiter = TokenBucket(args.rate_limit)
+
+    results = []
+    for step in ['run 1 (empty db)', 'run 2']:
+        secs, _ = timed(etl.run_etl_script, max_workers=args.stage_workers)
+        with engine.connect() as conn:
+            rows = pd.read_sql('SELECT COUNT(*) AS n FROM matches', conn)['n'].iloc[0]
+        results.append({'players': n_players, 'group': 'e2e', 'step': step, 'rows': int(rows),
+                        'secs': round(secs, 3), 'rows_per_sec': None})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks against a synthetic api population.')
+    parser.add_argument('--players', type=int, nargs='+', default=[260, 1000, 10000], help='population sizes')
+    parser.add_argument('--workers', type=int, default=16, help='api client worker threads')
+    parser.add_argument('--rate-limit', type=float, default=2000, help='requests/sec allowed by the client limiter')
+    parser.add_argument('--latency-ms', type=float, default=0, help='stub delay per request')
+    parser.add_argument('--sid-sample', type=int, default=2000, help='rows timed for the scalar battle_time_to_sid')
+    parser.add_argument('--fixtures', help='recorded responses used as payload templates')
+    parser.add_argument('--e2e', action='store_true', help='also time full pipeline runs against the stub')
+    parser.add_argument('--stage-workers', type=int, default=4, help='pipeline stages running at once (e2e)')
+    parser.add_argument('--parse-workers', type=int, nargs='+', help='also time battlelog parsing on these numbers of processes')
+    parser.add_argument('--out', help='write results as json')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for n_players in args.players:
+            process, url = start_stub(n_players, args.latency_ms, args.fixtures)
+            try:
+                results.extend(bench_functions(n_players, url, directory, args))
+                if args.parse_workers:
+                    results.extend(bench_parse(n_players, args))
+                if args.e2e:
+                    results.extend(bench_e2e(n_players, url, directory, args))
+            finally:
+                process.terminate()
+                process.wait()
+
+    results = pd.DataFrame(results)
+    print(results.to_string(index=False))
+    if args.out:
+        results.to_json(args.out, orient='records', indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# benchmark row-by-row MERGE vs staging-table bulk upsert on the players table
+# run from project root against a SCRATCH database built with sql/db_creation_script.sql (rows are deleted between runs),
+# or a sqlite config ("backend": "sqlite") to measure locally:
+#     python -m benchmarks.bench_upsert --config configs/bench_config.json --sizes 1000 10000 100000
+
+# set up environment
+from benchmarks.synthetic import synthetic_players
+from src.db_ops import get_engine, upsert_player_info
+from sqlalchemy import text
+import pandas as pd
+import argparse
+import time
+
+# create function to delete synthetic players (and rows referencing them) left by earlier benchmark runs
+def clear_bench_players(engine):
+    with engine.begin() as conn:
+        for table in ['player_watermarks', 'match_cards', 'matches', 'season_rankings', 'players']:
+            conn.execute(text(f"DELETE FROM {table} WHERE player_id LIKE '#BENCH%'"))
+
+# create function to time one upsert call
+def time_upsert(engine, df, mode):
+    start = time.perf_counter()
+    upsert_player_info(engine, df, mode=mode)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare row vs bulk upsert throughput on the players table.')
+    parser.add_argument('--config', required=True, help='db config json for a scratch database')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--modes', nargs='+', default=['row', 'bulk'], choices=['row', 'bulk'])
+    args = parser.parse_args()
+
+    engine = get_engine(args.config)
+    results = []
+
+    for n in args.sizes:
+        for mode in args.modes:
+            clear_bench_players(engine)
+
+            insert_secs = time_upsert(engine, synthetic_players(n), mode) # every row is new
+            update_secs = time_upsert(engine, synthetic_players(n, seed=1), mode) # every row already exists
+
+            results.append({'rows': n, 'mode': mode,
+                            'insert_secs': round(insert_secs, 3), 'update_secs': round(update_secs, 3),
+                            'insert_rows_per_sec': round(n / insert_secs), 'update_rows_per_sec': round(n / update_secs)
+            })
+            print(results[-1])
+
+    clear_bench_players(engine)
+
+    print(pd.DataFrame(results).to_string(index=False))
+
+if __name__ == '__main__':
+    main()
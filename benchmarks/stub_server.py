@@ -0,0 +1,107 @@
+# local http stub of the clash royale api serving benchmarks/api_fixtures.py payloads
+# run standalone and point the pipeline at it (configs/config.py: API_SETTINGS = {'base_url': 'http://127.0.0.1:8765'}):
+#     python -m benchmarks.stub_server --players 10000 --port 8765 --latency-ms 40
+
+# set up environment
+from benchmarks.api_fixtures import SyntheticApi
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import threading
+import time
+
+# create class to serve a SyntheticApi over http on a background thread
+# latency adds a fixed delay per request to mimic the round trip to the live api; throttle_rate / error_rate answer that
+# share of requests with 429 (Retry-After: retry_after secs) / 503 instead, to exercise the client's retry path;
+# fail_first answers the first n requests of every path with fail_status instead (deterministic retries for tests)
+# statuses (Counter), connections (client addresses seen) and peak_in_flight record what the server saw
+class StubServer:
+    def __init__(self, api, host='127.0.0.1', port=0, latency=0.0, throttle_rate=0.0, error_rate=0.0, retry_after=1, seed=0,
+                 fail_first=0, fail_status=429):
+        rng = random.Random(seed)
+        stub = self
+        self.lock = threading.Lock()
+        self.statuses, self.path_counts = Counter(), Counter()
+        self.connections = set()
+        self.in_flight = self.peak_in_flight = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # keep-alive, like the live api
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.connections.add(self.client_address)
+                    stub.path_counts[self.path] += 1
+                    attempt = stub.path_counts[self.path]
+                    stub.in_flight += 1
+                    stub.peak_in_flight = max(stub.peak_in_flight, stub.in_flight)
+                status, payload, headers = self.respond(attempt)
+                with stub.lock:
+                    stub.in_flight -= 1
+                    stub.statuses[status] += 1
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def respond(self, attempt):
+                if latency:
+                    time.sleep(latency)
+                roll, headers = rng.random(), {}
+                if attempt <= fail_first:
+                    status, body = fail_status, {'reason': 'requestThrottled' if fail_status == 429 else 'serviceUnavailable'}
+                    if fail_status == 429:
+                        headers['Retry-After'] = str(retry_after)
+                elif roll < throttle_rate:
+                    status, body = 429, {'reason': 'requestThrottled'}
+                    headers['Retry-After'] = str(retry_after)
+                elif roll < throttle_rate + error_rate:
+                    status, body = 503, {'reason': 'serviceUnavailable'}
+                else:
+                    status, body = api.route(self.path)
+                return status, json.dumps(body).encode(), headers
+
+            def log_message(self, format, *args):
+                pass # one line per request would swamp benchmark output
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve synthetic clash royale api payloads locally.')
+    parser.add_argument('--players', type=int, default=260, help='tracked population size')
+    parser.add_argument('--port', type=int, default=8765, help='0 picks a free port')
+    parser.add_argument('--latency-ms', type=float, default=0, help='added delay per request')
+    parser.add_argument('--missing-every', type=int, default=0, help='every nth player answers 404 (0 = none)')
+    parser.add_argument('--throttle-rate', type=float, default=0, help='share of requests answered 429 (Retry-After)')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of requests answered 503')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After secs sent with 429s')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fixtures', help='recorded responses used as payload templates (see benchmarks.api_fixtures)')
+    args = parser.parse_args()
+
+    api = SyntheticApi(args.players, missing_every=args.missing_every, seed=args.seed, fixtures=args.fixtures)
+    stub = StubServer(api, port=args.port, latency=args.latency_ms / 1000, throttle_rate=args.throttle_rate,
+                      error_rate=args.error_rate, retry_after=args.retry_after, seed=args.seed)
+    print(f'Serving {args.players} synthetic players at {stub.url}', flush=True) # first line is read by benchmarks.bench_suite
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+if __name__ == '__main__':
+    main()
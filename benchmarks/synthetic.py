@@ -0,0 +1,72 @@
+# synthetic, schema-matched data for load benchmarks (no api or real database contents needed)
+
+# set up environment
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+# create function to generate n synthetic player rows matching the players table columns
+def synthetic_players(n, seed=0):
+    players = pd.DataFrame({'player_id': [f'#BENCH{i:07d}' for i in range(n)]})
+    players['player_name'] = 'bench_player_' + players.index.astype(str)
+    players['exp_lvl'] = 60
+    players['road_trophies'] = 9000 + (players.index + seed) % 500
+    players['best_road_trophies'] = 9500
+    players['wins'] = 10000 + seed
+    players['losses'] = 8000
+    players['life_time_battles'] = 20000
+    players['max_challenge_wins'] = 20
+    players['clan_id'] = None
+    players['url_encoded_pid'] = players['player_id'].str.replace('#', '%23')
+    return players
+
+# create function to generate a card pool shaped like get_card_info output
+def synthetic_cards(n=121):
+    return pd.DataFrame({'card_id': [str(26000000 + i) for i in range(n)],
+                         'card_name': [f'bench_card_{i}' for i in range(n)],
+                         'rarity': 'common',
+                         'elixir_cost': [i % 10 + 1 for i in range(n)],
+                         'evo_status': False
+    })
+
+# create function to generate a season row covering the synthetic battle times
+def synthetic_seasons(start=datetime(2025, 9, 1, 9, 5)):
+    return pd.DataFrame({'season_id': [start.strftime('%Y-%m')],
+                         'sn_start_date': [pd.Timestamp(start, tz='UTC')],
+                         'sn_end_date': [pd.Timestamp(start + timedelta(days=28) - timedelta(seconds=1), tz='UTC')]
+    })
+
+# create function to generate matches + match_cards frames shaped like get_matches_info output
+def synthetic_matches(players, n_matches, cards, season_id='2025-09', start=datetime(2025, 9, 1, 10), seed=0):
+    rng = np.random.default_rng(seed)
+    player_ids = rng.choice(players['player_id'].to_numpy(), n_matches)
+    battle_times = pd.Series(pd.to_datetime(start) + pd.to_timedelta(np.arange(n_matches) * 7, unit='s')).dt.tz_localize('UTC')
+    crowns = rng.integers(0, 4, n_matches)
+    opp_crowns = rng.integers(0, 4, n_matches)
+
+    matches = pd.DataFrame({'battle_time': battle_times, 'player_id': player_ids})
+    matches.insert(0, 'match_key', matches['battle_time'].astype(str) + '_' + matches['player_id'])
+    matches['is_win'] = crowns > opp_crowns
+    matches['league'] = 7
+    matches['opponent_id'] = '#OPPONENT'
+    matches['season_id'] = season_id
+    matches['current_global_rank'] = rng.integers(1, 1000, n_matches)
+    matches['starting_rating'] = rng.integers(2000, 3000, n_matches)
+    matches['rating_change'] = rng.integers(-40, 40, n_matches)
+    matches['crowns'] = crowns
+    matches['opp_crowns'] = opp_crowns
+    matches['king_tower_hp'] = rng.integers(0, 4825, n_matches)
+    matches['princess_tower1_hp'] = rng.integers(0, 3053, n_matches)
+    matches['princess_tower2_hp'] = rng.integers(0, 3053, n_matches)
+    matches['elixir_leaked'] = rng.random(n_matches).round(2) * 5
+    matches = matches[['match_key', 'battle_time', 'is_win', 'league', 'player_id', 'opponent_id', 'season_id',
+                       'current_global_rank', 'starting_rating', 'rating_change', 'crowns', 'opp_crowns',
+                       'king_tower_hp', 'princess_tower1_hp', 'princess_tower2_hp', 'elixir_leaked']]
+
+    card_ids = cards['card_id'].to_numpy()
+    decks = np.array([rng.choice(card_ids, 8, replace=False) for _ in range(n_matches)])
+    match_cards = pd.DataFrame({'player_id': np.repeat(player_ids, 8),
+                                'card_id': decks.ravel(),
+                                'match_key': np.repeat(matches['match_key'].to_numpy(), 8)
+    })
+    return matches, match_cards
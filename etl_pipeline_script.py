@@ -1,21 +1,46 @@
 # set up environment
 import pandas as pd
-import json
-from src.helper_functions import last_n_completed_seasons, current_plus_n_seasons
-from src.db_ops import (get_engine, get_existing_data, get_match_key_mapping, insert_new_rows,
-                    purge_failed_players, upsert_player_info, upsert_clan_info, upsert_card_info
+from src.helper_functions import SeasonCalendar
+from src.entity_cache import EntityCache
+from src.pipeline import Stage, run_stages, select_stages
+from src.metrics import metrics
+from src.spool import RetryQueue, RunSpool
+from src.archive import BattlelogArchive
+from src.dropped_registry import DroppedRegistry
+from src.deck_analytics import assign_deck_ids
+from src.dashboard_extract import write_extract
+from src.poll_scheduler import PollScheduler, get_battle_rates
+from src.key_sets import KeySets
+from src.parallel_parse import BattlelogParser
+from src.run_cache import run_cache
+from src.status_server import StatusServer
+from src.db_ops import (get_engine, get_existing_keys, get_player_clans, insert_new_rows, insert_match_cards,
+                    insert_matches, purge_failed_players, upsert_player_info, upsert_clan_info, upsert_card_info
 )
-from src.api_extract import (get_season_rankings, get_player_info, get_clan_info, get_card_info, get_matches_info, 
-                         get_match_card_info
+from src.api_extract import (client, iter_season_rankings, get_player_info, get_clan_info, get_card_info, get_matches_info,
+                             ranking_depth
 )
-from datetime import datetime
+from datetime import datetime, timedelta
+import argparse
 import logging
 import os
+import time
 
 # define required file paths
 project_root = os.path.dirname(os.path.abspath(__file__))
 dropped_players_path = os.path.join(project_root, 'dropped_data', 'dropped_players.json')
-log_dir = os.path.join(project_root, 'logs', 'etl_logs')
+log_dir = os.environ.get('CR_LOG_DIR', os.path.join(project_root, 'logs', 'etl_logs'))
+entity_cache_path = os.path.join(project_root, 'cache', 'entity_cache.json')
+spool_dir = os.path.join(project_root, 'spool') # raw api responses per run (resume point for interrupted runs)
+retry_queue_path = os.path.join(spool_dir, 'retry_queue.json')
+archive_dir = os.path.join(project_root, 'archive', 'battlelogs') # raw battles, parquet partitioned by season_id
+poll_state_path = os.path.join(project_root, 'cache', 'poll_state.json') # last battlelog poll per player (--poll mode)
+extract_dir = os.path.join(project_root, 'extract') # dashboard extract, parquet partitioned by season_id
+
+historical_clan_ttl = timedelta(days=7) # clans no tracked player is currently in are re-fetched at most weekly
+player_ttl = timedelta(hours=float(os.environ.get('CR_PLAYER_TTL_HOURS', 20))) # player profiles are re-fetched at most about daily
+dropped_reverify_ttl = timedelta(days=30) # dropped players are re-checked monthly in case an account comes back
+parse_workers = int(os.environ.get('CR_PARSE_WORKERS', 0)) # battlelog parse processes (0 = parse on the fetching thread)
 
 # store script run logs
 os.makedirs(log_dir, exist_ok=True) # makes a folder to store logs
@@ -28,19 +53,33 @@ logging.basicConfig( #etl step results, errors, warnings are documented in a log
     handlers=[logging.FileHandler(log_path), logging.StreamHandler()] # sends to etl log and stdout for later cron log
 )
 
-engine = get_engine()
+engine = get_engine(os.environ.get('CR_DB_CONFIG')) # defaults to configs/config.json
 
-# function to run entire etl pipeline
-def run_etl_script():
-    logging.info('Starting ETL pipeline')
+# || PIPELINE STAGES || #
+# each stage reads / writes a shared run context (ctx); dependencies follow the db foreign keys
 
-    # 1) populate seasons table db table - must populate before all other tables
-    past_df = last_n_completed_seasons(n=3)
-    current_df = current_plus_n_seasons(n=0)
+battlelog_parser = None # worker pool, started with the first run and kept for later runs of a long-lived process
+
+def get_battlelog_parser():
+    global battlelog_parser
+    if parse_workers and battlelog_parser is None:
+        battlelog_parser = BattlelogParser(parse_workers)
+    return battlelog_parser
+
+# api client for one fetch kind; raw responses are spooled for the run and replayed instead of re-fetched on --resume,
+# and repeated single requests within the run (e.g. a season leaderboard read by two stages) are served from the run cache
+def fetch_client(ctx, kind):
+    return run_cache.client(ctx['spool'].client(kind, client))
+
+# 1) populate seasons table db table - must populate before all other tables
+def seasons_stage(ctx):
+    calendar = ctx['calendar']
+    past_df = calendar.completed()
+    current_df = calendar.current()
     past_and_current_df = pd.concat([past_df, current_df], ignore_index=True).drop_duplicates(subset='season_id') # get current season and last 3 completed seasons
 
     past_and_current_ids = past_and_current_df['season_id'].tolist()
-    existing_seasons = set(get_existing_data(engine, 'season_id', 'seasons')) # checking db for already stored seasons; convert to set for fast membership checking
+    existing_seasons = ctx['keys'].get('seasons', 'season_id') # already stored seasons, as a set for fast membership checking
     all_new_seasons = [s for s in past_and_current_ids if s not in existing_seasons] # initial run will insert last 3 complete sns + current,
                                                                                     # subsequent runs insert newest, current sn, if not yet added 
 
@@ -48,112 +87,416 @@ def run_etl_script():
         season_add_df = past_and_current_df[past_and_current_df['season_id'].isin(all_new_seasons)]
         logging.info(f'New seasons to fetch: {all_new_seasons}.')
         insert_new_rows(engine, season_add_df, 'seasons', 'multi') # populate seasons with new seasons data
+        ctx['keys'].add('seasons', 'season_id', all_new_seasons)
         logging.info(f'Inserted {len(season_add_df)} new seasons.')
+        return len(season_add_df)
     else:
         logging.info('No new seasons to add')
 
-    # 2) populate clans db table - must populate before players to respect db foreign key constraint (fk)
-    all_existing_past_seasons_ids = get_existing_data(engine, 'season_id', 'seasons')[:-1] # splice to remove current season
-    season_ranking_df = get_season_rankings(all_existing_past_seasons_ids)
-    tracked_players = season_ranking_df['player_id'].unique().tolist() # this will pick up players who are recently terminated or banned after ranking, later filtered out
-    tracked_players = [p.replace('#', '%23') for p in tracked_players]
-
-    player_df, failed_players = get_player_info(tracked_players) # clans to ping are driven by the data that will populate players table later
-
-    with open(dropped_players_path, 'r') as f:
-        existing_dropped = json.load(f) # load current dropped list
-
-    updated_dropped = list(set(existing_dropped + failed_players))
-
-    with open(dropped_players_path, 'w') as f:
-        json.dump(updated_dropped, f) # write failed players (banned or deleted players) into a dropped list to skip pings for in future runs
-    logging.warning(f'Added {len(failed_players)} player(s) into dropped list.')
-
-    current_membership = player_df['clan_id'].dropna().unique().tolist() # track clans top players are currently in
-    existing_clans = get_existing_data(engine, 'clan_id', 'clans') # track historical clans (where top players have been in) too
-    all_tracked_clans = list(set(current_membership + existing_clans))
+# fetch tracked players (ranked in stored past seasons); clans to ping are driven by this data
+def fetch_tracked_players(ctx):
+    dropped = ctx['dropped']
+    reverify_dropped(ctx)
+
+    all_existing_past_seasons_ids = sorted(ctx['keys'].get('seasons', 'season_id'))[:-1] # splice to remove current season
+    with metrics.scope('extractor', 'get_season_rankings') as record:
+        pages = iter_season_rankings(all_existing_past_seasons_ids, client=fetch_client(ctx, 'rankings'), dropped=dropped)
+        tracked_players = list(dict.fromkeys(p for page in pages for p in page['player_id'])) # streamed page by page, a player ranked
+        record['rows'] = len(tracked_players)                                                 # in several seasons kept once
+    # players fetched within the ttl whose rows are still stored are skipped this run (they keep their stored profile / clan)
+    stale_players = set(ctx['entity_cache'].stale_ids('players', tracked_players, player_ttl))
+    fresh_players = get_existing_keys(engine, 'player_id', 'players', [p for p in tracked_players if p not in stale_players])
+    logging.info(f'Fetching {len(tracked_players) - len(fresh_players)} of {len(tracked_players)} tracked players '
+                 f'({len(fresh_players)} fetched within the last {player_ttl}).')
+    # this will pick up players who are recently terminated or banned after ranking, later filtered out
+    tracked_players = [p.replace('#', '%23') for p in tracked_players if p not in fresh_players]
+
+    player_df, failed_players, not_found = get_player_info(tracked_players, client=fetch_client(ctx, 'players'))
+
+    # only players the api keeps answering 404 for (banned / deleted) are dropped; throttled / transient failures were
+    # already retried by the client and are simply fetched again next run
+    dropped.clear_strikes(player_df['player_id'] if not player_df.empty else [])
+    confirmed = dropped.strike(not_found) # confirmed players are skipped by pings in future runs
+    dropped.save()
+    transient = sorted(set(failed_players) - set(not_found))
+    logging.warning(f'Added {len(confirmed)} player(s) into dropped list; {len(not_found) - len(confirmed)} other 404(s) '
+                    f'awaiting confirmation, {len(transient)} transient failure(s) left for next run.')
+
+    ctx['player_df'] = player_df
+    ctx['fresh_players'] = fresh_players
+    ctx['failed_players'] = confirmed
+    ctx['unfetched_players'] = failed_players
+
+# re-check dropped players not verified within the ttl; players the api answers for again leave the registry
+def reverify_dropped(ctx):
+    dropped = ctx['dropped']
+    due = dropped.due_for_reverify(dropped_reverify_ttl)
+    if not due:
+        return
+
+    revived_df, failed, still_missing = get_player_info([p.replace('#', '%23') for p in due], client=fetch_client(ctx, 'players'))
+    revived = revived_df['player_id'].tolist() if not revived_df.empty else []
+    dropped.remove(revived)
+    dropped.add(still_missing) # refreshes their verified time; transient failures stay due for the next run
+    logging.info(f'Re-verified {len(due)} dropped player(s): {len(revived)} restored, {len(still_missing)} still unavailable, '
+                 f'{len(failed) - len(still_missing)} not checked (transient errors).')
+
+# 2) populate clans db table - must populate before players to respect db foreign key constraint (fk)
+def clans_stage(ctx):
+    fetch_tracked_players(ctx)
+    entity_cache = ctx['entity_cache']
+
+    player_df = ctx['player_df']
+    current_membership = set(player_df['clan_id'].dropna()) if not player_df.empty else set() # track clans top players are currently in
+    current_membership = list(current_membership | get_player_clans(engine, ctx['fresh_players'])) # incl. players skipped by the ttl
+    existing_clans = ctx['keys'].get('clans', 'clan_id') # track historical clans (where top players have been in) too
+    historical_clans = set(existing_clans) - set(current_membership)
+    stale_historical_clans = entity_cache.stale_ids('clans', historical_clans, historical_clan_ttl) # refreshed less often
+    queued_clans = ctx['retry_queue'].take('clans') # failed to fetch last run
+    all_tracked_clans = list(set(current_membership + stale_historical_clans + queued_clans))
     all_tracked_clans = [c.replace('#', '%23') for c in all_tracked_clans]
+    logging.info(f'Fetching {len(current_membership)} current and {len(stale_historical_clans)} of {len(historical_clans)} historical clans'
+                 f' ({len(queued_clans)} queued for retry).')
 
-    clan_df, failed_clans = get_clan_info(all_tracked_clans)
+    clan_df, failed_clans = get_clan_info(all_tracked_clans, client=fetch_client(ctx, 'clans'))
 
     if not clan_df.empty:
-        upsert_clan_info(engine, clan_df)
-        logging.info(f'Upsert executed on {len(clan_df)} clan rows.')
+        inserted, updated = upsert_clan_info(engine, clan_df, cache=entity_cache) # unchanged clans are skipped
+        ctx['keys'].add('clans', 'clan_id', clan_df['clan_id'])
+        entity_cache.save()
+        logging.info(f'Upsert executed on {len(clan_df)} fetched clan rows ({inserted} inserted, {updated} updated, rest unchanged).')
     else:
         logging.warning('No clans to upsert.')
 
     if failed_clans:
-        logging.error(f'{len(failed_clans)} clan(s) failed to fetch. Retry later: {failed_clans}')
+        ctx['retry_queue'].add('clans', failed_clans)
+        logging.error(f'{len(failed_clans)} clan(s) failed to fetch. Queued for retry next run: {failed_clans}')
+
+    return len(clan_df)
+
+# 3) populate players db table - must populate before season_rankings to respect fk
+def players_stage(ctx):
+    if 'player_df' not in ctx: # stage run on its own, so fetch players here instead of in the clans stage
+        fetch_tracked_players(ctx)
+    player_df, failed_players = ctx['player_df'], ctx['unfetched_players']
 
-    # 3) populate players db table - must populate before season_rankings to respect fk
-    upsert_player_info(engine, player_df)
-    logging.info(f'Upsert executed on {len(player_df)} player rows.')
+    inserted, updated = upsert_player_info(engine, player_df, cache=ctx['entity_cache']) # unchanged players are skipped
+    ctx['entity_cache'].save()
+    logging.info(f'Upsert executed on {len(player_df)} fetched player rows ({inserted} inserted, {updated} updated, rest unchanged).')
 
     if failed_players:
-        logging.error(f'{len(failed_players)} player(s) failed to fetch. Already flagged for dropping: {failed_players}')
+        logging.error(f'{len(failed_players)} player(s) failed to fetch; stored rows kept, confirmed drops purged: {failed_players}')
 
-    # 4) populate season_rankings db tables
-    past_df = last_n_completed_seasons(n=3)
-    existing_season_rankings = set(get_existing_data(engine, 'season_id', 'season_rankings'))
+    return len(player_df)
 
-    past_ids = past_df['season_id'].tolist()
+# 4) populate season_rankings db tables
+def rankings_stage(ctx):
+    failed_players = ctx.get('failed_players', [])
+    existing_season_rankings = ctx['keys'].get('season_rankings', 'season_id')
+
+    past_ids = ctx['calendar'].completed()['season_id'].tolist()
     completed_new_seasons = [s for s in past_ids if s not in existing_season_rankings]
 
+    # leaderboards are streamed page by page and each page inserted as it arrives, in one transaction per season, so a
+    # leaderboard that fails part way is not stored (its season is fetched again next run)
+    inserted = 0
+    for season in completed_new_seasons:
+        failed, season_players = [], []
+        with metrics.scope('extractor', 'get_season_rankings') as record, engine.connect() as conn:
+            transaction = conn.begin()
+            for page in iter_season_rankings([season], client=fetch_client(ctx, 'rankings'), dropped=ctx['dropped'], failed=failed):
+                stored_players = get_existing_keys(conn, 'player_id', 'players', page['player_id']) # inside the transaction
+                page = page[page['player_id'].isin(stored_players)] # players never fetched (fk)
+                insert_new_rows(conn, page, 'season_rankings', 'multi')
+                season_players.extend(page['player_id'])
+            record['rows'] = len(season_players)
+
+            if failed:
+                transaction.rollback()
+                logging.error(f'Season {season} leaderboard could not be read to the end; its rankings are fetched again next run.')
+                continue
+            transaction.commit()
+        run_cache.invalidate('season_rankings') # only once committed, so no read in between caches the rows before it
+
+        ctx['keys'].add('season_rankings', 'season_id', [season])
+        ctx['keys'].add('season_rankings', 'player_id', season_players)
+        inserted += len(season_players)
+
     if completed_new_seasons:
-        season_ranking_df = get_season_rankings(completed_new_seasons) 
-        insert_new_rows(engine, season_ranking_df, 'season_rankings', 'multi')
-        logging.info(f'Inserted {len(season_ranking_df)} new season rankings.')
+        logging.info(f'Inserted {inserted} new season rankings (top {ranking_depth} of {len(completed_new_seasons)} season(s)).')
     else:
         logging.info('No new seasons rankings to add.')
 
     if failed_players:
-        purge_failed_players(engine, failed_players) # need to delete any historical or recently added 
-                                                     # data associated with dropped players from all tables of db
-        logging.warning(f'Removed all database records for {len(failed_players)} player(s): {failed_players}')
-
-    # 5) populate cards db table
-    cards_df = get_card_info() 
-    upsert_card_info(engine, cards_df)
-    logging.info(f'Upsert executed on {len(cards_df)} card rows.')
+        deleted = purge_failed_players(engine, failed_players) # need to delete any historical or recently added
+                                                               # data associated with dropped players from all tables of db
+        ctx['keys'].remove_players(failed_players)
+        logging.warning(f'Removed all database records for {len(failed_players)} player(s) {deleted}: {failed_players}')
+
+    return inserted
+
+# 5) populate cards db table - no upstream dependencies
+def cards_stage(ctx):
+    cards_df = get_card_info(client=fetch_client(ctx, 'cards'))
+    inserted, updated = upsert_card_info(engine, cards_df)
+    logging.info(f'Upsert executed on {len(cards_df)} card rows ({inserted} inserted, {updated} updated).')
+    return len(cards_df)
+
+# 6a) fetch and parse battlelogs - runs after rankings, so players ranked in a season added by this run are fetched
+# in the same run (on an empty db that is every player) and the ranked player set is not read while it is written
+# in --poll mode only the players the poll scheduler picked (ctx['poll_players']) are fetched
+def battlelogs_stage(ctx):
+    poll_players = ctx.get('poll_players')
+    existing_rank_players = ctx['keys'].get('season_rankings', 'player_id') if poll_players is None else poll_players
+    queued_players = ctx['retry_queue'].take('battlelogs') # failed to fetch last run
+    tracked_players = {p.replace('#', '%23') for p in set(existing_rank_players) | set(queued_players)}
+    watermarks = ctx['keys'].get_watermarks() # latest stored battle per player; older battles are dropped during parsing
+    archive = BattlelogArchive(archive_dir) # full raw payloads of new battles, for reprocessing without the api (python -m src.archive)
+    match_logs, match_cards_df, failed_players = get_matches_info(tracked_players, client=fetch_client(ctx, 'battlelogs'),
+                                                                  calendar=ctx['calendar'], watermarks=watermarks, archive=archive,
+                                                                  tracked=ctx['keys'].get('season_rankings', 'player_id'),
+                                                                  parser=get_battlelog_parser())
+                                                                  # battlelogs parsed once into both tables; a battle between two
+                                                                  # tracked players once for both of their views
+    ctx['match_logs'] = match_logs
+    ctx['match_cards_df'] = match_cards_df
+
+    archived = archive.write(ctx['calendar'], run_id=ctx['run_id'])
+    logging.info(f'Archived {archived} raw battles to {archive_dir}.')
 
-    # 6) script to populate matches and match_cards db tables
-    existing_rank_players = get_existing_data(engine, 'player_id', 'season_rankings')
-    existing_rank_players = {p.replace('#', '%23') for p in existing_rank_players}
-    match_logs, failed_players, raw_json_store = get_matches_info(existing_rank_players)
+    if failed_players:
+        ctx['retry_queue'].add('battlelogs', failed_players)
+        logging.error(f'{len(failed_players)} player(s) failed during match fetch. Queued for retry next run: {failed_players}')
 
-    if match_logs.empty:
-        logging.warning('No match data returned.')
+    return len(match_logs)
 
-    else:
-        existing_matches = set(get_existing_data(engine, 'match_key', 'matches'))
-        match_keys = match_logs['match_key'].tolist()
-        new_matches = [m for m in match_keys if m not in existing_matches]
-
-        if new_matches:
-            new_matches_df = match_logs[match_logs['match_key'].isin(new_matches)]
-            unique_matches = new_matches_df.drop_duplicates(subset=['player_id', 'opponent_id'])
-            cnt_unique_battles = len(unique_matches)
-
-            insert_new_rows(engine, new_matches_df, 'matches', None) # must insert before match_cards to respect fk
-            logging.info(f'Inserted {len(new_matches_df)} new match views, of which {cnt_unique_battles} are unique matches.')
-            
-            # mapping the match_view_id identity int generated values in matches db table to match_cards_df rows
-            match_key_mapping = get_match_key_mapping(engine)
-            match_cards_df = get_match_card_info(raw_json_store)
-            new_match_cards_df = match_cards_df[match_cards_df['match_key'].isin(new_matches)]
-            new_match_cards_df = pd.merge(new_match_cards_df, match_key_mapping, on='match_key', how='inner')
-            new_match_cards_df = new_match_cards_df[['match_view_id', 'player_id', 'card_id']]
-
-            insert_new_rows(engine, new_match_cards_df, 'match_cards', None)
-            logging.info(f'Inserted {len(new_match_cards_df)} new rows into match_cards, spanning {int(len(new_match_cards_df)/ 8)} match views.')
-        else:
-            logging.warning('No new match data.')
+# 6b) populate matches db table
+def matches_stage(ctx):
+    match_logs = ctx['match_logs']
 
-    if failed_players:
-        logging.error(f'{len(failed_players)} player(s) failed during match fetch. Retry later: {failed_players}')
+    if match_logs.empty:
+        logging.warning('No new match data.')
+        return
+
+    new_matches_df = match_logs # only battles newer than each player's watermark survive parsing
+    new_matches_df = new_matches_df[~new_matches_df['player_id'].isin(ctx.get('failed_players', []))] # purged this run
+    # a view built from the opponent's log can already be stored (parsed from the player's own log in an earlier run)
+    stored_keys = get_existing_keys(engine, 'match_key', 'matches', new_matches_df['match_key'])
+    new_matches_df = new_matches_df[~new_matches_df['match_key'].isin(stored_keys)]
+    if new_matches_df.empty:
+        logging.info('All parsed match views are already stored.')
+        return
+    cnt_unique_battles = new_matches_df['unique_match_key'].nunique()
+
+    # canonical deck ids from the card rows (needs the cards stage's bit positions); new decks go into decks first for the fk
+    new_match_cards = ctx['match_cards_df'][ctx['match_cards_df']['match_key'].isin(new_matches_df['match_key'])]
+    new_matches_df = new_matches_df.assign(deck_id=new_matches_df['match_key'].map(assign_deck_ids(engine, new_match_cards)))
+
+    # must insert before match_cards to respect fk; also advances watermarks and returns generated match_view_ids
+    ctx['match_key_mapping'] = insert_matches(engine, new_matches_df)
+    ctx['keys'].advance_watermarks(new_matches_df[new_matches_df['own_log'].astype(bool)])
+    logging.info(f'Inserted {len(new_matches_df)} new match views, of which {cnt_unique_battles} are unique matches.')
+    return len(new_matches_df)
+
+# 6c) populate match_cards db table
+def match_cards_stage(ctx):
+    if 'match_key_mapping' not in ctx:
+        logging.warning('No match views inserted this run; no match cards to add.')
+        return
+
+    # mapping the match_view_id identity int generated values (for just the inserted keys) to match_cards_df rows
+    new_match_cards_df = pd.merge(ctx['match_cards_df'], ctx['match_key_mapping'], on='match_key', how='inner')
+    match_outcomes = ctx['match_logs'][['match_key', 'season_id', 'is_win']] # feeds the per-season card aggregates
+    new_match_cards_df = new_match_cards_df.merge(match_outcomes, on='match_key')
+    new_match_cards_df = new_match_cards_df[['match_view_id', 'player_id', 'card_id', 'season_id', 'is_win']]
+
+    insert_match_cards(engine, new_match_cards_df) # also adds the rows onto season_card_stats
+    logging.info(f'Inserted {len(new_match_cards_df)} new rows into match_cards, spanning {int(len(new_match_cards_df)/ 8)} match views.')
+    return len(new_match_cards_df)
+
+# 7) refresh the dashboard extract - only seasons whose stored data changed are rewritten
+def dashboard_stage(ctx):
+    written = write_extract(engine, extract_dir)
+    logging.info(f'Dashboard extract refreshed for {len(written)} season(s): {written}' if written else
+                 'Dashboard extract up to date; dimension tables refreshed.')
+    return len(written)
+
+etl_stages = [
+    Stage('seasons', seasons_stage, []),
+    Stage('clans', clans_stage, ['seasons']),
+    Stage('players', players_stage, ['clans']),
+    Stage('rankings', rankings_stage, ['players']),
+    Stage('cards', cards_stage, []),
+    Stage('battlelogs', battlelogs_stage, ['rankings']),
+    Stage('matches', matches_stage, ['rankings', 'battlelogs', 'cards'], inputs=['battlelogs']), # parsed match_logs / match_cards_df
+    Stage('match_cards', match_cards_stage, ['matches', 'cards'], inputs=['matches']), # match_key_mapping of inserted views
+    Stage('dashboard', dashboard_stage, ['rankings', 'match_cards']),
+]
+
+# function to run entire etl pipeline (or a subset of its stages)
+# resume=True replays the raw responses spooled by the last interrupted run instead of re-fetching them
+# players limits the battlelog fetch to the given player_ids (poll scheduler ticks)
+# keys (KeySets) carries existing-key sets / watermarks over from earlier runs of a long-lived process
+def run_etl_script(stages=None, with_deps=False, max_workers=4, resume=False, players=None, keys=None):
+    selected = select_stages(etl_stages, stages, with_deps)
+    run_id = datetime.now().strftime('%Y-%m-%d_%H-%M-%S') # one per run, as a long-lived process runs the pipeline many times
+    logging.info(f'Starting ETL pipeline: {sorted(selected)}')
+
+    spool_run_id = RunSpool.latest_incomplete(spool_dir) if resume else None
+    if resume:
+        logging.info(f'Resuming interrupted run {spool_run_id}.' if spool_run_id else 'No interrupted run to resume; fetching everything.')
+
+    get_battlelog_parser() # parse workers start before this run's threads do
+    ctx = {'calendar': SeasonCalendar(past_n=3), # season boundaries computed once per run and shared by later stages
+           'entity_cache': EntityCache(entity_cache_path, namespace=engine.url.render_as_string(hide_password=True)),
+           'spool': RunSpool(spool_dir, spool_run_id or run_id, resume=spool_run_id is not None),
+           'retry_queue': RetryQueue(retry_queue_path),
+           'dropped': DroppedRegistry(dropped_players_path), # loaded once per run, shared by the ranking filters
+           'keys': keys or KeySets(engine), # existing keys read once, then kept in step with the rows written
+           'run_id': run_id
+    }
+    if players is not None:
+        ctx['poll_players'] = players
+    resume_in = ctx['retry_queue'].paused_until - time.time() # Retry-After an earlier run could not wait out
+    if resume_in > 0:
+        logging.warning(f'API asked to hold off requests for another {resume_in:.0f}s; requests wait until then.')
+        client.limiter.pause(resume_in)
+    metrics.reset(run_id=run_id) # per-stage / per-extractor metrics, one file per run
+    run_cache.reset() # repeated api / db reads are served once per run
+    completed, failed = set(), {'run': 'interrupted'}
+    try:
+        completed, failed = run_stages(etl_stages, ctx, selected, max_workers, metrics)
+    finally:
+        ctx['spool'].mark_stages(completed, failed)
+        ctx['spool'].close(complete=not failed) # an incomplete spool stays behind for --resume
+        ctx['retry_queue'].pause_until(client.limiter.retry_deadline)
+        ctx['retry_queue'].save()
+        if ctx['spool'].replayed:
+            logging.info(f'Replayed spooled responses instead of fetching: {dict(ctx["spool"].replayed)}')
+        logging.info(f'Run cache: {"; ".join(run_cache.report()) or "no cached reads"}')
+        run_cache.stop()
+        metrics_path = metrics.write()
+        logging.info(f'Run metrics written to {metrics_path}')
+
+    if failed:
+        logging.error(f'ETL pipeline finished with failed stages: {sorted(failed)}')
+        raise RuntimeError(f'Failed stages: {sorted(failed)}')
 
     logging.info('ETL pipeline complete')
 
+# function to run one battlelog poll: fetch only the tracked players whose logs are most likely to overflow (from their
+# stored battle rates), at most budget players; returns the number of players polled
+def poll_tick(scheduler, budget, keys):
+    started = datetime.utcnow()
+    tracked_players = keys.get('season_rankings', 'player_id')
+    rates = get_battle_rates(engine, started)
+    due = scheduler.due(tracked_players, rates, started, budget)
+    logging.info(f'Poll: {len(due)} of {len(tracked_players)} tracked players due '
+                 f'({sum(rate > 0 for rate in rates.values())} active in the last week).')
+
+    if due:
+        try:
+            run_etl_script(['battlelogs', 'matches', 'match_cards'], players=due, keys=keys)
+            scheduler.mark_polled(due, started) # failed players are retried through the retry queue next tick
+        except RuntimeError as e:
+            logging.error(f'Poll failed, its players stay due: {e}')
+        scheduler.save(tracked_players)
+    return len(due)
+
+# function to keep battlelogs fresh in a long-lived process, one poll every interval; the scheduled full runs still
+# refresh seasons, players, clans, rankings and cards. max_ticks=None runs until interrupted
+def run_poll_loop(interval=timedelta(minutes=10), budget=500, max_ticks=None):
+    scheduler = PollScheduler(poll_state_path)
+    keys = KeySets(engine) # warm across ticks
+    tick = 0
+
+    while max_ticks is None or tick < max_ticks:
+        started = datetime.utcnow()
+        poll_tick(scheduler, budget, keys)
+        tick += 1
+        if max_ticks is None or tick < max_ticks:
+            time.sleep(max(0, (interval - (datetime.utcnow() - started)).total_seconds()))
+
+# function to run the pipeline as a long-lived service: a full run every interval, with the db engine / connection pool,
+# api session and existing-key sets kept warm across runs instead of rebuilt by a fresh process each time
+# poll_interval also runs battlelog polls between full runs; a local endpoint reports health (/health) and status (/status)
+# max_cycles=None runs until interrupted
+def run_service(interval=timedelta(hours=1), port=8787, poll_interval=None, poll_budget=500, max_cycles=None):
+    get_battlelog_parser() # parse workers fork before the status server's thread / socket and the warm db connections exist
+    keys = KeySets(engine)
+    scheduler = PollScheduler(poll_state_path) if poll_interval else None
+    status = {'started_at': datetime.utcnow(), 'cycles': 0, 'failed_cycles': 0, 'poll_ticks': 0,
+              'last_cycle': None, 'next_cycle_at': datetime.utcnow()}
+
+    def report():
+        last_cycle = status['last_cycle']
+        reason = None
+        if last_cycle is not None and not last_cycle['ok']:
+            reason = f'last run failed: {last_cycle["error"]}'
+        elif datetime.utcnow() - status['next_cycle_at'] > interval: # a run overdue by a whole interval is stuck
+            reason = 'run overdue'
+        return reason is None, {**status, 'healthy': reason is None, 'reason': reason,
+                                'key_sets': keys.sizes(), 'key_set_loads': keys.loads}
+
+    server = StatusServer(report, port=port).start()
+    logging.info(f'Service started; status at {server.url}/status, health at {server.url}/health.')
+    try:
+        while max_cycles is None or status['cycles'] < max_cycles:
+            started = datetime.utcnow()
+            if started >= status['next_cycle_at']:
+                status['next_cycle_at'] = started + interval
+                try:
+                    run_etl_script(keys=keys)
+                    error = None
+                except Exception as e: # the service outlives a failed run; the next cycle tries again
+                    logging.exception(f'Service run failed: {e}')
+                    error = str(e)
+                    status['failed_cycles'] += 1
+                status['cycles'] += 1
+                status['last_cycle'] = {'started_at': started, 'finished_at': datetime.utcnow(), 'ok': error is None, 'error': error,
+                                        'secs': round((datetime.utcnow() - started).total_seconds(), 1)}
+                if max_cycles is not None and status['cycles'] >= max_cycles:
+                    break
+            elif scheduler is not None:
+                poll_tick(scheduler, poll_budget, keys)
+                status['poll_ticks'] += 1
+
+            wait = status['next_cycle_at'] - datetime.utcnow()
+            if scheduler is not None:
+                wait = min(wait, poll_interval)
+            time.sleep(max(0, wait.total_seconds()))
+    finally:
+        server.stop()
+
 # allows runs of etl function from terminal
 if __name__ == "__main__":
-    run_etl_script()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Run the Clash Royale ETL pipeline.')
+    parser.add_argument('--stages', nargs='+', choices=[s.name for s in etl_stages],
+                        help='run only these stages (default: all)')
+    parser.add_argument('--with-deps', action='store_true', help='also run every upstream stage of --stages')
+    parser.add_argument('--workers', type=int, default=4, help='max stages running at once')
+    parser.add_argument('--resume', action='store_true', help='replay responses already fetched by the last interrupted run')
+    parser.add_argument('--parse-workers', type=int, default=parse_workers,
+                        help='processes parsing battlelogs (default: CR_PARSE_WORKERS or 0 = parse in the fetching thread)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also record peak python allocations (tracemalloc) in run metrics; slows parsing (CR_TRACE_MEMORY=1)')
+    parser.add_argument('--poll', action='store_true', help='run as a long-lived battlelog poller driven by player activity')
+    parser.add_argument('--poll-interval', type=float, default=10, help='minutes between poll ticks')
+    parser.add_argument('--poll-budget', type=int, default=500, help='max battlelog requests per poll tick')
+    parser.add_argument('--poll-ticks', type=int, help='stop after this many ticks (default: run until interrupted)')
+    parser.add_argument('--serve', action='store_true', help='run as a long-lived service (full run every --serve-interval; '
+                                                             'with --poll, battlelog polls in between)')
+    parser.add_argument('--serve-interval', type=float, default=60, help='minutes between full runs in --serve mode')
+    parser.add_argument('--status-port', type=int, default=8787, help='local port of the --serve health / status endpoint')
+    parser.add_argument('--cycles', type=int, help='stop --serve after this many full runs (default: run until interrupted)')
+    args = parser.parse_args()
+    parse_workers = args.parse_workers
+    metrics.trace_memory = metrics.trace_memory or args.trace_memory
+
+    if args.serve:
+        run_service(timedelta(minutes=args.serve_interval), args.status_port,
+                    timedelta(minutes=args.poll_interval) if args.poll else None, args.poll_budget, args.cycles)
+    elif args.poll:
+        run_poll_loop(timedelta(minutes=args.poll_interval), args.poll_budget, args.poll_ticks)
+    else:
+        run_etl_script(args.stages, args.with_deps, args.workers, args.resume)
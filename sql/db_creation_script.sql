@@ -8,10 +8,16 @@ GO
 
 DROP VIEW IF EXISTS vw_recent_rankings;
 DROP VIEW IF EXISTS vw_player_clan;
+DROP VIEW IF EXISTS vw_card_usage_wins;
+DROP TABLE IF EXISTS season_card_stats;
+DROP TABLE IF EXISTS season_match_stats;
+DROP TABLE IF EXISTS player_watermarks;
 DROP TABLE IF EXISTS season_rankings;
 DROP TABLE IF EXISTS match_cards;
 DROP TABLE IF EXISTS cards;
 DROP TABLE IF EXISTS matches;
+DROP TABLE IF EXISTS unique_matches;
+DROP TABLE IF EXISTS decks;
 DROP TABLE IF EXISTS seasons;
 DROP TABLE IF EXISTS players;
 DROP TABLE IF EXISTS clans;
@@ -75,13 +81,38 @@ CREATE TABLE cards (
 	rarity VARCHAR(20),
 	elixir_cost TINYINT, -- max 10, 0 represents wildcard elixir value for mirror
 	evo_status BIT, -- 0 for no evolution, 1 for evolution
+	card_bit SMALLINT, -- fixed bit position of the card in deck bitmasks (assigned once, never reused)
 	CONSTRAINT pk_cards PRIMARY KEY (card_id),
 	CONSTRAINT ck_elixir_cost CHECK (elixir_cost >= 0 AND elixir_cost <= 10)
 );
 GO
 
+/* Distinct 8-card decks; deck_id is the hex of the deck's card bitmask (bit = cards.card_bit), so the same deck
+always gets the same id regardless of card order, and deck grouping / equality is a plain key comparison */
+CREATE TABLE decks (
+	deck_id VARCHAR(64) NOT NULL,
+	card_ids VARCHAR(200) NOT NULL, -- sorted card_ids joined by '-'
+	CONSTRAINT pk_decks PRIMARY KEY (deck_id)
+);
+GO
+
+-- One row per battle, keyed by battle time + the sorted pair of player tags; players / crowns are in that tag order
+CREATE TABLE unique_matches (
+	unique_match_key VARCHAR(80) NOT NULL,
+	battle_time DATETIME2 NOT NULL,
+	season_id VARCHAR(10) NOT NULL,
+	league TINYINT,
+	player1_id VARCHAR(20), -- not an fk: the opponent of a tracked player is often untracked
+	player2_id VARCHAR(20),
+	player1_crowns TINYINT,
+	player2_crowns TINYINT,
+	CONSTRAINT pk_unique_matches PRIMARY KEY (unique_match_key)
+);
+GO
+
 /* Note this table doesn't store unique matches; it stores distinct perspectives of matches.
-Thus, it is possible to have two perspectives or rows for a match if both players are tracked top players in players table) */
+Thus, it is possible to have two perspectives or rows for a match if both players are tracked top players in players table)
+Both perspectives reference the same unique_matches row; a battle between two tracked players is parsed once, from the first of their logs fetched */
 
 CREATE TABLE matches ( 
 	match_view_id INT IDENTITY(1,1),
@@ -101,6 +132,8 @@ CREATE TABLE matches (
 	princess_tower1_hp SMALLINT,
 	princess_tower2_hp SMALLINT,
 	elixir_leaked DECIMAL(5,2),
+	deck_id VARCHAR(64), -- null when the deck holds a card not yet in cards
+	unique_match_key VARCHAR(80),
 	CONSTRAINT pk_matches PRIMARY KEY (match_view_id),
 	CONSTRAINT uq_match_key UNIQUE (match_key)
 
@@ -116,6 +149,36 @@ CREATE TABLE match_cards (
 );
 GO
 	
+-- Latest stored battle_time per player; battlelog parsing skips battles at or before it (incremental ingestion)
+CREATE TABLE player_watermarks (
+	player_id VARCHAR(20) NOT NULL,
+	last_battle_time DATETIME2 NOT NULL,
+	CONSTRAINT pk_player_watermarks PRIMARY KEY (player_id)
+);
+GO
+
+/* Aggregate tables kept up to date by the ETL as match views / match cards are inserted (rebuilt after purges),
+so dashboard card usage / win rate queries read one row per card instead of scanning matches and match_cards */
+
+-- match views and wins per season (usage rate denominator)
+CREATE TABLE season_match_stats (
+	season_id VARCHAR(10) NOT NULL,
+	match_views INT NOT NULL,
+	wins INT NOT NULL,
+	CONSTRAINT pk_season_match_stats PRIMARY KEY (season_id)
+);
+GO
+
+-- match views a card appeared in, and how many of those were won, per season
+CREATE TABLE season_card_stats (
+	season_id VARCHAR(10) NOT NULL,
+	card_id VARCHAR(20) NOT NULL,
+	appearances INT NOT NULL,
+	wins INT NOT NULL,
+	CONSTRAINT pk_season_card_stats PRIMARY KEY (season_id, card_id)
+);
+GO
+	
 -- || ESTABLISH TABLE RELATIONSHIPS || --
 
 -- season_rankings to seasons on season_id
@@ -143,6 +206,21 @@ ALTER TABLE matches
 	ADD CONSTRAINT  fk_matches_season FOREIGN KEY (season_id)
 		REFERENCES seasons (season_id);
 
+-- matches to decks on deck_id
+ALTER TABLE matches
+	ADD CONSTRAINT  fk_matches_decks FOREIGN KEY (deck_id)
+		REFERENCES decks (deck_id);
+
+-- matches to unique_matches on unique_match_key
+ALTER TABLE matches
+	ADD CONSTRAINT  fk_matches_unique_matches FOREIGN KEY (unique_match_key)
+		REFERENCES unique_matches (unique_match_key);
+
+-- unique_matches to seasons on season_id
+ALTER TABLE unique_matches
+	ADD CONSTRAINT fk_unique_matches_seasons FOREIGN KEY (season_id)
+		REFERENCES seasons (season_id);
+
 -- match_cards to matches on match_view_id
 ALTER TABLE match_cards
 	ADD CONSTRAINT fk_match_cards_matches FOREIGN KEY (match_view_id)
@@ -158,6 +236,26 @@ ALTER TABLE match_cards
 	ADD CONSTRAINT fk_match_cards_cards FOREIGN KEY (card_id)
 		REFERENCES cards (card_id);
 
+-- player_watermarks to players on player_id
+ALTER TABLE player_watermarks
+	ADD CONSTRAINT fk_player_watermarks_players FOREIGN KEY (player_id)
+		REFERENCES players (player_id);
+
+-- season_match_stats to seasons on season_id
+ALTER TABLE season_match_stats
+	ADD CONSTRAINT fk_season_match_stats_seasons FOREIGN KEY (season_id)
+		REFERENCES seasons (season_id);
+
+-- season_card_stats to seasons on season_id
+ALTER TABLE season_card_stats
+	ADD CONSTRAINT fk_season_card_stats_seasons FOREIGN KEY (season_id)
+		REFERENCES seasons (season_id);
+
+-- season_card_stats to cards on card_id
+ALTER TABLE season_card_stats
+	ADD CONSTRAINT fk_season_card_stats_cards FOREIGN KEY (card_id)
+		REFERENCES cards (card_id);
+
 
 -- || CREATE INDEXES || --
 
@@ -170,6 +268,20 @@ ALTER TABLE match_cards
  CREATE NONCLUSTERED INDEX idx_matches_key
 	ON matches (match_key);
 
+ CREATE NONCLUSTERED INDEX idx_matches_season_deck
+	ON matches (season_id, deck_id)
+	INCLUDE (is_win);
+
+ CREATE NONCLUSTERED INDEX idx_matches_unique_key
+	ON matches (unique_match_key);
+
+ CREATE NONCLUSTERED INDEX idx_unique_matches_season
+	ON unique_matches (season_id);
+
+ CREATE UNIQUE NONCLUSTERED INDEX uq_card_bit
+	ON cards (card_bit)
+	WHERE card_bit IS NOT NULL;
+
  CREATE NONCLUSTERED INDEX idx_players_cid
 	ON players (clan_id);
 
@@ -204,6 +316,19 @@ CREATE VIEW vw_player_clan AS -- view on clans players are in
 	JOIN clans c ON p.clan_id = c.clan_id;
 GO
 
+CREATE VIEW vw_card_usage_wins AS -- per season card usage / win rates, read from the aggregate tables
+	SELECT cs.season_id,
+		   c.card_id,
+		   c.card_name,
+		   cs.appearances,
+		   cs.wins,
+		   CAST(cs.appearances * 100.0 / NULLIF(ss.match_views, 0) AS DECIMAL(5, 2)) AS usage_rate,
+		   ROUND(CAST(cs.wins AS FLOAT) / NULLIF(cs.appearances, 0) * 100, 2) AS win_rate
+	FROM season_card_stats cs
+	JOIN cards c ON cs.card_id = c.card_id
+	JOIN season_match_stats ss ON cs.season_id = ss.season_id;
+GO
+
 -- || CREATE STORED PROCEDURES || --
 
 CREATE OR ALTER PROCEDURE usp_player_win_rate (@player VARCHAR(20), @season VARCHAR(10)) 
@@ -224,19 +349,14 @@ GO
 CREATE OR ALTER PROCEDURE usp_card_usage_wins (@card VARCHAR(50), @season VARCHAR(10)) 
 AS
 /* returns how often a given card appears in top player decks and its win rate across 
-those matches for a given season */
+those matches for a given season (single-row lookups on the aggregate tables, no fact table scans) */
 BEGIN
-	SELECT c.card_id,
-		   c.card_name,
-		   CAST((COUNT(m.match_view_id) * 1.0 / (SELECT COUNT(match_view_id)
-		   							             FROM matches
-									       		 WHERE season_id = @season)) * 100 AS DECIMAL (5, 2)) AS usage_rate,
-		   ROUND(SUM(CAST(is_win AS FLOAT)) / COUNT(m.match_view_id) * 100, 2) AS win_rate 
-	FROM cards c
-	JOIN match_cards mc ON c.card_id = mc.card_id
-	JOIN matches m ON mc.match_view_id = m.match_view_id
-	WHERE m.season_id = @season AND c.card_name = @card
-	GROUP BY c.card_id, c.card_name
+	SELECT card_id,
+		   card_name,
+		   usage_rate,
+		   win_rate
+	FROM vw_card_usage_wins
+	WHERE season_id = @season AND card_name = @card
 	ORDER BY usage_rate DESC, win_rate DESC
 END;
 GO
\ No newline at end of file
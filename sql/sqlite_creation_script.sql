@@ -0,0 +1,212 @@
+-- SQLite port of db_creation_script.sql for offline runs, CI and local benchmarks
+-- (set "backend": "sqlite" in configs/config.json; src.db_ops.create_schema runs this script)
+-- Differences from SQL Server: foreign keys are declared inline, IDENTITY becomes AUTOINCREMENT,
+-- TOP becomes LIMIT, and stored procedures are not supported (query the tables / views directly).
+
+-- || DROP OBJECTS IF EXIST || --
+
+DROP VIEW IF EXISTS vw_recent_rankings;
+DROP VIEW IF EXISTS vw_player_clan;
+DROP VIEW IF EXISTS vw_card_usage_wins;
+DROP TABLE IF EXISTS season_card_stats;
+DROP TABLE IF EXISTS season_match_stats;
+DROP TABLE IF EXISTS player_watermarks;
+DROP TABLE IF EXISTS season_rankings;
+DROP TABLE IF EXISTS match_cards;
+DROP TABLE IF EXISTS cards;
+DROP TABLE IF EXISTS matches;
+DROP TABLE IF EXISTS unique_matches;
+DROP TABLE IF EXISTS decks;
+DROP TABLE IF EXISTS seasons;
+DROP TABLE IF EXISTS players;
+DROP TABLE IF EXISTS clans;
+
+-- || CREATE DATABASE TABLES || --
+
+CREATE TABLE seasons (
+	season_id VARCHAR(10) NOT NULL,
+	sn_start_date TIMESTAMP NOT NULL,
+	sn_end_date TIMESTAMP NOT NULL,
+	CONSTRAINT pk_seasons PRIMARY KEY (season_id),
+	CONSTRAINT ck_season_dates CHECK (sn_start_date < sn_end_date)
+);
+
+CREATE TABLE clans (
+	clan_id VARCHAR(20) NOT NULL,
+	clan_name NVARCHAR(100),
+	clan_type VARCHAR(20),
+	badge_id VARCHAR(20),
+	clan_score INT,
+	clan_war_trophies INT,
+	clan_location VARCHAR(20),
+	required_trophies SMALLINT,
+	members TINYINT,
+	url_encoded_cid VARCHAR(25),
+	CONSTRAINT pk_clans PRIMARY KEY (clan_id)
+);
+
+CREATE TABLE players (
+	player_id VARCHAR(20) NOT NULL,
+	player_name NVARCHAR(50),
+	exp_lvl TINYINT,
+	road_trophies SMALLINT,
+	best_road_trophies SMALLINT,
+	wins INT,
+	losses INT,
+	life_time_battles INT,
+	max_challenge_wins TINYINT,
+	clan_id VARCHAR(20),
+	url_encoded_pid VARCHAR(25),
+	CONSTRAINT pk_players PRIMARY KEY (player_id),
+	CONSTRAINT uq_url_encoded_pid UNIQUE (url_encoded_pid),
+	CONSTRAINT fk_players_clans FOREIGN KEY (clan_id) REFERENCES clans (clan_id)
+);
+
+CREATE TABLE season_rankings (
+	player_id VARCHAR(20) NOT NULL,
+	season_id VARCHAR(10) NOT NULL,
+	rank SMALLINT,
+	rating SMALLINT,
+	CONSTRAINT pk_season_rankings PRIMARY KEY (player_id, season_id),
+	CONSTRAINT fk_season_rankings_seasons FOREIGN KEY (season_id) REFERENCES seasons (season_id),
+	CONSTRAINT fk_season_rankings_players FOREIGN KEY (player_id) REFERENCES players (player_id)
+);
+
+CREATE TABLE cards (
+	card_id VARCHAR(20) NOT NULL,
+	card_name VARCHAR(50),
+	rarity VARCHAR(20),
+	elixir_cost TINYINT,
+	evo_status BOOLEAN,
+	card_bit SMALLINT,
+	CONSTRAINT pk_cards PRIMARY KEY (card_id),
+	CONSTRAINT uq_card_bit UNIQUE (card_bit),
+	CONSTRAINT ck_elixir_cost CHECK (elixir_cost >= 0 AND elixir_cost <= 10)
+);
+
+CREATE TABLE decks (
+	deck_id VARCHAR(64) NOT NULL,
+	card_ids VARCHAR(200) NOT NULL,
+	CONSTRAINT pk_decks PRIMARY KEY (deck_id)
+);
+
+CREATE TABLE unique_matches (
+	unique_match_key VARCHAR(80) NOT NULL,
+	battle_time TIMESTAMP NOT NULL,
+	season_id VARCHAR(10) NOT NULL,
+	league TINYINT,
+	player1_id VARCHAR(20),
+	player2_id VARCHAR(20),
+	player1_crowns TINYINT,
+	player2_crowns TINYINT,
+	CONSTRAINT pk_unique_matches PRIMARY KEY (unique_match_key),
+	CONSTRAINT fk_unique_matches_season FOREIGN KEY (season_id) REFERENCES seasons (season_id)
+);
+
+CREATE TABLE matches (
+	match_view_id INTEGER PRIMARY KEY AUTOINCREMENT,
+	match_key VARCHAR(50) NOT NULL,
+	battle_time TIMESTAMP NOT NULL,
+	is_win BOOLEAN,
+	league TINYINT,
+	player_id VARCHAR(20) NOT NULL,
+	opponent_id VARCHAR(20),
+	season_id VARCHAR(10) NOT NULL,
+	current_global_rank SMALLINT,
+	starting_rating SMALLINT,
+	rating_change SMALLINT,
+	crowns TINYINT NOT NULL,
+	opp_crowns TINYINT NOT NULL,
+	king_tower_hp SMALLINT,
+	princess_tower1_hp SMALLINT,
+	princess_tower2_hp SMALLINT,
+	elixir_leaked DECIMAL(5,2),
+	deck_id VARCHAR(64),
+	unique_match_key VARCHAR(80),
+	CONSTRAINT uq_match_key UNIQUE (match_key),
+	CONSTRAINT fk_matches_players FOREIGN KEY (player_id) REFERENCES players (player_id),
+	CONSTRAINT fk_matches_season FOREIGN KEY (season_id) REFERENCES seasons (season_id),
+	CONSTRAINT fk_matches_decks FOREIGN KEY (deck_id) REFERENCES decks (deck_id),
+	CONSTRAINT fk_matches_unique_matches FOREIGN KEY (unique_match_key) REFERENCES unique_matches (unique_match_key)
+);
+
+CREATE TABLE match_cards (
+	match_view_id INTEGER NOT NULL,
+	player_id VARCHAR(20) NOT NULL,
+	card_id VARCHAR(20) NOT NULL,
+	CONSTRAINT pk_match_cards PRIMARY KEY (match_view_id, player_id, card_id),
+	CONSTRAINT fk_match_cards_matches FOREIGN KEY (match_view_id) REFERENCES matches (match_view_id),
+	CONSTRAINT fk_match_cards_players FOREIGN KEY (player_id) REFERENCES players (player_id),
+	CONSTRAINT fk_match_cards_cards FOREIGN KEY (card_id) REFERENCES cards (card_id)
+);
+
+CREATE TABLE player_watermarks (
+	player_id VARCHAR(20) NOT NULL,
+	last_battle_time TIMESTAMP NOT NULL,
+	CONSTRAINT pk_player_watermarks PRIMARY KEY (player_id),
+	CONSTRAINT fk_player_watermarks_players FOREIGN KEY (player_id) REFERENCES players (player_id)
+);
+
+CREATE TABLE season_match_stats (
+	season_id VARCHAR(10) NOT NULL,
+	match_views INT NOT NULL,
+	wins INT NOT NULL,
+	CONSTRAINT pk_season_match_stats PRIMARY KEY (season_id),
+	CONSTRAINT fk_season_match_stats_seasons FOREIGN KEY (season_id) REFERENCES seasons (season_id)
+);
+
+CREATE TABLE season_card_stats (
+	season_id VARCHAR(10) NOT NULL,
+	card_id VARCHAR(20) NOT NULL,
+	appearances INT NOT NULL,
+	wins INT NOT NULL,
+	CONSTRAINT pk_season_card_stats PRIMARY KEY (season_id, card_id),
+	CONSTRAINT fk_season_card_stats_seasons FOREIGN KEY (season_id) REFERENCES seasons (season_id),
+	CONSTRAINT fk_season_card_stats_cards FOREIGN KEY (card_id) REFERENCES cards (card_id)
+);
+
+-- || CREATE INDEXES || --
+
+CREATE INDEX idx_season_rankings_pid ON season_rankings (player_id);
+CREATE INDEX idx_matches_pid ON matches (player_id);
+CREATE INDEX idx_matches_season_deck ON matches (season_id, deck_id);
+CREATE INDEX idx_matches_unique_key ON matches (unique_match_key);
+CREATE INDEX idx_unique_matches_season ON unique_matches (season_id);
+CREATE INDEX idx_players_cid ON players (clan_id);
+CREATE INDEX idx_match_card_vid ON match_cards (match_view_id);
+CREATE INDEX idx_match_card_composite ON match_cards (player_id, card_id);
+
+-- || CREATE VIEWS || --
+
+CREATE VIEW vw_recent_rankings AS -- most recently completed sn rankings
+	SELECT s.season_id,
+		   p.player_id,
+		   p.player_name,
+		   s.rank,
+		   s.rating
+	FROM season_rankings s
+	JOIN players p ON s.player_id = p.player_id
+	WHERE season_id = (SELECT MAX(season_id) FROM season_rankings)
+	ORDER BY rank
+	LIMIT 100;
+
+CREATE VIEW vw_player_clan AS -- view on clans players are in
+	SELECT p.player_id,
+		   p.player_name,
+		   c.clan_name,
+		   c.clan_score,
+		   c.members
+	FROM players p
+	JOIN clans c ON p.clan_id = c.clan_id;
+
+CREATE VIEW vw_card_usage_wins AS -- per season card usage / win rates, read from the aggregate tables
+	SELECT cs.season_id,
+		   c.card_id,
+		   c.card_name,
+		   cs.appearances,
+		   cs.wins,
+		   ROUND(cs.appearances * 100.0 / NULLIF(ss.match_views, 0), 2) AS usage_rate,
+		   ROUND(CAST(cs.wins AS FLOAT) / NULLIF(cs.appearances, 0) * 100, 2) AS win_rate
+	FROM season_card_stats cs
+	JOIN cards c ON cs.card_id = c.card_id
+	JOIN season_match_stats ss ON cs.season_id = ss.season_id;
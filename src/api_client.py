@@ -0,0 +1,197 @@
+# set up environment
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+import random
+import requests
+import threading
+import time
+from src.metrics import metrics
+
+retry_statuses = (429, 500, 502, 503, 504) # throttling / transient server errors; anything else (e.g. 404) is a real answer
+
+# create class to cap request rate with a token bucket (refills at rate tokens/sec, up to capacity tokens)
+# the rate adapts to the api (aimd): throttling / transient errors halve it, each success wins a little of it back,
+# and a Retry-After pauses every worker until the api accepts requests again; retry_deadline keeps the latest wall-clock
+# time (epoch secs) the api asked for, even when it outlasts the pause, so a later run can wait for it (RetryQueue)
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = rate / 20
+        self.capacity = capacity or rate # capacity sets how large a burst can be after idle time
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0
+        self.retry_deadline = 0.0
+        self.lock = threading.Lock() # bucket is shared by every worker thread
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait_time = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                    self.last_refill = now
+
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait_time = (1 - self.tokens) / self.rate
+
+            time.sleep(wait_time) # sleep outside lock so other threads can refill / check
+
+    # hold every request back for secs (e.g. a Retry-After deadline carried over from an earlier run)
+    def pause(self, secs):
+        with self.lock:
+            self._pause(secs)
+
+    def _pause(self, secs): # caller holds the lock
+        self.paused_until = max(self.paused_until, time.monotonic() + secs)
+        self.last_refill = max(self.last_refill, self.paused_until) # no tokens accrue while paused
+
+    # multiplicative decrease; retry_after (secs) also pauses all requests, for at most max_pause secs
+    def throttled(self, retry_after=None, max_pause=None):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+            if retry_after:
+                self.retry_deadline = max(self.retry_deadline, time.time() + retry_after)
+                self._pause(min(retry_after, max_pause) if max_pause is not None else retry_after)
+
+    # additive increase back towards the configured rate
+    def succeeded(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+# create function to read a Retry-After header (seconds or http date) as seconds; None when absent / unreadable
+def retry_after_secs(response):
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+# create class to send rate-limited, concurrent requests over a pooled keep-alive session
+# throttled (429) / transient (5xx, connection error) requests are retried up to max_retries times with backoff
+# (Retry-After when the api sends one, else exponential with jitter); retry_after longer than max_retry_after is not waited
+# out in-line (its deadline is kept in limiter.retry_deadline). fetch_all then gives requests still failing transiently
+# one more pass after retry_pass_delay secs
+class ApiClient:
+    def __init__(self, base_url, headers, rate_limit=10, burst=None, max_workers=8, timeout=30, max_retries=3,
+                 max_retry_after=60, retry_pass_delay=5):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.retry_pass_delay = retry_pass_delay
+        self.limiter = TokenBucket(rate_limit, burst)
+
+        self.session = requests.Session() # reuses tcp / tls connections across requests (http keep-alive)
+        self.session.headers.update(headers)
+        # one pooled connection per worker; pool_block makes concurrent fetch_all calls (e.g. parallel pipeline stages)
+        # wait for a free connection instead of opening and discarding extra ones
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    # exponential backoff with jitter for retries without a Retry-After
+    @staticmethod
+    def backoff(attempt):
+        return min(30, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    # send a single request once the limiter allows it, retrying throttled / transient failures
+    # latency and status of every attempt are recorded under the caller's metrics scope (label: scope id)
+    def get(self, path, label=None):
+        label = label or metrics.current_scope()
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(f'{self.base_url}{path}', timeout=self.timeout)
+            except requests.RequestException:
+                metrics.record_request(label, 'error', time.perf_counter() - start)
+                self.limiter.throttled()
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+            metrics.record_request(label, response.status_code, time.perf_counter() - start)
+
+            if response.status_code not in retry_statuses:
+                self.limiter.succeeded()
+                return response
+
+            retry_after = retry_after_secs(response)
+            if retry_after is not None and retry_after > self.max_retry_after:
+                self.limiter.throttled(retry_after, max_pause=self.max_retry_after)
+                return response # left to the retry pass / next run rather than blocking a worker this long
+            self.limiter.throttled(retry_after)
+            if attempt == self.max_retries:
+                return response
+            if retry_after is None:
+                time.sleep(self.backoff(attempt)) # with a Retry-After, the limiter already holds every worker back
+
+        return response
+
+    # whether a fetch_all result failed for a reason worth retrying (throttling, 5xx, connection error)
+    @staticmethod
+    def is_transient(response, error):
+        if error is not None:
+            return isinstance(error, requests.RequestException)
+        return response.status_code in retry_statuses
+
+    # send one request per item concurrently; yields (item, response, error) as each request completes
+    # items failing transiently are held back and fetched once more at the end (in-run retry pass)
+    def fetch_all(self, items, path_fn):
+        label = metrics.current_scope() # worker threads report requests under the scope that called fetch_all
+
+        deferred = []
+        for item, response, error in self._fetch_pass(items, path_fn, label):
+            if self.is_transient(response, error):
+                deferred.append(item)
+                continue
+            yield item, response, error
+
+        if deferred:
+            time.sleep(self.retry_pass_delay)
+            yield from self._fetch_pass(deferred, path_fn, label)
+
+    def _fetch_pass(self, items, path_fn, label):
+        def fetch(item):
+            try:
+                return item, self.get(path_fn(item), label), None
+            except Exception as e:
+                return item, None, e # errors are handed back to the caller instead of killing the pool
+
+        items = iter(items)
+        max_in_flight = self.max_workers * 2 # bounds queued futures (and held responses) regardless of len(items)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = set()
+            for item in items:
+                in_flight.add(executor.submit(fetch, item))
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def close(self):
+        self.session.close()
@@ -1,10 +1,15 @@
 # set up environment
-from configs.config import API_KEY
-from src.helper_functions import battle_time_to_sid
-import requests
+try:
+    from configs import config
+except ImportError: # no local config (e.g. ci or offline benchmarks against benchmarks/stub_server.py)
+    config = None
+from src.helper_functions import SeasonCalendar
+from src.api_client import ApiClient
+from src.metrics import metrics
+from src.dropped_registry import DroppedRegistry
+from urllib.parse import quote
 import pandas as pd
-import time
-import json
+import numpy as np
 import os
 
 # defining required file paths
@@ -13,21 +18,33 @@ dropped_players_path = os.path.join(project_root, 'dropped_data', 'dropped_playe
 
 # define api endpoint and credentials
 base_url = 'https://api.clashroyale.com/v1'
-api_key = API_KEY.get('Key')
+api_key = config.API_KEY.get('Key') if config else os.environ.get('CR_API_KEY', '')
 headers = {'Authorization': f'Bearer {api_key}'}
 
+ranking_depth = int(os.environ.get('CR_RANKING_DEPTH', 100)) # top players tracked per season leaderboard
+rankings_page_size = 1000 # ranked players per leaderboard request (and per season_rankings insert batch)
+
+# shared fetch engine: token bucket sized to the API quota, keep-alive pool, bounded worker threads
+api_settings = dict(getattr(config, 'API_SETTINGS', {})) # optional overrides: base_url, rate_limit, burst, max_workers, timeout, max_retries
+client = ApiClient(api_settings.pop('base_url', base_url), headers, **api_settings)
+
 # create function to pull player data into df
-def get_player_info (player_ids):
+@metrics.track_extractor
+def get_player_info (player_ids, client=client):
     player_details = []
     failed_ids = [] # will catch any player_ids that fail to pull
+    not_found_ids = [] # subset of failed_ids the api answered 404 for (deleted / banned), vs throttling or transient errors
     
-    for player_id in player_ids:
+    for player_id, response, error in client.fetch_all(player_ids, lambda p: f'/players/{p}'):
         try:
-            response = requests.get(f'{base_url}/players/{player_id}', headers=headers)
+            if error is not None:
+                raise error
 
             if response.status_code != 200:
                 print(f'Failed request for player {player_id.replace("%23", "#")}: {response.status_code}')
                 failed_ids.append(player_id.replace('%23', '#'))
+                if response.status_code == 404:
+                    not_found_ids.append(player_id.replace('%23', '#'))
                 continue # will continue run even if it fails to fetch data for a particular sn
         
             json_data = response.json()
@@ -52,8 +69,6 @@ def get_player_info (player_ids):
         except Exception as e:
             print(f"Exception for player {player_id.replace('%23', '#')}: {e}")
             failed_ids.append(player_id.replace('%23', '#'))
-        
-        time.sleep(0.1) # stay under API limit
 
     # create a DataFrame from the top players data    
     players = pd.DataFrame(player_details)
@@ -61,40 +76,60 @@ def get_player_info (player_ids):
     if not players.empty:
         players['url_encoded_pid'] = players['player_id'].str.replace('#', '%23')
         
-    return players, failed_ids
+    return players, failed_ids, not_found_ids
 
-# create function to pull season rankings from api into df
-def get_season_rankings (season_ids):
-    top_players = []
-    with open(dropped_players_path, 'r') as f:
-        dropped_players = json.load(f) # load in dynamic list of known deleted or banned players to filter out
+# create generator to stream season leaderboards page by page (one df of at most page_size rows per page), following the
+# api's after cursors down to the top depth players of each season (default CR_RANKING_DEPTH, 100)
+# dropped (DroppedRegistry or set) filters out known deleted or banned players; loaded from disk when not given
+# failed (list) collects seasons whose leaderboard could not be read to the end
+def iter_season_rankings(season_ids, client=client, dropped=None, depth=None, page_size=None, failed=None):
+    depth = depth or ranking_depth
+    page_size = page_size or rankings_page_size
+    dropped = dropped if dropped is not None else DroppedRegistry(dropped_players_path)
+    dropped_players = dropped.ids() if isinstance(dropped, DroppedRegistry) else set(dropped) # one snapshot for every page
 
     for season in season_ids:
-        response = requests.get(f'{base_url}/locations/global/pathoflegend/{season}/rankings/players?limit=100', headers=headers)
-        if response.status_code != 200:
-            print(f'Failed to fetch data for {season}.')
-            continue 
-
-        for player in response.json().get('items', []):
-            if player['tag'] not in dropped_players: # apply filter                                                                                                    
-                rank_info = {'player_id': player['tag'], 
-                            'season_id': season,
-                            'rank': player['rank'],
-                            'rating': player['eloRating']
-                }
-                top_players.append(rank_info)
-                
-    season_rankings = pd.DataFrame(top_players)
-    
-    return season_rankings
+        fetched, after = 0, None
+        while fetched < depth:
+            path = f'/locations/global/pathoflegend/{season}/rankings/players?limit={min(page_size, depth - fetched)}'
+            response = client.get(path + (f'&after={quote(after, safe="")}' if after else '')) # counted under the caller's extractor scope
+            if response.status_code != 200:
+                print(f'Failed to fetch data for {season} after {fetched} ranked players.')
+                if failed is not None:
+                    failed.append(season)
+                break
+
+            json_data = response.json()
+            items = json_data.get('items', [])
+            fetched += len(items)
+            page = [{'player_id': player['tag'],
+                     'season_id': season,
+                     'rank': player['rank'],
+                     'rating': player['eloRating']
+                    } for player in items if player['tag'] not in dropped_players] # apply filter (set lookup)
+            if page:
+                yield pd.DataFrame(page)
+
+            after = ((json_data.get('paging') or {}).get('cursors') or {}).get('after')
+            if not items or not after: # last page of the leaderboard
+                break
+
+# create function to pull season rankings from api into one df (see iter_season_rankings)
+@metrics.track_extractor
+def get_season_rankings (season_ids, client=client, dropped=None, depth=None):
+    pages = list(iter_season_rankings(season_ids, client, dropped, depth))
+    return pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
 
 # create function to pull clan data into df
-def get_clan_info (clan_ids):
+@metrics.track_extractor
+def get_clan_info (clan_ids, client=client):
     clan_details = []
     failed_clans = []
-    for clan_id in clan_ids:
+    for clan_id, response, error in client.fetch_all(clan_ids, lambda c: f'/clans/{c}'):
         try:
-            response = requests.get(f'{base_url}/clans/{clan_id}', headers=headers)
+            if error is not None:
+                raise error
+
             if response.status_code != 200:
                     print(f'Failed request for clan {clan_id.replace("%23", "#")}: {response.status_code}')
                     failed_clans.append(clan_id.replace("%23", "#"))
@@ -102,8 +137,8 @@ def get_clan_info (clan_ids):
             
             json_data = response.json()
             if 'tag' not in json_data:
-                print(f'Invalid response for clan {clan_id.replace("23", "#")}: {json_data}')
-                failed_clans.append(clan_id.replace('23', '#'))
+                print(f'Invalid response for clan {clan_id.replace("%23", "#")}: {json_data}')
+                failed_clans.append(clan_id.replace('%23', '#'))
                 continue
 
             clan_info = {'clan_id': json_data['tag'],
@@ -121,19 +156,20 @@ def get_clan_info (clan_ids):
         except Exception as e:
             print(f"Exception for clan {clan_id.replace('%23', '#')}: {e}")
             failed_clans.append(clan_id.replace('%23','#'))
-
-        time.sleep(0.1)
         
     clans = pd.DataFrame(clan_details)
-    clans['url_encoded_cid'] = clans['clan_id'].str.replace('#', '%23')
-    clans['badge_id'] = clans['badge_id'].astype(str)  # ensure badge_id is string type
+
+    if not clans.empty:
+        clans['url_encoded_cid'] = clans['clan_id'].str.replace('#', '%23')
+        clans['badge_id'] = clans['badge_id'].astype(str)  # ensure badge_id is string type
     
     return clans, failed_clans
 
 # create function to pull card data into df
-def get_card_info():
+@metrics.track_extractor
+def get_card_info(client=client):
     card_info = []
-    response = requests.get(f'{base_url}/cards', headers=headers)
+    response = client.get('/cards')
     if response.status_code != 200:
         print(f'Failed to fetch card data: {response.status_code}')
         return pd.DataFrame()  # return empty DataFrame if request fails
@@ -158,96 +194,182 @@ def get_card_info():
     
     return cards
 
-# create function to pull matches data into df
-def get_matches_info(player_ids): 
+# create function to build one player's match row and card rows for a battle (side = that player, other = their opponent)
+def battle_rows(match, side, other, own_log=True):
+    battle_time = match.get('battleTime')
+    towers = side.get('princessTowersHitPoints') or [] # destroyed towers are left out by the api
+    match_row = {
+        'battle_time': battle_time,
+        'league': match.get('leagueNumber'),
+        'player_id': side.get('tag'),
+        'opponent_id': other.get('tag'),
+        'current_global_rank': side.get('globalRank'),
+        'starting_rating': side.get('startingTrophies'),
+        'rating_change': side.get('trophyChange'),
+        'crowns': side.get('crowns'),
+        'opp_crowns': other.get('crowns'),
+        'king_tower_hp': side.get('kingTowerHitPoints'),
+        'princess_tower1_hp': towers[0] if len(towers) > 0 else 0,
+        'princess_tower2_hp': towers[1] if len(towers) > 1 else 0,
+        'elixir_leaked': side.get('elixirLeaked'),
+        'own_log': own_log # False for a view built from the opponent's log (does not move this player's watermark)
+    }
+    card_rows = [{'battle_time': battle_time,
+                  'player_id': side.get('tag'),
+                  'card_id': card['id']
+                 } for card in side.get('cards', [])]
+    return match_row, card_rows
+
+# create function to format a stored battle time like the api's battleTime, to the millisecond (without the trailing Z),
+# so watermarks and battleTime[:19] compare as strings in chronological order
+def battle_time_key(battle_time):
+    return pd.Timestamp(battle_time).strftime('%Y%m%dT%H%M%S.%f')[:19]
+
+# create generator to parse a battlelog response in one pass; yields a match row and its card rows per ranked match
+# battles older than the watermark (battle_time_key of the player's last stored battle) were stored by an earlier run; a
+# battle at the watermark itself is kept, as stored views are dropped by their match_key before loading
+# a battle between two tracked players (tracked: set of player_ids) is resolved by its canonical identity (battle time +
+# sorted pair of tags) and parsed once: the first log it appears in yields both players' views, and seen (shared across
+# the logs of one fetch) makes the copy in the other player's log be skipped
+def parse_battlelog(battlelog, game_mode='pathOfLegend', watermark=None, tracked=None, seen=None):
+    for match in battlelog:
+        if match.get('type') != game_mode: # filter before any rows are built
+            continue
+        if watermark and match.get('battleTime', '')[:19] < watermark: # already stored; battleTime strings sort chronologically
+            continue
+
+        team = match.get('team')[0]
+        opp = match.get('opponent')[0]
+        shared = tracked is not None and opp.get('tag') in tracked
+        if shared and seen is not None:
+            identity = (match.get('battleTime'), *sorted([team.get('tag'), opp.get('tag')]))
+            if identity in seen:
+                continue
+            seen.add(identity)
+
+        yield battle_rows(match, team, opp)
+        if shared:
+            yield battle_rows(match, opp, team, own_log=False)
+
+# create function to build match_key (battle time + player perspective) the same way for matches and match_cards
+# each distinct battle time / player id is formatted once and broadcast back to its rows (a match's 8 card rows share both)
+def build_match_key(battle_times, player_ids):
+    def as_str(values):
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        return np.array([str(u) for u in uniques], dtype=object)[codes]
+    return pd.Series(as_str(battle_times) + '_' + as_str(player_ids), index=battle_times.index)
+
+# create function to build the canonical unique_match_key (battle time + sorted pair of player tags), identical for both views
+def build_unique_match_key(battle_times, player_ids, opponent_ids):
+    players = player_ids.astype(object).fillna('')
+    opponents = opponent_ids.astype(object).fillna('')
+    first = players.where(players <= opponents, opponents)
+    second = opponents.where(players <= opponents, players)
+    return build_match_key(battle_times, first) + '_' + second
+
+# schema-matched compact dtypes for extracted match data (TINYINT -> Int8, SMALLINT -> Int16, nullable as the api can omit
+# fields); tags and card ids repeat across many rows, so they are stored once per distinct value as categoricals
+match_dtypes = {'league': 'Int8', 'crowns': 'Int8', 'opp_crowns': 'Int8', 'current_global_rank': 'Int16',
+                'starting_rating': 'Int16', 'rating_change': 'Int16', 'king_tower_hp': 'Int16',
+                'princess_tower1_hp': 'Int16', 'princess_tower2_hp': 'Int16', 'player_id': 'category', 'opponent_id': 'category'}
+
+# create function to pull matches and match cards (deck) data into dfs, parsing each battlelog once
+# watermarks ({player_id: last stored battle_time}) drop already-stored battles before rows are built
+# archive (BattlelogArchive) also keeps the full raw payload of every new battle, ranked or not
+# tracked (player_ids stored in players) lets a battle between two tracked players be parsed once for both views
+# parser (parallel_parse.BattlelogParser) moves json decoding and row building to worker processes, batch by batch as
+# responses arrive; without it battlelogs are parsed on this thread
+@metrics.track_extractor
+def get_matches_info(player_ids, client=client, calendar=None, watermarks=None, archive=None, tracked=None, parser=None):
+    watermarks = {p: battle_time_key(t) for p, t in (watermarks or {}).items()} # api battleTime format
     matches_info = []
+    match_card_info = []
     failed_match_players = []
-    raw_json_store = {}
+    seen = set() # canonical identities of shared battles already parsed from another player's log
+    batch = parser.batch(tracked=tracked, archive=archive is not None) if parser is not None else None
 
-    for player in player_ids:
+    for player, response, error in client.fetch_all(player_ids, lambda p: f'/players/{p}/battlelog'):
         try:
-            response = requests.get(f'{base_url}/players/{player}/battlelog', headers=headers)
+            if error is not None:
+                raise error
+
             if response.status_code != 200:
                 print(f'failed request for {player.replace("%23", "#")}: {response.status_code}')
                 failed_match_players.append(player.replace('%23', '#'))
                 continue
 
-            json_data = response.json()
-            raw_json_store[player] = json_data # want to also store json_data for later match_cards pull
-
-            for match in json_data:
-                team = match.get('team')[0]
-                opp = match.get('opponent')[0]
-
-                matches_details = {
-                    'battle_time': match.get('battleTime'),
-                    'game_mode': match.get('type'),
-                    'league': match.get('leagueNumber'),
-                    'player_id': team.get('tag'),
-                    'opponent_id': opp.get('tag'),
-                    'current_global_rank': team.get('globalRank'),
-                    'starting_rating': team.get('startingTrophies'),
-                    'rating_change': team.get('trophyChange'),
-                    'crowns': team.get('crowns'),
-                    'opp_crowns': opp.get('crowns'),
-                    'king_tower_hp': team.get('kingTowerHitPoints'),
-                    'princess_towers_hp': team.get('princessTowersHitPoints'),
-                    'elixir_leaked': team.get('elixirLeaked')
-                }
-
-                matches_info.append(matches_details)
-
-            time.sleep(0.1)  # stay under API rate limit
+            watermark = watermarks.get(player.replace('%23', '#'))
+            if batch is not None:
+                archive_watermark = archive.watermarks.get(player.replace('%23', '#')) if archive is not None else None
+                batch.add(player.replace('%23', '#'), watermark, response.content, archive_watermark) # raw bytes, decoded in a worker
+                continue
+            battlelog = response.json()
+            if archive is not None:
+                archive.add(player.replace('%23', '#'), battlelog)
+            for match_row, card_rows in parse_battlelog(battlelog, watermark=watermark, tracked=tracked, seen=seen): # raw json is dropped once parsed
+                matches_info.append(match_row)
+                match_card_info.extend(card_rows)
 
         except Exception as e:
             print(f'exception for {player.replace("%23", "#")}: {e}')
             failed_match_players.append(player.replace('%23', '#'))
 
+    if batch is not None:
+        match_rows, card_rows, archived, failed = batch.results()
+        for player, error in failed:
+            print(f'exception for {player}: {error}')
+        failed_match_players.extend(player for player, _ in failed)
+        if archive is not None:
+            archive.add_rows(archived)
+        matches, match_cards = build_matches(match_rows, calendar), get_match_card_info(card_rows)
+        if not matches.empty: # a shared battle parsed in two workers: keep each view once, preferably from its own log
+            matches = matches.sort_values('own_log', ascending=False, kind='stable').drop_duplicates('match_key').sort_index()
+        if not match_cards.empty:
+            match_cards = match_cards.drop_duplicates(['match_key', 'card_id'])
+        return matches, match_cards, failed_match_players
+
+    return build_matches(matches_info, calendar), get_match_card_info(match_card_info), failed_match_players
+
+# create function to build the matches df from match rows emitted by parse_battlelog (live fetches or the raw archive)
+def build_matches(matches_info, calendar=None):
     matches = pd.DataFrame(matches_info) # important note: each row is not necessarily a distinct match because two top players can play in the same match
-                                         # each row is instead a distinct match-player combo; thus it is possible for the same match to be represented twice, once for each perspective
+                                         # each row is instead a distinct match-player combo; both perspectives of a match share its unique_match_key
     if matches.empty:
-        return matches, failed_match_players, raw_json_store
+        return matches
 
     # table cleaning
+    matches = matches.astype(match_dtypes)
     matches['is_win'] = matches['crowns'] > matches['opp_crowns']
     matches['battle_time'] = pd.to_datetime(matches['battle_time'], format='%Y%m%dT%H%M%S.%fZ',
                                             utc=True, errors='coerce')
-    matches['season_id'] = matches['battle_time'].apply(battle_time_to_sid)
-    matches['match_key'] = (matches['battle_time'].astype(str) + '_' + matches['player_id'].astype(str)) # this col will be the checked col during ingestion
-    matches = matches[matches['game_mode'] == 'pathOfLegend'].copy()
-    matches['princess_tower1_hp'] = matches['princess_towers_hp'].apply(lambda x: x[0] if isinstance(x, list) and len(x) > 0 else 0)
-    matches['princess_tower2_hp'] = matches['princess_towers_hp'].apply(lambda x: x[1] if isinstance(x, list) and len(x) > 1 else 0)
+    calendar = calendar or SeasonCalendar() # season boundaries built once, not per match row
+    matches['season_id'] = calendar.assign(matches['battle_time'])
+    matches['match_key'] = build_match_key(matches['battle_time'], matches['player_id']) # this col will be the checked col during ingestion
+    matches['unique_match_key'] = build_unique_match_key(matches['battle_time'], matches['player_id'], matches['opponent_id'])
+    if 'own_log' not in matches:
+        matches['own_log'] = True
 
     matches = matches[[
         'match_key','battle_time', 'is_win', 'league', 'player_id', 'opponent_id', 'season_id',
         'current_global_rank', 'starting_rating', 'rating_change', 'crowns','opp_crowns',
-        'king_tower_hp', 'princess_tower1_hp', 'princess_tower2_hp', 'elixir_leaked',
+        'king_tower_hp', 'princess_tower1_hp', 'princess_tower2_hp', 'elixir_leaked', 'unique_match_key', 'own_log'
     ]]
 
-    return matches, failed_match_players, raw_json_store 
+    return matches
 
-# create function to pull match cards (deck) data from stored json of battlelogs and into df
-def get_match_card_info(raw_json):
-    match_card_info = []
-    for player in raw_json:
-        for match in raw_json[player]:
-            for card in match['team'][0]['cards']:
-                match_card_details = {'game_mode': match['type'],
-                                      'battle_time': match['battleTime'],
-                                      'player_id': match['team'][0]['tag'],
-                                      'card_id': card['id']
-                }
-                match_card_info.append(match_card_details)
-    match_cards = pd.DataFrame(match_card_info)
+# create function to build match cards (deck) df from card rows emitted by parse_battlelog
+@metrics.track_extractor
+def get_match_card_info(card_rows):
+    match_cards = pd.DataFrame(card_rows)
 
     if match_cards.empty:
         return match_cards
     
     # table cleaning
     match_cards['battle_time'] = pd.to_datetime(match_cards['battle_time'], format='%Y%m%dT%H%M%S.%fZ', utc=True)
-    match_cards['match_key'] = (match_cards['battle_time'].astype(str) + '_' + match_cards['player_id'].astype(str))
-    match_cards['card_id'] = match_cards['card_id'].astype(str)
-    match_cards = match_cards[match_cards['game_mode'] == 'pathOfLegend'].copy()
-    match_cards.drop(columns=['game_mode', 'battle_time'], inplace=True)
+    match_cards['match_key'] = build_match_key(match_cards['battle_time'], match_cards['player_id'])
+    match_cards['player_id'] = match_cards['player_id'].astype('category')
+    match_cards['card_id'] = match_cards['card_id'].astype('category').cat.rename_categories(str) # ~120 distinct ids
+    match_cards.drop(columns=['battle_time'], inplace=True)
 
-    return match_cards # like matches, two perspectives of a match are possible
\ No newline at end of file
+    return match_cards # like matches, two perspectives of a match are possible
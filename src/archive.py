@@ -0,0 +1,167 @@
+# set up environment
+from src.api_extract import build_matches, get_match_card_info, parse_battlelog
+from src.db_ops import delete_season_matches, get_engine, get_existing_keys, insert_match_cards, insert_matches
+from src.run_cache import run_cache
+from src.deck_analytics import assign_deck_ids
+from src.helper_functions import SeasonCalendar
+import pandas as pd
+import argparse
+import json
+import logging
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # optional dependency; without it runs skip archiving with a warning
+    pa = pq = None
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+archive_dir = os.path.join(project_root, 'archive', 'battlelogs') # parquet dataset, one season_id=<id> folder per season
+
+# create function to build archive rows (full raw payload per battle) from one player's battlelog
+# battles at or before the player's archive watermark (BattlelogArchive.watermarks, every battle type) were archived by an
+# earlier run; dumps serializes a battle compactly
+def archive_rows(player_id, battlelog, watermark=None, dumps=lambda battle: json.dumps(battle, separators=(',', ':'))):
+    rows = []
+    for battle in battlelog:
+        battle_time = battle.get('battleTime', '')
+        if watermark and battle_time[:19] <= watermark:
+            continue
+        rows.append({'player_id': player_id,
+                     'battle_time': battle_time,
+                     'battle_type': battle.get('type'),
+                     'opponent_id': (battle.get('opponent') or [{}])[0].get('tag'),
+                     'payload': dumps(battle)
+        })
+    return rows
+
+# create class to collect the full raw payload of new battles during a battlelog fetch, then write them to the
+# season-partitioned parquet archive; keeps every field (card / evolution levels, opponent decks, unranked modes)
+# watermarks ({player_id: latest archived battleTime[:19]}) are kept next to the dataset, apart from the ranked-only
+# match watermarks, so unranked battles are archived once too (pyarrow skips files starting with '_' when reading)
+class BattlelogArchive:
+    def __init__(self, directory=archive_dir):
+        self.directory = directory
+        self.watermarks_path = os.path.join(directory, '_watermarks.json')
+        self.rows = []
+        self.watermarks = {}
+        if os.path.exists(self.watermarks_path):
+            with open(self.watermarks_path) as f:
+                self.watermarks = json.load(f)
+
+    def add(self, player_id, battlelog):
+        self.rows.extend(archive_rows(player_id, battlelog, self.watermarks.get(player_id)))
+
+    # rows already built by archive_rows (e.g. in a parse worker process)
+    def add_rows(self, rows):
+        self.rows.extend(rows)
+
+    # append collected battles as new parquet files (one per season partition), then advance the archive watermarks;
+    # returns rows written
+    def write(self, calendar=None, run_id='run'):
+        if not self.rows:
+            return 0
+        if pq is None:
+            logging.warning(f'pyarrow not installed; {len(self.rows)} battles were not archived.')
+            return 0
+
+        battles = pd.DataFrame(self.rows)
+        battles['battle_time'] = pd.to_datetime(battles['battle_time'], format='%Y%m%dT%H%M%S.%fZ', utc=True, errors='coerce')
+        battles['season_id'] = (calendar or SeasonCalendar()).assign(battles['battle_time']).fillna('unknown')
+
+        pq.write_to_dataset(pa.Table.from_pandas(battles, preserve_index=False), self.directory,
+                            partition_cols=['season_id'], basename_template=f'{run_id}-{{i}}.parquet')
+
+        for row in self.rows:
+            key = row['battle_time'][:19]
+            if key > self.watermarks.get(row['player_id'], ''):
+                self.watermarks[row['player_id']] = key
+        tmp_path = f'{self.watermarks_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.watermarks, f)
+        os.replace(tmp_path, self.watermarks_path) # atomic swap so a crash mid-write never leaves corrupt watermarks
+
+        self.rows = []
+        return len(battles)
+
+# create function to read archived battles (optionally only some seasons / players), one row per player + battle
+def read_archive(directory=archive_dir, seasons=None, players=None):
+    if pq is None:
+        raise ImportError('pyarrow is required to read the battlelog archive')
+    if not os.path.exists(directory):
+        return pd.DataFrame(columns=['player_id', 'battle_time', 'battle_type', 'opponent_id', 'payload', 'season_id'])
+
+    filters = [('season_id', 'in', list(seasons))] if seasons else None # partition pruning: other seasons are never read
+    battles = pq.read_table(directory, filters=filters).to_pandas()
+    battles['season_id'] = battles['season_id'].astype(str)
+    if players:
+        battles = battles[battles['player_id'].isin(players)]
+
+    # a battle can be archived twice, e.g. by a run that died between writing the dataset and its watermarks
+    return battles.drop_duplicates(subset=['player_id', 'battle_time'], keep='last').reset_index(drop=True)
+
+# create function to rebuild (rebuild=True: delete + reload whole seasons) or backfill (insert missing match views)
+# matches and match_cards from archived battles, without touching the api; returns (matches, match_cards) rows inserted
+def reprocess_archive(engine, battles, seasons=None, rebuild=False):
+    matches_info, card_rows = [], []
+    tags = set(battles['player_id']) | set(battles['opponent_id'].dropna())
+    tracked, seen = get_existing_keys(engine, 'player_id', 'players', tags), set() # shared battles are parsed once for both views
+    for match_row, rows in parse_battlelog((json.loads(payload) for payload in battles['payload']), tracked=tracked, seen=seen):
+        matches_info.append(match_row)
+        card_rows.extend(rows)
+
+    matches = build_matches(matches_info)
+    if matches.empty:
+        return 0, 0
+    match_cards = get_match_card_info(card_rows)
+
+    # archived season_ids are kept, as the default season calendar only spans recent seasons
+    archived_seasons = battles[['battle_time', 'season_id']].drop_duplicates(subset='battle_time') # also covers views of the opponent
+    matches = matches.drop(columns='season_id').merge(archived_seasons, on='battle_time', how='left')
+    matches = matches.drop_duplicates(subset='match_key')
+
+    # rows must satisfy the db foreign keys (players purged since archiving, seasons / cards never loaded)
+    matches = matches[matches['player_id'].isin(get_existing_keys(engine, 'player_id', 'players', matches['player_id'].unique()))]
+    matches = matches[matches['season_id'].isin(get_existing_keys(engine, 'season_id', 'seasons', matches['season_id'].dropna().unique()))]
+    match_cards = match_cards[match_cards['card_id'].isin(get_existing_keys(engine, 'card_id', 'cards', match_cards['card_id'].unique()))]
+
+    if not rebuild:
+        matches = matches[~matches['match_key'].isin(get_existing_keys(engine, 'match_key', 'matches', matches['match_key']))]
+        if matches.empty:
+            return 0, 0
+
+    deck_ids = assign_deck_ids(engine, match_cards[match_cards['match_key'].isin(matches['match_key'])]) # decks only ever grow
+    matches = matches.assign(deck_id=matches['match_key'].map(deck_ids))
+
+    # a rebuild's delete and reload commit together, so a failed reload leaves the stored seasons as they were
+    with engine.begin() as conn:
+        if rebuild:
+            deleted = delete_season_matches(conn, seasons or matches['season_id'].unique().tolist())
+            logging.info(f'Deleted {deleted} stored match views before rebuilding.')
+        match_key_map = insert_matches(conn, matches)
+        match_cards = match_cards.merge(match_key_map, on='match_key').merge(matches[['match_key', 'season_id', 'is_win']], on='match_key')
+        insert_match_cards(conn, match_cards[['match_view_id', 'player_id', 'card_id', 'season_id', 'is_win']])
+    run_cache.invalidate('match_cards', 'matches', 'unique_matches', 'player_watermarks', 'season_match_stats', 'season_card_stats')
+    return len(matches), len(match_cards)
+
+# allows rebuilding / backfilling db tables from the archive from terminal:
+#     python -m src.archive --seasons 2025-08 2025-09            (backfill match views missing from the db)
+#     python -m src.archive --seasons 2025-09 --rebuild          (reload whole seasons; only for seasons fully covered by the archive)
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s — %(levelname)s — %(message)s')
+    parser = argparse.ArgumentParser(description='Rebuild or backfill matches / match_cards from the raw battlelog archive.')
+    parser.add_argument('--seasons', nargs='+', help='season_ids to reprocess (default: whole archive)')
+    parser.add_argument('--players', nargs='+', help='only these player_ids (e.g. "#ABC123")')
+    parser.add_argument('--rebuild', action='store_true', help='delete stored matches of the seasons and reload them')
+    parser.add_argument('--config', help='db config json (default: configs/config.json)')
+    parser.add_argument('--dir', default=archive_dir)
+    args = parser.parse_args()
+
+    if args.rebuild and args.players:
+        parser.error('--rebuild reloads whole seasons and cannot be limited to --players')
+
+    battles = read_archive(args.dir, args.seasons, args.players)
+    logging.info(f'Read {len(battles)} archived battles.')
+    matches, match_cards = reprocess_archive(get_engine(args.config), battles, args.seasons, args.rebuild)
+    logging.info(f'Inserted {matches} match views and {match_cards} match_cards rows from the archive.')
@@ -0,0 +1,166 @@
+# set up environment
+from src.db_ops import get_engine
+import pandas as pd
+from sqlalchemy import bindparam, text
+from datetime import datetime
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # optional dependency; without it runs skip the extract with a warning
+    pa = pq = None
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+extract_dir = os.path.join(project_root, 'extract') # dashboard extract: <table>/season_id=<id>/part-0.parquet + dimension files
+
+# season-partitioned tables of the extract with their column dtypes (fixed, so every partition has the same parquet
+# schema even when a season has no values for a column); dimensions (players, clans, cards) are small and rewritten whole
+season_tables = {'player_season_stats': {'player_id': 'str', 'rank': 'Int64', 'rating': 'Int64', 'matches': 'int64', 'wins': 'int64',
+                                         'win_rate': 'float64', 'avg_crowns': 'float64', 'avg_elixir_leaked': 'float64'},
+                 'card_season_stats': {'card_id': 'str', 'appearances': 'int64', 'wins': 'int64', 'usage_rate': 'float64',
+                                       'win_rate': 'float64'},
+                 'clan_season_stats': {'clan_id': 'str', 'players': 'int64', 'ranked_players': 'int64', 'best_rank': 'Int64',
+                                       'avg_rating': 'float64', 'matches': 'int64', 'wins': 'int64', 'win_rate': 'float64'}}
+
+# create function to fingerprint each season's stored data from the aggregate tables (cheap, no fact table scans) and the
+# dimensions the season tables are built from (player / clan row counts and current clan membership, which the clan
+# rollups use); a season whose fingerprint differs from the one its partitions were written with needs rewriting
+def get_season_fingerprints(engine):
+    query = '''SELECT s.season_id,
+                      COALESCE(ms.match_views, 0) AS match_views,
+                      COALESCE(cs.appearances, 0) AS card_appearances,
+                      COALESCE(r.rankings, 0) AS rankings
+               FROM seasons s
+               LEFT JOIN season_match_stats ms ON s.season_id = ms.season_id
+               LEFT JOIN (SELECT season_id, SUM(appearances) AS appearances FROM season_card_stats GROUP BY season_id) cs
+                   ON s.season_id = cs.season_id
+               LEFT JOIN (SELECT season_id, COUNT(*) AS rankings FROM season_rankings GROUP BY season_id) r
+                   ON s.season_id = r.season_id'''
+    with engine.connect() as conn:
+        fingerprints = pd.read_sql(query, conn)
+        membership = pd.read_sql('SELECT player_id, clan_id FROM players ORDER BY player_id;', conn)
+        clan_count = int(pd.read_sql('SELECT COUNT(*) AS clans FROM clans;', conn)['clans'].iloc[0])
+
+    membership_hash = hashlib.md5('\n'.join(f'{p}\t{c}' for p, c in membership.itertuples(index=False)).encode()).hexdigest()
+    dimensions = [len(membership), clan_count, membership_hash] # shared by every season
+    return {row.season_id: [int(row.match_views), int(row.card_appearances), int(row.rankings), *dimensions]
+            for row in fingerprints.itertuples()}
+
+# create function to read the per-season player, card and clan rollups of the given seasons from the db
+def build_season_tables(engine, season_ids):
+    season_param = bindparam('season_ids', expanding=True)
+    params = {'season_ids': list(season_ids)}
+    with engine.connect() as conn:
+        player_matches = pd.read_sql(text('''SELECT season_id, player_id, COUNT(*) AS matches,
+                                                    SUM(CASE WHEN is_win = 1 THEN 1 ELSE 0 END) AS wins,
+                                                    AVG(CAST(crowns AS FLOAT)) AS avg_crowns,
+                                                    AVG(CAST(elixir_leaked AS FLOAT)) AS avg_elixir_leaked
+                                             FROM matches
+                                             WHERE season_id IN :season_ids
+                                             GROUP BY season_id, player_id''').bindparams(season_param), conn, params=params)
+        rankings = pd.read_sql(text('''SELECT season_id, player_id, rank, rating
+                                       FROM season_rankings WHERE season_id IN :season_ids''').bindparams(season_param),
+                               conn, params=params)
+        card_stats = pd.read_sql(text('''SELECT cs.season_id, cs.card_id, cs.appearances, cs.wins, ss.match_views
+                                         FROM season_card_stats cs
+                                         JOIN season_match_stats ss ON cs.season_id = ss.season_id
+                                         WHERE cs.season_id IN :season_ids''').bindparams(season_param), conn, params=params)
+        player_clans = pd.read_sql('SELECT player_id, clan_id FROM players;', conn)
+
+    # players: every ranked player, plus tracked players with match views but no ranking in the season
+    players = rankings.merge(player_matches, on=['season_id', 'player_id'], how='outer')
+    players[['matches', 'wins']] = players[['matches', 'wins']].fillna(0).astype('int64')
+    players['win_rate'] = players['wins'] / players['matches'].where(players['matches'] > 0)
+
+    cards = card_stats.assign(usage_rate=card_stats['appearances'] / card_stats['match_views'].where(card_stats['match_views'] > 0),
+                              win_rate=card_stats['wins'] / card_stats['appearances'].where(card_stats['appearances'] > 0))
+    cards = cards.drop(columns='match_views')
+
+    # clans: players rolled up by the clan they are in now (the db keeps no membership history)
+    clans = players.merge(player_clans, on='player_id').dropna(subset=['clan_id'])
+    clans = clans.groupby(['season_id', 'clan_id'], as_index=False).agg(players=('player_id', 'size'),
+                                                                       ranked_players=('rank', 'count'),
+                                                                       best_rank=('rank', 'min'),
+                                                                       avg_rating=('rating', 'mean'),
+                                                                       matches=('matches', 'sum'),
+                                                                       wins=('wins', 'sum'))
+    clans['win_rate'] = clans['wins'] / clans['matches'].where(clans['matches'] > 0)
+
+    return {'player_season_stats': players, 'card_season_stats': cards, 'clan_season_stats': clans}
+
+# create function to read the dimension tables the season tables relate to
+def build_dimensions(engine):
+    with engine.connect() as conn:
+        return {'players': pd.read_sql('SELECT player_id, player_name, exp_lvl, clan_id FROM players;', conn),
+                'clans': pd.read_sql('SELECT clan_id, clan_name, clan_type, clan_score, clan_location, members FROM clans;', conn),
+                'cards': pd.read_sql('SELECT card_id, card_name, rarity, elixir_cost FROM cards;', conn)}
+
+# create function to write a df as one parquet file, swapped in atomically so a dashboard refresh never reads a partial file
+def write_parquet(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+    os.replace(tmp_path, path)
+
+# create function to refresh the dashboard extract: season partitions are rewritten only for seasons whose stored data
+# changed since they were last written (or seasons given explicitly / everything with rebuild=True); returns seasons written
+def write_extract(engine, directory=extract_dir, seasons=None, rebuild=False):
+    if pq is None:
+        logging.warning('pyarrow not installed; dashboard extract was not written.')
+        return []
+
+    manifest_path = os.path.join(directory, 'manifest.json')
+    manifest = {'seasons': {}}
+    if os.path.exists(manifest_path) and not rebuild:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    fingerprints = get_season_fingerprints(engine)
+    if seasons is None:
+        seasons = [s for s, fingerprint in fingerprints.items()
+                   if manifest['seasons'].get(s, {}).get('fingerprint') != fingerprint]
+    seasons = sorted(s for s in seasons if s in fingerprints)
+
+    if seasons:
+        tables = build_season_tables(engine, seasons)
+        for table, df in tables.items():
+            for season_id in seasons:
+                partition = os.path.join(directory, table, f'season_id={season_id}')
+                shutil.rmtree(partition, ignore_errors=True)
+                dtypes = season_tables[table]
+                season_df = df.loc[df['season_id'] == season_id, list(dtypes)].astype(dtypes) # the folder name carries season_id
+                if not season_df.empty:
+                    write_parquet(season_df.reset_index(drop=True), os.path.join(partition, 'part-0.parquet'))
+
+    for dimension, df in build_dimensions(engine).items():
+        write_parquet(df, os.path.join(directory, f'{dimension}.parquet'))
+
+    written_at = datetime.utcnow().isoformat()
+    manifest['seasons'].update({s: {'fingerprint': fingerprints[s], 'written_at': written_at} for s in seasons})
+    manifest['updated_at'] = written_at
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return seasons
+
+# allows refreshing the dashboard extract from terminal:
+#     python -m src.dashboard_extract                          (seasons changed since the last write)
+#     python -m src.dashboard_extract --rebuild                (every season)
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s — %(levelname)s — %(message)s')
+    parser = argparse.ArgumentParser(description='Write the season-partitioned parquet extract read by the dashboards.')
+    parser.add_argument('--seasons', nargs='+', help='season_ids to rewrite (default: seasons whose data changed)')
+    parser.add_argument('--rebuild', action='store_true', help='rewrite every season')
+    parser.add_argument('--config', help='db config json (default: configs/config.json)')
+    parser.add_argument('--dir', default=extract_dir)
+    args = parser.parse_args()
+
+    written = write_extract(get_engine(args.config), args.dir, args.seasons, args.rebuild)
+    logging.info(f'Dashboard extract written for {len(written)} season(s): {written}')
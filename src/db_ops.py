@@ -1,19 +1,37 @@
 # set up environment
+from src.run_cache import run_cache
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
 import json
 import pandas as pd
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import Connection, DateTime, MetaData, Table, bindparam, create_engine, event, insert, text
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+load_chunk_size = int(os.environ.get('CR_LOAD_CHUNK_SIZE', 5000)) # rows written per insert batch
+max_statement_params = 2000 # sql server rejects statements with more than 2100 bound parameters
 
 # create function to create connection to sql db
-def get_engine():
-    
-    # get absolute path to config file relative to current script
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    config_path = os.path.join(project_root, 'configs', 'config.json')
-    
+# config.json may set "backend": "mssql" (default, sql server via odbc) or "sqlite" (embedded file db for offline runs / benchmarks)
+def get_engine(config_path=None):
+
+    # get absolute path to config file relative to current script (unless another config, e.g. a scratch db, is given)
+    config_path = config_path or os.path.join(project_root, 'configs', 'config.json')
+
     with open(config_path) as f:
         config = json.load(f)
 
+    if config.get('backend', 'mssql') == 'sqlite':
+        db_path = os.path.join(project_root, config.get('sqlite_path', os.path.join('data', 'clash_royale.db')))
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        engine = create_engine(f'sqlite:///{db_path}')
+
+        @event.listens_for(engine, 'connect')
+        def enforce_foreign_keys(dbapi_connection, connection_record): # sqlite leaves fk checks off by default
+            dbapi_connection.execute('PRAGMA foreign_keys = ON')
+
+        return engine
+
     server = config["server"]
     database = config["database"]
     username = config["username"]
@@ -23,127 +41,513 @@ def get_engine():
         f'mssql+pyodbc://{username}:{password}@{server}/{database}'
         '?driver=ODBC+Driver+17+for+SQL+Server'
         '&charset=utf8'
-        '&autocommit=True'
-    )
+    ) # no odbc autocommit: engine.begin() blocks (matches + watermarks + stats, purges) must commit or roll back as one
 
     return create_engine(connection_string, connect_args={'unicode_results': True})
 
+# || STORAGE BACKENDS || #
+# dialect-specific sql lives here; the module-level functions below stay backend agnostic
+
+# create class with sql shared by every backend
+# a backend missing any abstract method fails when it is instantiated, not when the method is first called
+class StorageBackend(ABC):
+    schema_script = None # file under sql/ that builds all tables, indexes and views
+
+    # build the full schema on an empty database
+    @abstractmethod
+    def create_schema(self, engine):
+        ...
+
+    # parameterized single-row upsert (named :params); update expressions use target.<col> / source.<col>
+    # updates=None inserts missing rows only; update_when adds a condition for updating matched rows
+    @abstractmethod
+    def merge_query(self, table, columns, key_columns, updates=None, update_when=None):
+        ...
+
+    # upsert a whole df; returns (rows inserted, rows updated)
+    @abstractmethod
+    def bulk_upsert(self, engine, df, table, key_column):
+        ...
+
+    def _script_path(self):
+        return os.path.join(project_root, 'sql', self.schema_script)
+
+# create class for sql server (T-SQL MERGE, staging table bulk loads)
+class MssqlBackend(StorageBackend):
+    schema_script = 'db_creation_script.sql'
+
+    def create_schema(self, engine):
+        with open(self._script_path()) as f:
+            batches = [b.strip() for b in f.read().split('\nGO')] # GO separates batches in the script
+
+        with engine.begin() as conn:
+            for batch in batches:
+                if not batch or batch.startswith(('CREATE DATABASE', 'USE ')): # engine already points at the target db
+                    continue
+                conn.exec_driver_sql(batch)
+
+    def merge_query(self, table, columns, key_columns, updates=None, update_when=None):
+        params = ', '.join(f':{c}' for c in columns)
+        column_list = ', '.join(columns)
+        on_clause = ' AND '.join(f'target.{k} = source.{k}' for k in key_columns)
+        source_list = ', '.join(f'source.{c}' for c in columns)
+
+        query = f'''
+                MERGE INTO {table} AS target
+                USING (VALUES ({params})) AS source ({column_list})
+                ON {on_clause}'''
+        if updates:
+            condition = f' AND {update_when}' if update_when else ''
+            set_list = ', '.join(f'{c} = {expr}' for c, expr in updates.items())
+            query += f'''
+                WHEN MATCHED{condition} THEN
+                    UPDATE SET {set_list}'''
+        query += f'''
+                WHEN NOT MATCHED THEN
+                    INSERT ({column_list}) VALUES ({source_list});'''
+        return query
+
+    # load df into a temp staging table, then run one set-based MERGE
+    def bulk_upsert(self, engine, df, table, key_column):
+        if df.empty: # nothing to stage; skips the temp table round trips
+            return 0, 0
+
+        columns = list(df.columns)
+        column_list = ', '.join(columns)
+        placeholders = ', '.join('?' for _ in columns)
+        update_list = ', '.join(f'{c} = source.{c}' for c in columns if c != key_column)
+        source_list = ', '.join(f'source.{c}' for c in columns)
+        stage_table = f'#stage_{table}' # session-scoped temp table, dropped when the connection closes
+
+        rows = df.astype(object).where(pd.notnull(df), None).values.tolist() # NaN -> NULL
+
+        merge_query = f'''
+                    SET NOCOUNT ON;
+                    DECLARE @changes TABLE (change_type NVARCHAR(10));
+
+                    MERGE INTO {table} AS target
+                    USING {stage_table} AS source
+                    ON target.{key_column} = source.{key_column}
+                    WHEN MATCHED THEN
+                        UPDATE SET {update_list}
+                    WHEN NOT MATCHED THEN
+                        INSERT ({column_list}) VALUES ({source_list})
+                    OUTPUT $action INTO @changes;
+
+                    SELECT COALESCE(SUM(CASE WHEN change_type = 'INSERT' THEN 1 ELSE 0 END), 0),
+                           COALESCE(SUM(CASE WHEN change_type = 'UPDATE' THEN 1 ELSE 0 END), 0)
+                    FROM @changes;
+        '''
+
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f'SELECT TOP 0 {column_list} INTO {stage_table} FROM {table};') # staging table copies target column types
+
+            cursor.fast_executemany = True # sends parameter rows in bulk arrays instead of one round trip per row
+            cursor.executemany(f'INSERT INTO {stage_table} ({column_list}) VALUES ({placeholders})', rows)
+
+            cursor.execute(merge_query)
+            inserted, updated = cursor.fetchone()
+
+            cursor.execute(f'DROP TABLE {stage_table};')
+            connection.commit()
+        finally:
+            connection.close()
+
+        return int(inserted), int(updated)
+
+# create class for embedded sqlite (INSERT ... ON CONFLICT upserts, no server needed)
+class SqliteBackend(StorageBackend):
+    schema_script = 'sqlite_creation_script.sql'
+
+    def create_schema(self, engine):
+        with open(self._script_path()) as f:
+            script = f.read()
+
+        connection = engine.raw_connection()
+        try:
+            connection.executescript(script)
+            connection.commit()
+        finally:
+            connection.close()
+
+    def merge_query(self, table, columns, key_columns, updates=None, update_when=None):
+        params = ', '.join(f':{c}' for c in columns)
+        column_list = ', '.join(columns)
+        key_list = ', '.join(key_columns)
+
+        def to_sqlite(expr): # sqlite names the incoming row "excluded" and the existing row by table name
+            return expr.replace('source.', 'excluded.').replace('target.', f'{table}.')
+
+        query = f'''
+                INSERT INTO {table} ({column_list}) VALUES ({params})
+                ON CONFLICT ({key_list}) DO '''
+        if updates:
+            set_list = ', '.join(f'{c} = {to_sqlite(expr)}' for c, expr in updates.items())
+            query += f'UPDATE SET {set_list}'
+            if update_when:
+                query += f' WHERE {to_sqlite(update_when)}'
+        else:
+            query += 'NOTHING'
+        return query + ';'
+
+    # sqlite has no network round trips, so one executemany inside a single transaction is the bulk path
+    def bulk_upsert(self, engine, df, table, key_column):
+        if df.empty:
+            return 0, 0
+
+        columns = list(df.columns)
+        updates = {c: f'source.{c}' for c in columns if c != key_column}
+        rows = df.astype(object).where(pd.notnull(df), None).to_dict('records')
+
+        with engine.begin() as conn:
+            count_before = conn.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+            conn.execute(text(self.merge_query(table, columns, [key_column], updates)), rows)
+            count_after = conn.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar()
+
+        inserted = count_after - count_before
+        return inserted, len(rows) - inserted
+
+backends = {'mssql': MssqlBackend(), 'sqlite': SqliteBackend()}
+
+# create function to pick the storage backend matching an engine's dialect
+def get_backend(engine):
+    try:
+        return backends[engine.dialect.name]
+    except KeyError:
+        raise ValueError(f'No storage backend for dialect {engine.dialect.name}; expected one of {list(backends)}')
+
+# create function to build all tables, indexes and views on an empty database
+def create_schema(engine):
+    get_backend(engine).create_schema(engine)
+
+# || DATA ACCESS || #
+
 # create function to get existing values from any column of db table
+@run_cache.cached_read(tables=lambda column, table: (table,))
 def get_existing_data(engine, column, table):
     with engine.connect() as conn:
         result = conn.execute(text(f'SELECT DISTINCT {column} FROM {table}'))
         return [getattr(row, column) for row in result]
 
-# create function to get match_view_id:match_key mapping in matches db table
-def get_match_key_mapping (engine):
+# create function to reuse an open connection (staying inside its transaction) or open a new one from an engine
+def connect(bind):
+    return nullcontext(bind) if isinstance(bind, Connection) else bind.connect()
+
+# create function to join an open connection's transaction (its caller commits) or begin a new one on an engine
+def begin(bind):
+    return nullcontext(bind) if isinstance(bind, Connection) else bind.begin()
+
+# create function to get which of the given keys already exist in a db table (key-restricted lookup, not a full scan)
+# bind may be an engine or a connection whose open transaction should see its own uncommitted rows
+def get_existing_keys(bind, column, table, keys, chunk_size=1000):
+    keys = list(keys)
+    query = text(f'SELECT {column} FROM {table} WHERE {column} IN :keys').bindparams(bindparam('keys', expanding=True))
+    existing = set()
+
+    with connect(bind) as conn:
+        for i in range(0, len(keys), chunk_size): # chunks stay under sql server's 2100 parameter limit
+            existing.update(row[0] for row in conn.execute(query, {'keys': keys[i:i + chunk_size]}))
+    return existing
+
+# create function to get the stored clan_id of each given player (players skipped by the profile ttl keep their stored clan)
+def get_player_clans(engine, player_ids, chunk_size=1000):
+    player_ids = list(player_ids)
+    query = text('SELECT clan_id FROM players WHERE player_id IN :ids AND clan_id IS NOT NULL').bindparams(bindparam('ids', expanding=True))
+    clans = set()
+
+    with engine.connect() as conn:
+        for i in range(0, len(player_ids), chunk_size):
+            clans.update(row[0] for row in conn.execute(query, {'ids': player_ids[i:i + chunk_size]}))
+    return clans
+
+# create function to get each player's latest stored battle_time (battlelog high-water mark) as {player_id: timestamp}
+@run_cache.cached_read(tables=('player_watermarks', 'matches'))
+def get_player_watermarks(engine):
+    with engine.connect() as conn:
+        watermarks = pd.read_sql('SELECT player_id, last_battle_time FROM player_watermarks;', conn)
+
+        if watermarks.empty: # table not yet populated (first run after it was added), so seed once from matches history
+            watermarks = pd.read_sql('SELECT player_id, MAX(battle_time) AS last_battle_time FROM matches GROUP BY player_id;', conn)
+
+    return dict(zip(watermarks['player_id'], pd.to_datetime(watermarks['last_battle_time'])))
+
+# create function to count each player's stored match views since a cutoff, and how many of them fall after a recent cutoff
+# (battle activity history for the battlelog poll scheduler); players without battles since the cutoff are left out
+def get_battle_counts(engine, since, recent_since):
+    query = text('''SELECT player_id, COUNT(*) AS battles,
+                           SUM(CASE WHEN battle_time >= :recent_since THEN 1 ELSE 0 END) AS recent_battles
+                    FROM matches
+                    WHERE battle_time >= :since
+                    GROUP BY player_id''').bindparams(bindparam('since', type_=DateTime()), bindparam('recent_since', type_=DateTime()))
     with engine.connect() as conn:
-        match_key_map = pd.read_sql('SELECT match_view_id, match_key FROM matches;', conn)
-        return match_key_map
-
-# create function to insert new rows of data into target db table
-def insert_new_rows(engine, source_df, target_table, method):
-    source_df.to_sql(name=target_table,
-                     con=engine,
-                     if_exists='append',
-                     index=False, 
-                     method=method
-    )
+        return pd.read_sql(query, conn, params={'since': since, 'recent_since': recent_since})
+
+# create function to collapse match views into one row per unique match, players / crowns in canonical (sorted tag) order
+def unique_match_rows(matches_df):
+    views = matches_df.drop_duplicates(subset='unique_match_key')
+    players = views['player_id'].astype(object)
+    opponents = views['opponent_id'].astype(object)
+    in_order = players.fillna('') <= opponents.fillna('')
+
+    return pd.DataFrame({'unique_match_key': views['unique_match_key'],
+                         'battle_time': views['battle_time'],
+                         'season_id': views['season_id'],
+                         'league': views['league'],
+                         'player1_id': players.where(in_order, opponents),
+                         'player2_id': opponents.where(in_order, players),
+                         'player1_crowns': views['crowns'].where(in_order, views['opp_crowns']),
+                         'player2_crowns': views['opp_crowns'].where(in_order, views['crowns'])
+    })
+
+# create function to insert new match views (and unique matches not stored yet) and advance player watermarks in one transaction
+# only views parsed from the player's own battlelog (own_log) move their watermark; a view built from the opponent's log
+# says nothing about older battles of that player still waiting in their own log
+# returns the match_view_id identity values generated for just the inserted match_keys
+# engine may also be an open connection, to insert as part of its transaction
+def insert_matches(engine, matches_df, chunksize=None):
+    chunksize = chunksize or load_chunk_size
+    own_views = matches_df[matches_df['own_log'].astype(bool)] if 'own_log' in matches_df else matches_df
+    latest = own_views.groupby('player_id', as_index=False, observed=True)['battle_time'].max()
+    latest['battle_time'] = latest['battle_time'].dt.tz_convert(None) # DATETIME2 holds naive utc
+    watermark_rows = latest.rename(columns={'battle_time': 'last_battle_time'}).to_dict('records')
+
+    query = text(get_backend(engine).merge_query('player_watermarks', ['player_id', 'last_battle_time'], ['player_id'],
+                                                 updates={'last_battle_time': 'source.last_battle_time'},
+                                                 update_when='source.last_battle_time > target.last_battle_time'))
+    query = query.bindparams(bindparam('last_battle_time', type_=DateTime())) # lets each dialect bind timestamps its own way
+
+    matches_df = matches_df.assign(battle_time=matches_df['battle_time'].dt.tz_convert(None))
+    unique_df = pd.DataFrame()
+    if 'unique_match_key' in matches_df: # the other player's view may have stored the match in an earlier run
+        unique_df = unique_match_rows(matches_df)
+        stored = get_existing_keys(engine, 'unique_match_key', 'unique_matches', unique_df['unique_match_key'])
+        unique_df = unique_df[~unique_df['unique_match_key'].isin(stored)]
+
+    season_stats = matches_df.groupby('season_id', as_index=False).agg(match_views=('match_key', 'size'), wins=('is_win', 'sum'))
+
+    with begin(engine) as conn: # watermark / season stats only change if the matches insert commits
+        if not unique_df.empty: # before matches, which reference them
+            unique_df.to_sql(name='unique_matches', con=conn, if_exists='append', index=False, chunksize=chunksize)
+
+        matches_table = Table('matches', MetaData(), autoload_with=conn)
+        matches_df = matches_df[[c for c in matches_df.columns if c in matches_table.c]] # drops parse-only columns (own_log)
+        insert_query = insert(matches_table).returning(matches_table.c.match_view_id, # OUTPUT INSERTED on sql server
+                                                          matches_table.c.match_key)
+        inserted = []
+        for chunk in iter_chunks(matches_df, chunksize): # row dicts are only built for one chunk at a time
+            match_rows = chunk.astype(object).where(pd.notnull(chunk), None).to_dict('records')
+            inserted.extend(conn.execute(insert_query, match_rows).all())
+        match_key_map = pd.DataFrame(inserted, columns=['match_view_id', 'match_key'])
+        conn.execute(query, watermark_rows)
+        increment_stats(conn, 'season_match_stats', season_stats, ['season_id'])
+
+    run_cache.invalidate('unique_matches', 'matches', 'player_watermarks', 'season_match_stats')
+    return match_key_map
+
+# create function to insert match_cards rows and add them onto the per-season card aggregates in one transaction
+# match_cards_df carries season_id and is_win of each row's match view (only the table columns are inserted)
+# engine may also be an open connection, to insert as part of its transaction
+def insert_match_cards(engine, match_cards_df, chunksize=None):
+    card_stats = match_cards_df.groupby(['season_id', 'card_id'], as_index=False, observed=True).agg(appearances=('match_view_id', 'size'),
+                                                                                                   wins=('is_win', 'sum'))
+    with begin(engine) as conn:
+        match_cards_df[['match_view_id', 'player_id', 'card_id']].to_sql(name='match_cards', con=conn, if_exists='append', index=False,
+                                                                         chunksize=chunksize or load_chunk_size)
+        increment_stats(conn, 'season_card_stats', card_stats, ['season_id', 'card_id'])
+    run_cache.invalidate('match_cards', 'season_card_stats')
+
+# create function to add counts onto an aggregate table (missing keys are inserted); every non-key column is a count
+def increment_stats(conn, table, stats_df, key_columns):
+    if stats_df.empty:
+        return
+    columns = list(stats_df.columns)
+    query = get_backend(conn.engine).merge_query(table, columns, key_columns,
+                                                 updates={c: f'target.{c} + source.{c}' for c in columns if c not in key_columns})
+    rows = stats_df.astype({c: int for c in columns if c not in key_columns}).astype(object).to_dict('records')
+    conn.execute(text(query), rows)
+
+# create function to recompute the aggregate tables from matches / match_cards (all seasons, or only the given ones)
+# used after deletes (purges, archive rebuilds), which the incremental updates do not cover
+def rebuild_stats(conn, season_ids=None):
+    if season_ids is not None and len(season_ids) == 0:
+        return
+    season_filter = 'WHERE season_id IN :season_ids' if season_ids is not None else ''
+    params = {'season_ids': list(season_ids)} if season_ids is not None else {}
+
+    def run(query):
+        query = text(query)
+        if season_ids is not None:
+            query = query.bindparams(bindparam('season_ids', expanding=True))
+        conn.execute(query, params)
+
+    run(f'DELETE FROM season_card_stats {season_filter}')
+    run(f'DELETE FROM season_match_stats {season_filter}')
+    run(f'''INSERT INTO season_match_stats (season_id, match_views, wins)
+            SELECT season_id, COUNT(*), SUM(CASE WHEN is_win = 1 THEN 1 ELSE 0 END)
+            FROM matches {season_filter}
+            GROUP BY season_id''')
+    run(f'''INSERT INTO season_card_stats (season_id, card_id, appearances, wins)
+            SELECT m.season_id, mc.card_id, COUNT(*), SUM(CASE WHEN m.is_win = 1 THEN 1 ELSE 0 END)
+            FROM match_cards mc
+            JOIN matches m ON mc.match_view_id = m.match_view_id
+            {season_filter.replace('season_id', 'm.season_id', 1)}
+            GROUP BY m.season_id, mc.card_id''')
+
+# create function to rebuild the aggregate tables in their own transaction (e.g. after adding them to an existing db)
+def rebuild_card_stats(engine, season_ids=None):
+    with engine.begin() as conn:
+        rebuild_stats(conn, season_ids)
+    run_cache.invalidate('season_match_stats', 'season_card_stats')
+
+# create function to split a df into consecutive row chunks (views, no copies)
+def iter_chunks(df, chunksize):
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+# create function to insert new rows of data into target db table, written in chunks of chunksize rows
+# (default load_chunk_size, set with the CR_LOAD_CHUNK_SIZE env var) so memory stays flat as row counts grow
+# engine may also be an open connection; its caller then invalidates run_cache reads once the transaction commits
+def insert_new_rows(engine, source_df, target_table, method, chunksize=None):
+    chunksize = chunksize or load_chunk_size
+    if method == 'multi': # one multi-row VALUES statement per chunk binds every value of the chunk
+        chunksize = max(1, min(chunksize, max_statement_params // max(len(source_df.columns), 1)))
+
+    try:
+        source_df.to_sql(name=target_table,
+                         con=engine,
+                         if_exists='append',
+                         index=False,
+                         method=method,
+                         chunksize=chunksize
+        )
+    finally:
+        if not isinstance(engine, Connection):
+            run_cache.invalidate(target_table) # chunks written before a failure are committed too
+
+# tables holding player rows, children before parents (fk order)
+player_tables = ['player_watermarks', 'match_cards', 'matches', 'season_rankings', 'players']
 
 # create function to delete rows from db (for deleted / banned players)
-def purge_failed_players(engine, failed_players):
+# one set-based DELETE per table (IN list chunked under sql server's 2100 parameter limit), all in one transaction
+def purge_failed_players(engine, failed_players, chunk_size=1000):
+    player_ids = list(set(failed_players))
+    deleted = {}
+
     with engine.begin() as conn:
-        for player_id in failed_players:
-            conn.execute(text("DELETE FROM match_cards WHERE player_id = :pid"), {"pid": player_id})
-            conn.execute(text("DELETE FROM matches WHERE player_id = :pid"), {"pid": player_id})
-            conn.execute(text("DELETE FROM season_rankings WHERE player_id = :pid"), {"pid": player_id})
-            conn.execute(text("DELETE FROM players WHERE player_id = :pid"), {"pid": player_id})
+        season_query = text('SELECT DISTINCT season_id FROM matches WHERE player_id IN :player_ids').bindparams(
+            bindparam('player_ids', expanding=True))
+        affected_seasons = {row[0] for i in range(0, len(player_ids), chunk_size)
+                            for row in conn.execute(season_query, {'player_ids': player_ids[i:i + chunk_size]})}
+
+        for table in player_tables:
+            query = text(f'DELETE FROM {table} WHERE player_id IN :player_ids').bindparams(bindparam('player_ids', expanding=True))
+            deleted[table] = sum(conn.execute(query, {'player_ids': player_ids[i:i + chunk_size]}).rowcount
+                                 for i in range(0, len(player_ids), chunk_size))
+
+        # unique matches no stored view references any more (the other player is untracked or purged too)
+        deleted['unique_matches'] = conn.execute(text('''DELETE FROM unique_matches WHERE NOT EXISTS
+                                                         (SELECT 1 FROM matches m WHERE m.unique_match_key = unique_matches.unique_match_key)''')).rowcount
+
+        rebuild_stats(conn, affected_seasons) # aggregates of seasons that lost match views
+    run_cache.invalidate(*player_tables, 'unique_matches', 'season_match_stats', 'season_card_stats')
+    return deleted
+
+# create function to delete stored matches (and their match_cards) of whole seasons, e.g. before rebuilding them from the raw archive
+# engine may also be an open connection, so the delete and the reload commit together
+def delete_season_matches(engine, season_ids):
+    season_param = bindparam('season_ids', expanding=True)
+    with begin(engine) as conn:
+        conn.execute(text('''DELETE FROM match_cards WHERE match_view_id IN
+                             (SELECT match_view_id FROM matches WHERE season_id IN :season_ids)''').bindparams(season_param),
+                     {'season_ids': list(season_ids)})
+        deleted = conn.execute(text('DELETE FROM matches WHERE season_id IN :season_ids').bindparams(season_param),
+                               {'season_ids': list(season_ids)})
+        conn.execute(text('DELETE FROM unique_matches WHERE season_id IN :season_ids').bindparams(season_param),
+                     {'season_ids': list(season_ids)})
+        rebuild_stats(conn, season_ids) # empties the seasons' aggregates; reloaded rows add onto them again
+    run_cache.invalidate('match_cards', 'matches', 'unique_matches', 'season_match_stats', 'season_card_stats')
+    return deleted.rowcount
+
+# create function to bulk upsert a df through the engine's backend; returns (rows inserted, rows updated)
+def bulk_upsert(engine, df, target_table, key_column):
+    counts = get_backend(engine).bulk_upsert(engine, df, target_table, key_column)
+    run_cache.invalidate(target_table)
+    return counts
+
+# create function to upsert one row per statement (original path, kept for comparison in benchmarks)
+# returns (rows inserted, rows updated), split by which keys already existed inside the upsert's transaction
+def row_upsert(engine, df, target_table, key_column):
+    if df.empty:
+        return 0, 0
+
+    columns = list(df.columns)
+    updates = {c: f'source.{c}' for c in columns if c != key_column}
+    query = text(get_backend(engine).merge_query(target_table, columns, [key_column], updates))
+    rows = df.astype(object).where(pd.notnull(df), None).to_dict('records')
+
+    with engine.begin() as conn:
+        existing = get_existing_keys(conn, key_column, target_table, df[key_column])
+        conn.execute(query, rows)
+    run_cache.invalidate(target_table)
+
+    inserted = df[key_column].nunique() - len(existing)
+    return inserted, len(rows) - inserted
+
+# create function to upsert a df, optionally skipping rows an EntityCache has already seen stored with identical content
+# every fetched row (changed or not) gets its fetch time refreshed once the write succeeded
+def cached_upsert(engine, df, target_table, key_column, mode, cache):
+    if df.empty:
+        return 0, 0
+
+    fetched_df = df
+    if cache is not None:
+        changed = cache.changed_rows(target_table, df, key_column)
+        unchanged_keys = df.loc[~df.index.isin(changed.index), key_column]
+        missing = set(unchanged_keys) - get_existing_keys(engine, key_column, target_table, unchanged_keys) # e.g. db was rebuilt
+        df = pd.concat([changed, df[df[key_column].isin(missing)]])
+
+    counts = (0, 0)
+    if not df.empty:
+        if mode == 'bulk':
+            counts = bulk_upsert(engine, df, target_table, key_column)
+        else:
+            counts = row_upsert(engine, df, target_table, key_column)
+
+    if cache is not None:
+        cache.mark_stored(target_table, fetched_df, key_column)
+    return counts
 
 # create function to upsert (update existing + insert new) player data in players db table
-def upsert_player_info(engine, df):
-     player_info_tuples = df.values.tolist() # query expects column values passed as tuples
-     
-     query = '''
-                MERGE INTO players AS target
-                USING (VALUES (?,?,?,?,?,?,?,?,?,?,?)) AS 
-                    source (player_id, player_name, exp_lvl, road_trophies, best_road_trophies, wins,
-                            losses, life_time_battles, max_challenge_wins, clan_id, url_encoded_pid)
-                ON target.player_id = source.player_id
-                WHEN MATCHED THEN
-                    UPDATE SET
-                        player_name = source.player_name,
-                        exp_lvl = source.exp_lvl,
-                        road_trophies = source.road_trophies,
-                        best_road_trophies = source.best_road_trophies,
-                        wins = source.wins,
-                        losses = source.losses,
-                        life_time_battles = source.life_time_battles,
-                        max_challenge_wins = source.max_challenge_wins,
-                        clan_id = source.clan_id,
-                        url_encoded_pid = source.url_encoded_pid
-                WHEN NOT MATCHED THEN
-                    INSERT (player_id, player_name, exp_lvl, road_trophies, best_road_trophies, wins, 
-                            losses, life_time_battles, max_challenge_wins, clan_id, url_encoded_pid)
-                        VALUES (source.player_id, source.player_name, source.exp_lvl, source.road_trophies,
-                                source.best_road_trophies, source.wins, source.losses, source.life_time_battles,
-                                source.max_challenge_wins, source.clan_id, source.url_encoded_pid);                                                            
-     '''
-     
-     with engine.raw_connection().cursor() as cursor:
-        cursor.executemany(query, player_info_tuples)
-        cursor.connection.commit()
+# mode='bulk' loads the df in one set-based pass; mode='row' runs one upsert per row; both return (inserted, updated)
+# cache (EntityCache) skips rows unchanged since they were last stored
+def upsert_player_info(engine, df, mode='bulk', cache=None):
+    return cached_upsert(engine, df, 'players', 'player_id', mode, cache)
 
 # create function to upsert clan data in clans db table
-def upsert_clan_info(engine, df):
-    clan_info_tuples = df.values.tolist()
-
-    query = '''
-                MERGE INTO clans AS target
-                USING (VALUES (?,?,?,?,?,?,?,?,?,?)) AS
-                    source (clan_id, clan_name, clan_type, badge_id, clan_score, clan_war_trophies,
-                            clan_location, required_trophies, members, url_encoded_cid)
-                ON target.clan_id = source.clan_id
-                WHEN MATCHED THEN
-                    UPDATE SET
-                        clan_name = source.clan_name,
-                        clan_type = source.clan_type,
-                        badge_id = source.badge_id,
-                        clan_score = source.clan_score,
-                        clan_war_trophies = source.clan_war_trophies,
-                        clan_location = source.clan_location,
-                        required_trophies = source.required_trophies,
-                        members = source.members,
-                        url_encoded_cid = source.url_encoded_cid
-                WHEN NOT MATCHED THEN
-                    INSERT (clan_id, clan_name, clan_type, badge_id, clan_score, clan_war_trophies,
-                            clan_location, required_trophies, members, url_encoded_cid)
-                        VALUES (source.clan_id, source.clan_name, source.clan_type, source.badge_id, source.clan_score,
-                                source.clan_war_trophies, source.clan_location, source.required_trophies,
-                                source.members, source.url_encoded_cid);    
-     '''
-    with engine.raw_connection().cursor() as cursor:
-        cursor.executemany(query, clan_info_tuples)
-        cursor.connection.commit()
+def upsert_clan_info(engine, df, mode='bulk', cache=None):
+    return cached_upsert(engine, df, 'clans', 'clan_id', mode, cache)
 
 # create function to upsert card data in cards db table
-def upsert_card_info(engine, df):
-    card_info_tuples = df.where(pd.notnull(df), 0).values.tolist()
-
-    query = '''
-                MERGE INTO cards AS target
-                USING (VALUES (?, ?, ?, ?, ?)) AS
-                    source (card_id, card_name, rarity, elixir_cost, evo_status)
-                ON target.card_id = source.card_id
-                WHEN MATCHED THEN
-                    UPDATE SET
-                        card_name = source.card_name,
-                        rarity = source.rarity,
-                        elixir_cost = source.elixir_cost,
-                        evo_status = source.evo_status
-                WHEN NOT MATCHED THEN
-                    INSERT (card_id, card_name, rarity, elixir_cost, evo_status)
-                        VALUES (source.card_id, source.card_name, source.rarity, source.elixir_cost, source.evo_status);
-    '''
+def upsert_card_info(engine, df, mode='bulk'):
+    df = df.where(pd.notnull(df), 0) # elixir_cost 0 is the wildcard value for mirror
+    df = assign_card_bits(engine, df)
+    return cached_upsert(engine, df, 'cards', 'card_id', mode, None)
+
+# create function to get each card's deck bitmask position as {card_id: bit}
+@run_cache.cached_read(tables=('cards',))
+def get_card_bits(engine):
+    with engine.connect() as conn:
+        cards = pd.read_sql('SELECT card_id, card_bit FROM cards WHERE card_bit IS NOT NULL;', conn)
+    return dict(zip(cards['card_id'], cards['card_bit'].astype(int)))
 
-    with engine.raw_connection().cursor() as cursor:
-        cursor.executemany(query, card_info_tuples)
-        cursor.connection.commit()
\ No newline at end of file
+# create function to give every card a permanent bit position (deck ids stay valid as cards are released);
+# cards not stored yet take the next free positions, in card_id order
+def assign_card_bits(engine, cards_df):
+    card_bits = get_card_bits(engine)
+    next_bit = max(card_bits.values(), default=-1) + 1
+    for card_id in sorted(set(cards_df['card_id']) - set(card_bits)):
+        card_bits[card_id] = next_bit
+        next_bit += 1
+    return cards_df.assign(card_bit=cards_df['card_id'].map(card_bits))
@@ -0,0 +1,141 @@
+# set up environment
+from src.db_ops import get_card_bits, get_engine, get_existing_keys, insert_new_rows
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+import argparse
+
+deck_words = 4 # deck bitmask width in uint64 words (256 card positions; ~121 cards exist today)
+
+# create function to count set bits per element (numpy < 2.0 has no bitwise_count)
+def popcount(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    bytes_view = values[..., np.newaxis].view(np.uint8)
+    return np.unpackbits(bytes_view, axis=-1).sum(axis=-1)
+
+# create function to encode each match view's cards as a fixed-width bitmask (bit = cards.card_bit)
+# returns (group keys, masks array of shape (n, deck_words) uint64); cards without a bit position are ignored
+def deck_masks(match_cards, card_bits, key='match_key'):
+    bits = match_cards['card_id'].map(card_bits)
+    known = bits.notna().to_numpy()
+    codes, keys = pd.factorize(match_cards[key])
+    bits = bits.to_numpy()[known].astype(np.int64)
+    if len(bits) and bits.max() >= deck_words * 64:
+        raise ValueError(f'card_bit {bits.max()} does not fit a {deck_words * 64}-bit deck mask; raise deck_words')
+
+    masks = np.zeros((len(keys), deck_words), dtype=np.uint64)
+    np.bitwise_or.at(masks, (codes[known], bits // 64), np.left_shift(np.uint64(1), (bits % 64).astype(np.uint64)))
+    return keys, masks
+
+# create function to turn masks into canonical deck ids (fixed-width hex, highest word first) and back
+def masks_to_ids(masks):
+    raw = np.ascontiguousarray(masks[:, ::-1]).astype('>u8').tobytes()
+    width = deck_words * 8
+    return [raw[i * width:(i + 1) * width].hex() for i in range(len(masks))]
+
+def ids_to_masks(deck_ids):
+    raw = bytes.fromhex(''.join(deck_ids))
+    return np.frombuffer(raw, dtype='>u8').reshape(-1, deck_words)[:, ::-1].astype(np.uint64)
+
+# create function to expand masks into a (n decks, n_bits) 0/1 card presence matrix
+def card_presence(masks, n_bits):
+    as_bytes = np.ascontiguousarray(masks.astype('<u8')).view(np.uint8)
+    return np.unpackbits(as_bytes, axis=1, bitorder='little')[:, :n_bits]
+
+# create function to build deck ids for match views and store unseen decks in the decks dimension
+# returns {match_key: deck_id}; the deck of a match view with unknown cards (no card_bit yet) is left unset
+def assign_deck_ids(engine, match_cards):
+    if match_cards.empty:
+        return {}
+    card_bits = get_card_bits(engine)
+    keys, masks = deck_masks(match_cards, card_bits)
+    deck_ids = np.array(masks_to_ids(masks), dtype=object)
+
+    complete = popcount(masks).sum(axis=1) == match_cards.groupby('match_key')['card_id'].size().reindex(keys).to_numpy()
+    bit_cards = {bit: card_id for card_id, bit in card_bits.items()}
+    decks = pd.DataFrame({'deck_id': deck_ids[complete], 'mask_index': np.flatnonzero(complete)}).drop_duplicates('deck_id')
+    new_decks = decks[~decks['deck_id'].isin(get_existing_keys(engine, 'deck_id', 'decks', decks['deck_id']))]
+
+    if not new_decks.empty:
+        presence = card_presence(masks[new_decks['mask_index'].to_numpy()], deck_words * 64)
+        new_decks = new_decks.assign(card_ids=['-'.join(sorted(bit_cards[b] for b in np.flatnonzero(row))) for row in presence])
+        insert_new_rows(engine, new_decks[['deck_id', 'card_ids']], 'decks', None)
+
+    return dict(zip(np.asarray(keys)[complete], deck_ids[complete]))
+
+# || ANALYTICS || #
+
+# create function to compute deck win rates with one grouping pass over deck ids (no joins)
+def deck_win_rates(deck_ids, is_win, min_matches=1):
+    decks, codes = np.unique(np.asarray(deck_ids), return_inverse=True)
+    matches = np.bincount(codes)
+    wins = np.bincount(codes, weights=np.asarray(is_win, dtype=float))
+    rates = pd.DataFrame({'deck_id': decks, 'matches': matches, 'wins': wins.astype(int), 'win_rate': wins / matches})
+    return rates[rates['matches'] >= min_matches].sort_values(['win_rate', 'matches'], ascending=False).reset_index(drop=True)
+
+# create function to build card co-occurrence and shared-win matrices from deck masks with bitwise AND + popcount
+# each card gets a bitset over match views; cell [i, j] counts views holding both cards (wins: won views only)
+def cooccurrence(masks, is_win, n_bits):
+    presence = card_presence(masks, n_bits).astype(bool)
+    card_sets = np.packbits(presence.T, axis=1, bitorder='little') # (n_bits, ceil(views / 8)) bitsets per card
+    win_set = np.packbits(np.asarray(is_win, dtype=bool), bitorder='little')
+
+    pairs = np.zeros((n_bits, n_bits), dtype=np.int64)
+    pair_wins = np.zeros((n_bits, n_bits), dtype=np.int64)
+    for i in range(n_bits):
+        both = card_sets[i] & card_sets # every partner of card i in one vectorized step
+        pairs[i] = popcount(both).sum(axis=1)
+        pair_wins[i] = popcount(both & win_set).sum(axis=1)
+    return pairs, pair_wins
+
+# create function to list a card's most frequent partners with their shared win rate
+def card_partners(masks, is_win, card_bits, card_names, card_id, top=10):
+    n_bits = max(card_bits.values()) + 1
+    pairs, pair_wins = cooccurrence(masks, is_win, n_bits)
+    bit = card_bits[card_id]
+    bit_cards = {b: c for c, b in card_bits.items()}
+
+    partners = pd.DataFrame({'card_id': [bit_cards.get(b) for b in range(n_bits)],
+                             'matches_together': pairs[bit], 'wins_together': pair_wins[bit]})
+    partners = partners[(partners['card_id'] != card_id) & partners['card_id'].notna() & (partners['matches_together'] > 0)]
+    partners['card_name'] = partners['card_id'].map(card_names)
+    partners['win_rate'] = partners['wins_together'] / partners['matches_together']
+    return partners.sort_values('matches_together', ascending=False).head(top).reset_index(drop=True)
+
+# create function to load a season's deck ids / outcomes and the card bit index from the db
+def load_season_decks(engine, season_id):
+    with engine.connect() as conn:
+        matches = pd.read_sql(text('SELECT deck_id, is_win FROM matches WHERE season_id = :season_id AND deck_id IS NOT NULL'),
+                              conn, params={'season_id': season_id})
+        cards = pd.read_sql('SELECT card_id, card_name FROM cards;', conn)
+    return matches, get_card_bits(engine), dict(zip(cards['card_id'], cards['card_name']))
+
+# allows deck / card pairing analysis from terminal:
+#     python -m src.deck_analytics --season 2025-09 --min-matches 20 --card "Hog Rider"
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Deck win rates and card co-occurrence for a season.')
+    parser.add_argument('--season', required=True)
+    parser.add_argument('--min-matches', type=int, default=10, help='minimum match views per deck')
+    parser.add_argument('--card', help='card name to list frequent partners for')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--config', help='db config json (default: configs/config.json)')
+    args = parser.parse_args()
+
+    engine = get_engine(args.config)
+    matches, card_bits, card_names = load_season_decks(engine, args.season)
+    if matches.empty:
+        raise SystemExit(f'No match views with deck ids in season {args.season}.')
+
+    is_win = matches['is_win'].astype(bool).to_numpy()
+    bit_cards = {b: c for c, b in card_bits.items()}
+    rates = deck_win_rates(matches['deck_id'], is_win, args.min_matches).head(args.top)
+    presence = card_presence(ids_to_masks(rates['deck_id']), deck_words * 64)
+    rates['cards'] = [', '.join(sorted(card_names.get(bit_cards[b], bit_cards[b]) for b in np.flatnonzero(row))) for row in presence]
+    print(rates[['matches', 'wins', 'win_rate', 'cards']].to_string(index=False))
+
+    if args.card:
+        card_id = next((c for c, name in card_names.items() if name == args.card), None)
+        if card_id is None or card_id not in card_bits:
+            raise SystemExit(f'Unknown card {args.card}.')
+        print(card_partners(ids_to_masks(matches['deck_id']), is_win, card_bits, card_names, card_id, args.top).to_string(index=False))
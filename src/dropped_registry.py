@@ -0,0 +1,92 @@
+# set up environment
+from datetime import datetime, timedelta
+import json
+import os
+import threading
+
+# create class to hold known deleted / banned players as {player_id: last verified time} with set-speed membership checks
+# entries older than a ttl can be re-checked against the api, so a player who comes back is tracked again
+# a player is only dropped after strikes_to_drop 404s, each at least strike_gap apart (one strike per run at most), so a
+# brief api glitch never purges a player's history; strikes are kept as {player_id: [count, last strike time]}
+class DroppedRegistry:
+    def __init__(self, path, strikes_to_drop=3, strike_gap=timedelta(hours=1)):
+        self.path = path
+        self.strikes_to_drop = strikes_to_drop
+        self.strike_gap = strike_gap
+        self.lock = threading.Lock() # shared by concurrently running stages
+        self.entries = {}
+        self.strikes = {}
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                dropped = json.load(f)
+            if isinstance(dropped, list): # original format: plain list of ids, last verified when the file was last written
+                written_at = datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat()
+                dropped = {player_id: written_at for player_id in dropped}
+            elif 'dropped' in dropped: # current format (player ids start with '#', so never clash with the section names)
+                self.strikes = dropped.get('strikes', {})
+                dropped = dropped['dropped']
+            self.entries = dropped
+
+    def __contains__(self, player_id):
+        return player_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def ids(self):
+        with self.lock:
+            return set(self.entries)
+
+    # add newly failed players (or refresh the verified time of ones checked again); returns ids not already dropped
+    def add(self, player_ids):
+        now = datetime.utcnow().isoformat()
+        with self.lock:
+            new_ids = [p for p in player_ids if p not in self.entries]
+            self.entries.update({p: now for p in player_ids})
+        return new_ids
+
+    def remove(self, player_ids):
+        with self.lock:
+            for player_id in player_ids:
+                self.entries.pop(player_id, None)
+
+    # count a confirmed 404 against each player; returns the players that reached strikes_to_drop (now dropped)
+    def strike(self, player_ids):
+        now = datetime.utcnow()
+        confirmed = []
+        with self.lock:
+            for player_id in player_ids:
+                count, last_strike = self.strikes.get(player_id, (0, None))
+                if last_strike is None or now - datetime.fromisoformat(last_strike) >= self.strike_gap:
+                    count, last_strike = count + 1, now.isoformat()
+                self.strikes[player_id] = [count, last_strike]
+                if count >= self.strikes_to_drop:
+                    confirmed.append(player_id)
+                    del self.strikes[player_id]
+        self.add(confirmed)
+        return confirmed
+
+    # players fetched fine again start over
+    def clear_strikes(self, player_ids):
+        with self.lock:
+            for player_id in player_ids:
+                self.strikes.pop(player_id, None)
+
+    def strike_count(self, player_id):
+        return self.strikes.get(player_id, (0, None))[0]
+
+    # dropped players last verified longer ago than ttl
+    def due_for_reverify(self, ttl):
+        now = datetime.utcnow()
+        with self.lock:
+            return [p for p, verified_at in self.entries.items() if now - datetime.fromisoformat(verified_at) >= ttl]
+
+    def save(self):
+        with self.lock:
+            state = {'dropped': dict(sorted(self.entries.items())), # stable order keeps diffs of the tracked file small
+                     'strikes': dict(sorted(self.strikes.items()))}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=0)
+        os.replace(tmp_path, self.path) # atomic swap so a crash mid-write never leaves a corrupt registry
@@ -0,0 +1,57 @@
+# set up environment
+from datetime import datetime
+import hashlib
+import json
+import os
+import pandas as pd
+
+# create class to persist fetched clan / player rows between runs with a fetch time, ttl and content hash per entity
+# fetch time + ttl decide when an entity needs re-fetching; the hash lets upserts skip rows that did not change
+class EntityCache:
+    def __init__(self, path, namespace=None):
+        self.path = path
+        self.namespace = namespace # e.g. the target db url, so a cache never vouches for rows in a different database
+        self.entries = {}
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                cache = json.load(f)
+            if cache.get('namespace') == namespace: # different / rebuilt db target means every row must be rewritten
+                self.entries = cache.get('entries', {})
+
+    @staticmethod
+    def row_hash(row):
+        return hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode()).hexdigest()
+
+    # ids (of one entity kind) never fetched or fetched longer ago than ttl
+    def stale_ids(self, kind, ids, ttl):
+        now = datetime.utcnow()
+        kind_entries = self.entries.get(kind, {})
+        stale = []
+        for entity_id in ids:
+            entry = kind_entries.get(entity_id)
+            if entry is None or now - datetime.fromisoformat(entry['fetched_at']) >= ttl:
+                stale.append(entity_id)
+        return stale
+
+    # rows of a freshly fetched df whose content differs from what was last stored (the cache itself is left unchanged)
+    def changed_rows(self, kind, df, key_column):
+        kind_entries = self.entries.get(kind, {})
+        changed = [kind_entries.get(row[key_column], {}).get('hash') != self.row_hash(row) for row in df.to_dict('records')]
+        return df[pd.Series(changed, index=df.index, dtype=bool)]
+
+    # record fetched rows as stored in the db with their content hash and fetch time (call only after the upsert commits,
+    # so a failed write leaves them stale and changed for the next run)
+    def mark_stored(self, kind, df, key_column):
+        kind_entries = self.entries.setdefault(kind, {})
+        now = datetime.utcnow().isoformat()
+
+        for row in df.to_dict('records'):
+            kind_entries[row[key_column]] = {'fetched_at': now, 'hash': self.row_hash(row)}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'namespace': self.namespace, 'entries': self.entries}, f, default=str)
+        os.replace(tmp_path, self.path) # atomic swap so a crash mid-write never leaves a corrupt cache
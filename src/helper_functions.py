@@ -1,6 +1,7 @@
 # set up environment
 from datetime import datetime, timedelta
 from pytz import UTC
+import numpy as np
 import pandas as pd
 
 # create function to generate season id and date range for last n completed sns
@@ -72,14 +73,46 @@ def current_plus_n_seasons(n=3, ref_date=None):
     # return as df
     return pd.DataFrame(seasons)
 
-# create function to find season_id based on battle_time
+# create class to build season boundaries once and map battle times to season_ids in bulk
+class SeasonCalendar:
+    def __init__(self, past_n=3, future_n=3, ref_date=None):
+        self.ref_date = ref_date or datetime.utcnow()
+        past_df = last_n_completed_seasons(n=past_n, ref_date=self.ref_date)
+        self.past_seasons = past_df
+        future_df = current_plus_n_seasons(n=future_n, ref_date=self.ref_date)
+        self.seasons = (pd.concat([past_df, future_df], ignore_index=True)
+                        .drop_duplicates(subset='season_id')
+                        .sort_values('sn_start_date', ignore_index=True))
+
+        # sorted boundary arrays used by searchsorted in assign()
+        self.season_ids = self.seasons['season_id'].to_numpy(dtype=object)
+        self.starts = pd.DatetimeIndex(self.seasons['sn_start_date'])
+        self.ends = pd.DatetimeIndex(self.seasons['sn_end_date'])
+
+    # completed seasons, oldest first (same rows as last_n_completed_seasons(n=past_n))
+    def completed(self):
+        return self.past_seasons.copy()
+
+    # season containing ref_date (same row as current_plus_n_seasons(n=0))
+    def current(self):
+        ref = self.ref_date.replace(tzinfo=UTC)
+        is_current = (self.seasons['sn_start_date'] <= ref) & (ref <= self.seasons['sn_end_date'])
+        return self.seasons[is_current].reset_index(drop=True)
+
+    # map a Series of battle times to season_ids in one vectorized pass; None where no season matches
+    def assign(self, battle_times):
+        times = pd.DatetimeIndex(pd.to_datetime(battle_times, utc=True))
+        if len(self.seasons) == 0:
+            return pd.Series([None] * len(times), index=getattr(battle_times, 'index', None), dtype=object)
+
+        idx = self.starts.searchsorted(times, side='right') - 1 # last season starting at or before each time
+        safe_idx = idx.clip(0)
+        in_season = (idx >= 0) & ~times.isna() & np.asarray(times <= self.ends[safe_idx])
+
+        season_ids = np.where(in_season, self.season_ids[safe_idx], None)
+        return pd.Series(season_ids, index=getattr(battle_times, 'index', None), dtype=object)
+
+# create function to find season_id based on battle_time (single value; use SeasonCalendar.assign for Series)
 def battle_time_to_sid(battle_time, past_n=3, future_n=3):
-    battle_time = pd.to_datetime(battle_time, utc =True)
-    past_df = last_n_completed_seasons(n=past_n)
-    future_df = current_plus_n_seasons(n=future_n)
-    all_seasons_df = pd.concat([past_df, future_df], ignore_index=True).drop_duplicates(subset='season_id')
-    
-    for _, season in all_seasons_df.iterrows():
-        if season['sn_start_date'] <= battle_time <= season['sn_end_date']:
-            return season['season_id']
-    return None
\ No newline at end of file
+    calendar = SeasonCalendar(past_n=past_n, future_n=future_n)
+    return calendar.assign(pd.Series([battle_time])).iloc[0]
@@ -0,0 +1,85 @@
+# set up environment
+from src.db_ops import get_existing_data, get_player_watermarks
+from src.run_cache import run_cache
+from datetime import datetime, timedelta
+import threading
+
+# create class to keep existing-key sets (stored season_ids, clan_ids, ranked player_ids, ...) and player battlelog
+# watermarks in memory; each is read from the db once, then updated by the stages as they write rows
+# a long-lived process (--serve / --poll) keeps one instance across runs, reloading anything older than ttl so writes
+# made by other processes (archive rebuilds, manual fixes) are picked up
+class KeySets:
+    def __init__(self, engine, ttl=timedelta(hours=6)):
+        self.engine = engine
+        self.ttl = ttl
+        self.lock = threading.Lock() # shared by concurrently running stages
+        self.sets = {} # (table, column) -> set of stored values
+        self.watermarks = None # player_id -> latest stored battle_time (naive utc)
+        self.loaded_at = {}
+        self.loads = 0 # full reads from the db, reported by the service status
+
+    def _stale(self, name):
+        loaded_at = self.loaded_at.get(name)
+        return loaded_at is None or datetime.utcnow() - loaded_at >= self.ttl
+
+    def _loaded(self, name):
+        self.loaded_at[name] = datetime.utcnow()
+        self.loads += 1
+
+    # stored values of a table column (a copy, so callers may modify it)
+    def get(self, table, column):
+        with self.lock:
+            stale = self._stale((table, column))
+            if stale:
+                self.sets[(table, column)] = set(get_existing_data(self.engine, column, table))
+                self._loaded((table, column))
+            run_cache.count('key_sets', not stale) # reported with the run's other cached reads
+            return set(self.sets[(table, column)])
+
+    # values just written; sets not loaded yet are left alone, as their first read comes from the db anyway
+    def add(self, table, column, values):
+        with self.lock:
+            if (table, column) in self.sets:
+                self.sets[(table, column)].update(values)
+
+    def get_watermarks(self):
+        with self.lock:
+            stale = self._stale('watermarks')
+            if stale:
+                self.watermarks = get_player_watermarks(self.engine)
+                self._loaded('watermarks')
+            run_cache.count('key_sets', not stale)
+            return dict(self.watermarks)
+
+    # move watermarks forward to the newest battle_time of just inserted match views
+    def advance_watermarks(self, matches_df):
+        latest = matches_df.groupby('player_id', observed=True)['battle_time'].max().dt.tz_convert(None)
+        with self.lock:
+            if self.watermarks is None:
+                return
+            for player_id, battle_time in latest.items():
+                if player_id not in self.watermarks or battle_time > self.watermarks[player_id]:
+                    self.watermarks[player_id] = battle_time
+
+    # forget purged players wherever player_ids are kept
+    def remove_players(self, player_ids):
+        player_ids = set(player_ids)
+        with self.lock:
+            for (table, column), values in self.sets.items():
+                if column == 'player_id':
+                    values.difference_update(player_ids)
+            if self.watermarks is not None:
+                for player_id in player_ids:
+                    self.watermarks.pop(player_id, None)
+
+    # drop everything, so the next reads come from the db
+    def invalidate(self):
+        with self.lock:
+            self.sets, self.watermarks, self.loaded_at = {}, None, {}
+
+    def sizes(self):
+        with self.lock:
+            sizes = {f'{table}.{column}': len(values) for (table, column), values in self.sets.items()}
+            if self.watermarks is not None:
+                sizes['player_watermarks'] = len(self.watermarks)
+            return sizes
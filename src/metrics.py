@@ -0,0 +1,223 @@
+# set up environment
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from itertools import count
+import numpy as np
+import pandas as pd
+import argparse
+import glob
+import json
+import os
+import threading
+import sys
+import time
+import tracemalloc
+
+try:
+    import psutil # optional dependency; current rss per sample
+except ImportError:
+    psutil = None
+
+try:
+    import resource # unix only; peak rss of the process when psutil is missing
+except ImportError:
+    resource = None
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+metrics_dir = os.path.join(project_root, 'logs', 'metrics')
+
+# create function to read the process's resident memory (rss) in bytes: current rss with psutil, otherwise the peak rss
+# so far from getrusage (unix), 0 where neither is available
+def get_rss():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024) # kB on linux
+    return 0
+
+# create class to collect per-stage / per-extractor performance metrics for one etl run
+# scopes (stages, extractors) record wall time, rows and peak rss; api requests are attributed to the innermost scope
+# that issued them (by scope id, so scopes sharing a name each count only their own requests), even when sent from the
+# api client's worker threads, and roll up into every enclosing scope (an extractor's requests also count for its stage)
+# trace_memory (CR_TRACE_MEMORY=1 or --trace-memory) also records peak python allocations with tracemalloc; off by
+# default as tracing slows allocation-heavy parsing several times over
+class RunMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local() # id of the innermost scope open on this thread
+        self.ids = count(1)
+        self.trace_memory = os.environ.get('CR_TRACE_MEMORY', '0') == '1'
+        self.stop_sampling = None
+        self._clear()
+
+    def _clear(self, run_id=None):
+        with self.lock:
+            self.run_id = run_id or datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+            self.started = time.perf_counter()
+            self.scopes = [] # finished scope records
+            self.active = [] # open scope records, sampled for peak memory
+            self.requests = defaultdict(list) # scope id -> [(status, latency secs)]
+            self.peak_rss = 0
+
+    # start a fresh run (call once at the start of each pipeline run); memory tracing only runs between reset and write
+    def reset(self, run_id=None):
+        self._clear(run_id)
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self._start_sampler()
+
+    # sample traced memory in the background so overlapping (concurrent) scopes each get their own peak
+    def _start_sampler(self, interval=0.05):
+        def sample():
+            while not self.stop_sampling.wait(interval):
+                self._sample_memory()
+
+        if self.stop_sampling:
+            self.stop_sampling.set()
+        self.stop_sampling = threading.Event()
+        threading.Thread(target=sample, daemon=True).start()
+
+    def _sample_memory(self):
+        rss = get_rss()
+        traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        with self.lock:
+            self.peak_rss = max(self.peak_rss, rss)
+            for record in self.active:
+                record['peak_mem_bytes'] = max(record['peak_mem_bytes'], rss)
+                if traced is not None:
+                    record['peak_traced_bytes'] = max(record.get('peak_traced_bytes', 0), traced)
+
+    # the scope is also the one requests sent from this thread (and the fetch workers it starts) count under until it closes
+    # parent_id: the scope that was open on this thread when it started (None for a stage)
+    @contextmanager
+    def scope(self, kind, name):
+        previous_scope = self.current_scope()
+        record = {'id': next(self.ids), 'parent_id': previous_scope, 'kind': kind, 'name': name, 'rows': 0,
+                  'peak_mem_bytes': 0, 'status': 'ok'}
+        self.local.scope_id = record['id']
+        with self.lock:
+            self.active.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception:
+            record['status'] = 'failed'
+            raise
+        finally:
+            self.local.scope_id = previous_scope
+            self._sample_memory()
+            record['wall_secs'] = time.perf_counter() - start
+            with self.lock:
+                self.active.remove(record)
+                self.scopes.append(record)
+
+    # decorator timing an extractor; rows = length of the returned df (first item when a tuple is returned)
+    def track_extractor(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.scope('extractor', fn.__name__) as record:
+                result = fn(*args, **kwargs)
+                df = result[0] if isinstance(result, tuple) else result
+                record['rows'] = len(df)
+                return result
+        return wrapper
+
+    def current_scope(self):
+        return getattr(self.local, 'scope_id', None)
+
+    # scope_id None: request sent outside any scope (not reported per scope)
+    def record_request(self, scope_id, status, latency):
+        with self.lock:
+            self.requests[scope_id].append((status, latency))
+
+    # build the machine-readable run summary
+    def summary(self):
+        with self.lock:
+            scopes = list(self.scopes)
+            requests = {scope_id: list(calls) for scope_id, calls in self.requests.items()}
+
+        parents = {record['id']: record['parent_id'] for record in scopes}
+        rolled_up = defaultdict(list) # scope id -> its own requests and those of every scope nested in it
+        for scope_id, calls in requests.items():
+            while scope_id is not None:
+                rolled_up[scope_id].extend(calls)
+                scope_id = parents.get(scope_id)
+
+        records = []
+        for record in scopes:
+            row = {'scope_id': record['id'], 'parent_id': record['parent_id'], 'kind': record['kind'], 'name': record['name'], 'status': record['status'],
+                   'wall_secs': round(record['wall_secs'], 3),
+                   'rows': int(record['rows'] or 0),
+                   'rows_per_sec': round(record['rows'] / record['wall_secs'], 1) if record['wall_secs'] else None,
+                   'peak_mem_mb': round(record['peak_mem_bytes'] / 2**20, 1)
+            }
+            if 'peak_traced_bytes' in record:
+                row['peak_traced_mb'] = round(record['peak_traced_bytes'] / 2**20, 1)
+            calls = rolled_up.get(record['id'], [])
+            if calls:
+                latencies = np.array([latency for _, latency in calls])
+                row['request_count'] = len(calls)
+                row['status_counts'] = {str(k): v for k, v in Counter(status for status, _ in calls).items()}
+                row['latency_ms'] = {f'p{p}': round(float(np.percentile(latencies, p)) * 1000, 1) for p in (50, 90, 99)}
+            records.append(row)
+
+        return {'run_id': self.run_id,
+                'total_wall_secs': round(time.perf_counter() - self.started, 3),
+                'peak_mem_mb': round(self.peak_rss / 2**20, 1),
+                'peak_traced_mb': round(tracemalloc.get_traced_memory()[1] / 2**20, 1) if tracemalloc.is_tracing() else None,
+                'scopes': records
+        }
+
+    # write the run summary to logs/metrics/metrics_<run_id>.json
+    def write(self, directory=None):
+        directory = directory or metrics_dir
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics_{self.run_id}.json')
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+        if self.stop_sampling:
+            self.stop_sampling.set()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return path
+
+metrics = RunMetrics() # shared by the pipeline, extractors and api client within a process
+
+# create function to load historical metrics files into one long df (one row per run + scope)
+def load_metrics_history(directory=metrics_dir):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(directory, 'metrics_*.json'))):
+        with open(path) as f:
+            run = json.load(f)
+        for scope in run['scopes']:
+            rows.append({'run_id': run['run_id'], 'total_wall_secs': run['total_wall_secs'], **scope})
+    return pd.DataFrame(rows)
+
+# create function to compare one metric across the last n runs (runs as rows, stages / extractors as columns)
+# scopes of one name within a run (e.g. an extractor called by two stages) are summed; each scope only counts its own requests
+def compare_runs(directory=metrics_dir, last=10, value='wall_secs', kind='stage'):
+    history = load_metrics_history(directory)
+    if history.empty:
+        return history
+
+    history = history[history['kind'] == kind]
+    table = history.pivot_table(index='run_id', columns='name', values=value, aggfunc='sum')
+    return table.sort_index().tail(last)
+
+# allows comparing metrics across runs from terminal: python -m src.metrics --last 10 --value wall_secs
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare per-stage / per-extractor metrics across etl runs.')
+    parser.add_argument('--last', type=int, default=10, help='number of most recent runs to show')
+    parser.add_argument('--value', default='wall_secs', choices=['wall_secs', 'rows', 'rows_per_sec', 'peak_mem_mb',
+                                                                     'peak_traced_mb', 'request_count'])
+    parser.add_argument('--kind', default='stage', choices=['stage', 'extractor'])
+    parser.add_argument('--dir', default=metrics_dir)
+    args = parser.parse_args()
+
+    table = compare_runs(args.dir, args.last, args.value, args.kind)
+    print('No metrics files found.' if table.empty else table.to_string())
@@ -0,0 +1,118 @@
+# set up environment
+from src.api_extract import match_dtypes, parse_battlelog
+from src.archive import archive_rows
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+import multiprocessing
+import json
+import pandas as pd
+
+try:
+    import orjson # optional dependency; faster json decoding / encoding in the parse workers
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError: # optional dependency; without it chunks come back as plain column lists
+    pa = None
+
+loads = orjson.loads if orjson else json.loads
+dumps = (lambda battle: orjson.dumps(battle).decode()) if orjson else (lambda battle: json.dumps(battle, separators=(',', ':')))
+
+# arrow schemas of the match / card rows parse_battlelog builds (integer widths as in match_dtypes), shared by every batch
+# so chunks concatenate even when a batch's values for a column are all null (e.g. no global ranks) or all whole numbers
+if pa is not None:
+    arrow_dtypes = {'Int8': pa.int8(), 'Int16': pa.int16(), 'category': pa.string()}
+    match_schema = pa.schema([('battle_time', pa.string()), *((c, arrow_dtypes[d]) for c, d in match_dtypes.items()),
+                              ('elixir_leaked', pa.float64()), ('own_log', pa.bool_())])
+    card_schema = pa.schema([('battle_time', pa.string()), ('player_id', pa.string()), ('card_id', pa.int64())])
+else:
+    match_schema = card_schema = None
+
+# create function to turn collected rows into a columnar chunk (arrow table, or {column: list} without pyarrow)
+def to_columns(columns, schema):
+    if pa is None:
+        return columns
+    return pa.table({name: columns.get(name, []) for name in schema.names}, schema=schema)
+
+# create function to parse one batch of raw battlelogs in a worker process: decode, walk the battles and build columns
+# batch is [(player_id, watermark, raw json bytes, archive watermark)]; shared battles are resolved within the batch, duplicates across
+# batches are dropped by the caller. returns (match columns, card columns, archive rows, [(player_id, error)])
+def parse_batch(batch, tracked=None, archive=False, game_mode='pathOfLegend'):
+    match_columns, card_columns = {}, {}
+    archived, failed = [], []
+    seen = set()
+
+    for player_id, watermark, raw, archive_watermark in batch:
+        try:
+            battlelog = loads(raw)
+            parsed = list(parse_battlelog(battlelog, game_mode, watermark, tracked, seen)) # a failing log adds no rows
+            if archive:
+                archived.extend(archive_rows(player_id, battlelog, archive_watermark, dumps))
+        except Exception as e:
+            failed.append((player_id, repr(e)))
+            continue
+
+        for match_row, card_rows in parsed:
+            for column, value in match_row.items():
+                match_columns.setdefault(column, []).append(value)
+            for card_row in card_rows:
+                for column, value in card_row.items():
+                    card_columns.setdefault(column, []).append(value)
+
+    return to_columns(match_columns, match_schema), to_columns(card_columns, card_schema), archived, failed
+
+# create function to join columnar chunks into one df; arrow chunks are concatenated without copying the column data,
+# which is only converted (once) into the df
+def concat_chunks(chunks):
+    chunks = [c for c in chunks if (c.num_rows if pa is not None else len(c))]
+    if not chunks:
+        return pd.DataFrame()
+    if pa is not None:
+        return pa.concat_tables(chunks).to_pandas()
+    return pd.DataFrame({column: list(chain.from_iterable(c[column] for c in chunks)) for column in chunks[0]})
+
+# create class to collect one fetch's raw battlelogs into batches and parse them on a BattlelogParser's worker processes
+# while the fetch keeps going
+class ParseBatch:
+    def __init__(self, parser, tracked=None, archive=False):
+        self.parser = parser
+        self.tracked = tracked
+        self.archive = archive
+        self.pending = []
+        self.futures = []
+
+    def add(self, player_id, watermark, raw, archive_watermark=None):
+        self.pending.append((player_id, watermark, raw, archive_watermark))
+        if len(self.pending) >= self.parser.batch_size:
+            self._submit()
+
+    def _submit(self):
+        if self.pending:
+            self.futures.append(self.parser.executor.submit(parse_batch, self.pending, self.tracked, self.archive))
+            self.pending = []
+
+    # wait for every batch; returns (match rows df, card rows df, archive rows, [(player_id, error)])
+    def results(self):
+        self._submit()
+        results = [future.result() for future in self.futures]
+        return (concat_chunks(r[0] for r in results), concat_chunks(r[1] for r in results),
+                [row for r in results for row in r[2]], [f for r in results for f in r[3]])
+
+# create class to keep a pool of parse worker processes (started once, reused across runs of a long-lived process)
+# workers are forked (spawned where fork is unavailable) and all started up front, so create the parser before the
+# pipeline starts its stage / fetch threads; spawned workers would re-run the calling script's module-level setup
+class BattlelogParser:
+    def __init__(self, workers, batch_size=64):
+        self.workers = workers
+        self.batch_size = batch_size # battlelogs per task; amortizes inter-process overhead
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(start_method))
+        list(self.executor.map(abs, range(workers))) # starts the workers now
+
+    def batch(self, tracked=None, archive=False):
+        return ParseBatch(self, tracked, archive)
+
+    def close(self):
+        self.executor.shutdown()
@@ -0,0 +1,104 @@
+# set up environment
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import logging
+
+# a pipeline stage: name, function taking the shared run context, and names of stages that must finish first
+# inputs: the dependencies whose results (run context entries, not just stored rows) the stage reads; always run with it
+Stage = namedtuple('Stage', ['name', 'run', 'depends_on', 'inputs'], defaults=[()])
+
+# create function to check stage declarations (unknown dependencies, cycles); returns stages in a valid run order
+def order_stages(stages):
+    by_name = {s.name: s for s in stages}
+    ordered, visiting, visited = [], set(), set()
+
+    def visit(name):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f'Stage dependency cycle involving {name}')
+        if name not in by_name:
+            raise ValueError(f'Unknown stage {name}')
+        if set(by_name[name].inputs) - set(by_name[name].depends_on):
+            raise ValueError(f'Stage {name} inputs must also be dependencies')
+        visiting.add(name)
+        for dep in by_name[name].depends_on:
+            visit(dep)
+        visiting.discard(name)
+        visited.add(name)
+        ordered.append(by_name[name])
+
+    for s in stages:
+        visit(s.name)
+    return ordered
+
+# create function to expand a stage selection; with_deps pulls in every upstream stage too, otherwise only the stages
+# producing a selected stage's inputs are (a dependency left out of the selection only counts as satisfied by stored rows)
+def select_stages(stages, names=None, with_deps=False):
+    by_name = {s.name: s for s in order_stages(stages)}
+    if not names:
+        return set(by_name)
+
+    unknown = set(names) - set(by_name)
+    if unknown:
+        raise ValueError(f'Unknown stage(s) {sorted(unknown)}; choose from {list(by_name)}')
+
+    selected = set(names)
+    to_visit = list(names)
+    while to_visit:
+        stage = by_name[to_visit.pop()]
+        for dep in stage.depends_on if with_deps else stage.inputs:
+            if dep not in selected:
+                selected.add(dep)
+                to_visit.append(dep)
+
+    added_inputs = selected - set(names) if not with_deps else set()
+    if added_inputs:
+        logging.info(f'Also running {sorted(added_inputs)}: their results are inputs of the selected stages (see --with-deps).')
+    return selected
+
+# create function to run stages concurrently, each starting as soon as its dependencies finish
+# dependencies outside the selection count as satisfied; stages downstream of a failure are skipped
+# stage functions may return the number of rows they wrote, recorded as a stage scope when metrics (RunMetrics) is given
+# returns (completed stage names, {failed or skipped stage name: error})
+def run_stages(stages, ctx, selected=None, max_workers=4, metrics=None):
+    by_name = {s.name: s for s in order_stages(stages)}
+
+    def run_stage(stage):
+        if metrics is None:
+            return stage.run(ctx)
+        with metrics.scope('stage', stage.name) as record:
+            record['rows'] = stage.run(ctx) or 0
+
+    selected = selected or set(by_name)
+    pending = {name: {d for d in by_name[name].depends_on if d in selected} for name in selected}
+    completed, failed = set(), {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while pending or running:
+            for name, deps in list(pending.items()):
+                if deps & failed.keys():
+                    failed[name] = RuntimeError(f'skipped, upstream stage failed: {sorted(deps & failed.keys())}')
+                    logging.error(f'Stage {name} skipped: upstream stage failed.')
+                    del pending[name]
+                elif deps <= completed:
+                    logging.info(f'Stage {name} started.')
+                    running[executor.submit(run_stage, by_name[name])] = name
+                    del pending[name]
+
+            if not running:
+                continue # remaining pending stages were just marked skipped
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    future.result()
+                    completed.add(name)
+                    logging.info(f'Stage {name} finished.')
+                except Exception as e:
+                    failed[name] = e
+                    logging.exception(f'Stage {name} failed: {e}')
+
+    return completed, failed
@@ -0,0 +1,72 @@
+# set up environment
+from src.db_ops import get_battle_counts
+from datetime import datetime, timedelta
+import json
+import math
+import os
+
+log_window = 25 # battles the api keeps in a player's battlelog; older ones are lost if not fetched in time
+
+# create function to estimate each player's ranked battles per hour from the matches stored for them
+# the faster of a recent (burst) and a longer (steady) window is used, so a player who starts grinding is picked up quickly
+def get_battle_rates(engine, now=None, recent=timedelta(hours=24), lookback=timedelta(days=7)):
+    now = now or datetime.utcnow()
+    counts = get_battle_counts(engine, now - lookback, now - recent)
+    recent_rates = counts['recent_battles'] / (recent.total_seconds() / 3600)
+    lookback_rates = counts['battles'] / (lookback.total_seconds() / 3600)
+    return dict(zip(counts['player_id'], recent_rates.where(recent_rates > lookback_rates, lookback_rates)))
+
+# create class to pick which tracked players' battlelogs to fetch, from their battle rates and when each was last polled
+# a player is due once their log is expected to be target_fill full since the last poll (only ranked battles are counted,
+# while the log also holds other modes, so the target leaves headroom); min / max_interval bound how often anyone is polled
+class PollScheduler:
+    def __init__(self, path, target_fill=0.5, min_interval=timedelta(minutes=15), max_interval=timedelta(hours=12)):
+        self.path = path
+        self.target_fill = target_fill
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.last_polled = {} # player_id -> last poll time (utc iso)
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.last_polled = json.load(f)
+
+    # expected share of the player's log window filled since their last poll (inf for players never polled)
+    def expected_fill(self, player_id, rate, now):
+        last_polled = self.last_polled.get(player_id)
+        if last_polled is None:
+            return math.inf
+        hours = (now - datetime.fromisoformat(last_polled)).total_seconds() / 3600
+        return rate * hours / log_window
+
+    # players due for a poll, most likely to overflow their log first; budget caps how many are returned (api requests)
+    def due(self, player_ids, rates, now=None, budget=None):
+        now = now or datetime.utcnow()
+        due = []
+        for player_id in player_ids:
+            last_polled = self.last_polled.get(player_id)
+            elapsed = now - datetime.fromisoformat(last_polled) if last_polled else None
+            if elapsed is not None and elapsed < self.min_interval:
+                continue
+
+            fill = self.expected_fill(player_id, rates.get(player_id, 0.0), now)
+            if fill >= self.target_fill or elapsed >= self.max_interval:
+                due.append((fill, player_id))
+
+        due.sort(reverse=True)
+        return [player_id for _, player_id in due[:budget]]
+
+    def mark_polled(self, player_ids, polled_at=None):
+        polled_at = (polled_at or datetime.utcnow()).isoformat()
+        self.last_polled.update({player_id: polled_at for player_id in player_ids})
+
+    # players no longer tracked are dropped from the state
+    def save(self, tracked_ids=None):
+        if tracked_ids is not None:
+            tracked_ids = set(tracked_ids)
+            self.last_polled = {p: t for p, t in self.last_polled.items() if p in tracked_ids}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(sorted(self.last_polled.items())), f, indent=0)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,126 @@
+# set up environment
+from src.spool import SpooledResponse
+from collections import Counter
+from functools import wraps
+import copy
+import threading
+
+# create class to memoize repeated reads within one etl run, so each distinct api request / db query happens once per run
+#   - api: single requests (client.get, e.g. season leaderboards, cards) are kept by path; only definitive answers
+#     (200 / 404) are kept. bulk fetches (fetch_all: players, clans, battlelogs) are read once anyway and pass through
+#   - db: reads decorated with cached_read are kept by (function, arguments) and dropped when a table they read is written
+# the cache only holds entries between reset() and stop() (one pipeline run); outside a run every read goes through
+class RunCache:
+    cached_statuses = (200, 404)
+
+    def __init__(self):
+        self.lock = threading.Lock() # shared by concurrently running stages
+        self.enabled = False
+        self.epoch = 0 # bumped by every clear, so a load started before a reset / stop is never kept
+        self._clear()
+
+    def _clear(self):
+        with self.lock:
+            self.epoch += 1
+            self.entries = {} # key -> value
+            self.tables = {} # key -> tables the entry was (or is being) read from
+            self.generations = Counter() # key -> invalidations so far; a load is only kept if none landed while it ran
+            self.hits, self.misses, self.invalidations = Counter(), Counter(), Counter() # per read kind
+
+    # start caching for a new run
+    def reset(self):
+        self._clear()
+        self.enabled = True
+
+    # end of run: entries are released so a long-lived process never serves a previous run's reads
+    def stop(self):
+        self.enabled = False
+        self._clear()
+
+    def count(self, kind, hit):
+        with self.lock:
+            (self.hits if hit else self.misses)[kind] += 1
+
+    # value of key, loaded once per run; callers get a copy so cached values are never modified in place
+    # the loader runs outside the lock; if one of its tables is written (invalidated) meanwhile, the loaded value may
+    # predate that write and is returned without being cached
+    def read(self, kind, key, loader, tables=()):
+        if not self.enabled:
+            return loader()
+        with self.lock:
+            if key in self.entries:
+                self.hits[kind] += 1
+                return copy.copy(self.entries[key])
+            self.tables[key] = set(tables) # lets invalidate() see the load in progress
+            generation = (self.epoch, self.generations[key])
+
+        value = loader()
+        with self.lock:
+            self.misses[kind] += 1
+            if (self.epoch, self.generations[key]) == generation:
+                self.entries[key] = value
+                self.tables[key] = set(tables)
+        return copy.copy(value)
+
+    # drop entries read from tables that were just written
+    def invalidate(self, *tables):
+        if not self.enabled:
+            return
+        tables = set(tables)
+        with self.lock:
+            for key in [k for k, read_from in self.tables.items() if read_from & tables]:
+                self.entries.pop(key, None) # not there yet while its load is in progress
+                del self.tables[key]
+                self.generations[key] += 1
+                self.invalidations[key[0]] += 1
+
+    # decorator memoizing a db read (first argument: engine); tables = tables it reads, or a function of its arguments
+    def cached_read(self, tables):
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(engine, *args, **kwargs):
+                read_tables = tables(*args, **kwargs) if callable(tables) else tables
+                key = (fn.__name__, engine.url.render_as_string(hide_password=True), args, tuple(sorted(kwargs.items())))
+                return self.read(fn.__name__, key, lambda: fn(engine, *args, **kwargs), read_tables)
+            return wrapper
+        return decorator
+
+    # api client wrapper serving repeated single requests from the cache
+    def client(self, client):
+        return CachingClient(client, self)
+
+    # one line per read kind for the run log
+    def report(self):
+        with self.lock:
+            kinds = sorted(set(self.hits) | set(self.misses))
+            return [f'{kind}: {self.hits[kind]} hit(s), {self.misses[kind]} miss(es)'
+                    + (f', {self.invalidations[kind]} invalidated' if self.invalidations[kind] else '') for kind in kinds]
+
+# create class exposing the ApiClient interface (get / fetch_all) on top of a run cache
+class CachingClient:
+    def __init__(self, client, cache):
+        self.client = client
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.client, name) # fetch_all, base_url, close, ... come from the wrapped client
+
+    def get(self, path, label=None):
+        if not self.cache.enabled:
+            return self.client.get(path, label)
+        key = ('api', path)
+        with self.cache.lock:
+            cached = self.cache.entries.get(key)
+        if cached is not None:
+            self.cache.count('api', True)
+            return SpooledResponse(*cached)
+
+        response = self.client.get(path, label)
+        self.cache.count('api', False)
+        if response.status_code in self.cache.cached_statuses:
+            with self.cache.lock:
+                self.cache.entries[key] = (response.status_code, response.text)
+                self.cache.tables[key] = set()
+        return response
+
+run_cache = RunCache() # shared by db_ops, the api client wrappers and the etl script
@@ -0,0 +1,205 @@
+# set up environment
+from collections import Counter
+from datetime import datetime
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+
+# create class to stand in for a requests response replayed from the spool (extractors only use status_code / json())
+class SpooledResponse:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+    @property
+    def content(self):
+        return self.text.encode()
+
+# create class to append raw api responses for one run to gzip jsonl files (one per fetch kind) plus a run manifest
+# a run killed mid-fetch leaves its spool behind; resuming replays spooled responses instead of re-hitting the api
+class RunSpool:
+    spooled_statuses = (200, 404) # definitive answers; errors / throttling / 5xx are fetched again on resume
+
+    def __init__(self, directory, run_id, resume=False):
+        self.directory = directory
+        self.run_dir = os.path.join(directory, run_id)
+        self.manifest_path = os.path.join(self.run_dir, 'manifest.json')
+        self.lock = threading.Lock()
+        self.resume = resume
+        self.replays = {} # kind -> spooled responses of the interrupted run, loaded on first use when resuming
+        self.files = {}
+        self.replayed = Counter() # kind -> responses served from the spool this run
+        self.written = Counter()
+
+        if not resume:
+            shutil.rmtree(self.run_dir, ignore_errors=True) # a fresh run never replays leftovers under the same run id
+        os.makedirs(self.run_dir, exist_ok=True)
+        if resume and os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            self.manifest['resumed_at'] = datetime.now().isoformat()
+        else:
+            self.manifest = {'run_id': run_id, 'created_at': datetime.now().isoformat(), 'status': 'running', 'stages': {}}
+        self._write_manifest()
+
+    # most recent run whose manifest never reached 'complete' (None when the last run finished cleanly)
+    @staticmethod
+    def latest_incomplete(directory):
+        for manifest_path in sorted(glob.glob(os.path.join(directory, '*', 'manifest.json')), reverse=True):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            return manifest['run_id'] if manifest.get('status') != 'complete' else None
+        return None
+
+    def _path(self, kind):
+        return os.path.join(self.run_dir, f'{kind}.jsonl.gz')
+
+    def _write_manifest(self):
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path) # atomic swap so a crash mid-write never leaves a corrupt manifest
+
+    # spooled responses of one kind as {request path: (status, raw text)}; a truncated tail from a crash is ignored
+    def load(self, kind):
+        responses = {}
+        if not os.path.exists(self._path(kind)):
+            return responses
+
+        try:
+            with gzip.open(self._path(kind), 'rt') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break # partial last line
+                    responses[record['path']] = (record['status'], record['body'])
+        except (EOFError, gzip.BadGzipFile):
+            pass # gzip member cut off mid-write; everything before it is kept
+        return responses
+
+    # responses an interrupted run spooled for one kind, loaded once per run; a fresh run has nothing to replay, so it never
+    # reads back the spool files it is writing
+    def replay(self, kind):
+        if not self.resume:
+            return {}
+        with self.lock:
+            if kind not in self.replays:
+                self.replays[kind] = self.load(kind)
+            return self.replays[kind]
+
+    def append(self, kind, path, response):
+        if response.status_code not in self.spooled_statuses:
+            return
+        line = json.dumps({'path': path, 'status': response.status_code, 'body': response.text}) + '\n'
+
+        with self.lock:
+            if kind not in self.files:
+                self.files[kind] = gzip.open(self._path(kind), 'at') # appends a new gzip member on resume
+            self.files[kind].write(line)
+            self.files[kind].flush() # sync flush per response, so a killed run keeps everything fetched so far
+            self.written[kind] += 1
+
+    # api client wrapper for one fetch kind: replays spooled responses, fetches and spools the rest
+    def client(self, kind, client):
+        return SpoolingClient(client, self, kind)
+
+    def mark_stages(self, completed, failed):
+        self.manifest['stages'].update({name: 'done' for name in completed})
+        self.manifest['stages'].update({name: 'failed' for name in failed})
+        self._write_manifest()
+
+    # close spool files; a complete run's spool is kept (newest keep_runs only) for inspection, an incomplete one for --resume
+    def close(self, complete, keep_runs=3):
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+            self.files = {}
+
+        self.manifest['status'] = 'complete' if complete else 'incomplete'
+        self.manifest['responses'] = {kind: self.manifest.get('responses', {}).get(kind, 0) + n for kind, n in self.written.items()}
+        self._write_manifest()
+
+        if complete:
+            run_dirs = sorted(os.path.dirname(p) for p in glob.glob(os.path.join(self.directory, '*', 'manifest.json')))
+            for run_dir in run_dirs[:-keep_runs]:
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+# create class exposing the ApiClient interface (get / fetch_all) on top of a run spool
+class SpoolingClient:
+    def __init__(self, client, spool, kind):
+        self.client = client
+        self.spool = spool
+        self.kind = kind
+        self.replay = spool.replay(kind)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name) # base_url, close, ... come from the wrapped client
+
+    def _replayed(self, path):
+        status, text = self.replay[path]
+        self.spool.replayed[self.kind] += 1
+        return SpooledResponse(status, text)
+
+    def get(self, path, label=None):
+        if path in self.replay:
+            return self._replayed(path)
+        response = self.client.get(path, label)
+        self.spool.append(self.kind, path, response)
+        return response
+
+    def fetch_all(self, items, path_fn):
+        to_fetch = []
+        for item in items:
+            if path_fn(item) in self.replay:
+                yield item, self._replayed(path_fn(item)), None
+            else:
+                to_fetch.append(item)
+
+        for item, response, error in self.client.fetch_all(to_fetch, path_fn):
+            if error is None:
+                self.spool.append(self.kind, path_fn(item), response)
+            yield item, response, error
+
+# create class to carry failed fetches (clans, battlelog players) over to the next run, together with a Retry-After
+# deadline the api set that outlasted the run (paused_until, epoch secs; the next run holds its requests back until then)
+class RetryQueue:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.queue = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.queue = json.load(f)
+        self.paused_until = self.queue.pop('paused_until', 0.0)
+
+    # ids queued by earlier runs for one kind; they leave the queue once taken (failures are added back)
+    def take(self, kind):
+        with self.lock:
+            return self.queue.pop(kind, [])
+
+    def add(self, kind, ids):
+        with self.lock:
+            self.queue[kind] = sorted(set(self.queue.get(kind, [])) | set(ids))
+
+    def pause_until(self, deadline):
+        with self.lock:
+            self.paused_until = max(self.paused_until, deadline)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.lock:
+            queue = {kind: ids for kind, ids in self.queue.items() if ids}
+            if self.paused_until > time.time():
+                queue['paused_until'] = self.paused_until
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(queue, f, indent=2)
+        os.replace(tmp_path, self.path)
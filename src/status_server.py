@@ -0,0 +1,42 @@
+# set up environment
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+# create class to serve a long-running pipeline's state as json on a local port, on a background thread
+#     GET /health -> 200 {"status": "ok"} or 503 {"status": "unhealthy", ...} (for supervisors / uptime checks)
+#     GET /status -> 200 with the full status (cycles, last run, key set sizes, ...)
+# report() returns (healthy, status dict) and is called per request
+class StatusServer:
+    def __init__(self, report, host='127.0.0.1', port=8787):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                healthy, status = report()
+                if self.path.rstrip('/') == '/health':
+                    code, body = (200, {'status': 'ok'}) if healthy else (503, {'status': 'unhealthy', 'reason': status.get('reason')})
+                elif self.path.rstrip('/') == '/status':
+                    code, body = 200, status
+                else:
+                    code, body = 404, {'error': 'use /health or /status'}
+
+                payload = json.dumps(body, default=str).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass # health checks would swamp the etl log
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
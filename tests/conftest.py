@@ -0,0 +1,64 @@
+# set up environment
+from benchmarks.api_fixtures import SyntheticApi
+from benchmarks.stub_server import StubServer
+from src.db_ops import create_schema, get_engine, rebuild_card_stats
+from sqlalchemy import text
+import pandas as pd
+import json
+import pytest
+
+# tables a purge / match load touches, counted before and after to check what a failed transaction left behind
+counted_tables = ['players', 'season_rankings', 'matches', 'match_cards', 'unique_matches', 'player_watermarks',
+                  'season_match_stats', 'season_card_stats']
+
+# create function to count the rows of every counted table
+def table_counts(engine):
+    with engine.connect() as conn:
+        return {t: conn.execute(text(f'SELECT COUNT(*) FROM {t}')).scalar() for t in counted_tables}
+
+# scratch sqlite db with the full schema
+@pytest.fixture
+def engine(tmp_path):
+    config_path = tmp_path / 'config.json'
+    config_path.write_text(json.dumps({'backend': 'sqlite', 'sqlite_path': str(tmp_path / 'test.db')}))
+    engine = get_engine(str(config_path))
+    create_schema(engine)
+    yield engine
+    engine.dispose()
+
+# scratch db holding two players with a ranking, a shared battle (one match view each), watermarks and aggregates
+@pytest.fixture
+def seeded_engine(engine):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO seasons VALUES ('2026-09', '2026-09-01', '2026-10-01')"))
+        conn.execute(text("INSERT INTO players (player_id, player_name) VALUES ('#A', 'a'), ('#B', 'b')"))
+        conn.execute(text("INSERT INTO season_rankings VALUES ('#A', '2026-09', 1, 3000), ('#B', '2026-09', 2, 2990)"))
+        conn.execute(text("INSERT INTO cards (card_id, card_name, card_bit) VALUES ('1', 'Knight', 0), ('2', 'Archers', 1)"))
+        conn.execute(text("INSERT INTO unique_matches (unique_match_key, battle_time, season_id) VALUES ('u1', '2026-09-10', '2026-09')"))
+        conn.execute(text('''INSERT INTO matches (match_key, battle_time, is_win, player_id, opponent_id, season_id, crowns,
+                                                  opp_crowns, unique_match_key)
+                             VALUES ('m1', '2026-09-10', 1, '#A', '#B', '2026-09', 3, 0, 'u1'),
+                                    ('m2', '2026-09-10', 0, '#B', '#A', '2026-09', 0, 3, 'u1')'''))
+        conn.execute(text('''INSERT INTO match_cards SELECT m.match_view_id, m.player_id, c.card_id
+                             FROM matches m CROSS JOIN cards c'''))
+        conn.execute(text("INSERT INTO player_watermarks VALUES ('#A', '2026-09-10'), ('#B', '2026-09-10')"))
+    rebuild_card_stats(engine)
+    return engine
+
+# create function to build a matches_df as the battlelogs stage hands it to insert_matches
+def match_views(rows):
+    df = pd.DataFrame(rows)
+    df['battle_time'] = pd.to_datetime(df['battle_time'], utc=True)
+    return df
+
+# local stub of the api (benchmarks/stub_server.py): call with a population size and StubServer options; returns (api, stub)
+@pytest.fixture
+def stub_server():
+    servers = []
+    def start(n_players=40, **kwargs):
+        api = SyntheticApi(n_players)
+        servers.append(StubServer(api, **kwargs).start())
+        return api, servers[-1]
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,69 @@
+# set up environment
+from src.api_client import ApiClient, TokenBucket
+from src.spool import RetryQueue
+import time
+
+# create function to fetch every player profile of the stub population; returns {path item: status}
+def fetch_players(api, client):
+    return {player: response.status_code if response is not None else error
+            for player, response, error in client.fetch_all(api.player_tags(url_encoded=True), lambda p: f'/players/{p}')}
+
+# requests overlap up to max_workers, so a fetch takes about n / workers round trips
+def test_fetch_all_runs_requests_concurrently(stub_server):
+    api, stub = stub_server(24, latency=0.05)
+    client = ApiClient(stub.url, {}, rate_limit=1000, max_workers=8)
+
+    start = time.perf_counter()
+    statuses = fetch_players(api, client)
+    elapsed = time.perf_counter() - start
+
+    assert set(statuses.values()) == {200} and len(statuses) == 24
+    assert 1 < stub.peak_in_flight <= 8
+    assert elapsed < 24 * 0.05 / 2
+
+# the pooled session reuses its keep-alive connections instead of opening one per request
+def test_session_reuses_keep_alive_connections(stub_server):
+    api, stub = stub_server(40)
+    client = ApiClient(stub.url, {}, rate_limit=1000, max_workers=1)
+    for player in api.player_tags(url_encoded=True)[:20]:
+        assert client.get(f'/players/{player}').status_code == 200
+    assert len(stub.connections) == 1
+
+    client = ApiClient(stub.url, {}, rate_limit=1000, max_workers=4)
+    fetch_players(api, client)
+    assert len(stub.connections) <= 1 + 4
+
+# a 429 with Retry-After is retried in-line and the request succeeds
+def test_throttled_requests_are_retried(stub_server):
+    api, stub = stub_server(12, fail_first=1, fail_status=429, retry_after=0)
+    client = ApiClient(stub.url, {}, rate_limit=1000, max_workers=4, max_retries=1)
+
+    assert set(fetch_players(api, client).values()) == {200}
+    assert stub.statuses[429] == 12 and stub.statuses[200] == 12
+
+# requests still failing transiently after their retries get one more pass at the end of fetch_all
+def test_transient_failures_get_a_retry_pass(stub_server):
+    api, stub = stub_server(12, fail_first=1, fail_status=503)
+    client = ApiClient(stub.url, {}, rate_limit=1000, max_workers=4, max_retries=0, retry_pass_delay=0)
+
+    assert set(fetch_players(api, client).values()) == {200}
+    assert stub.statuses[503] == 12 and set(stub.path_counts.values()) == {2}
+
+# a Retry-After longer than the client waits in-line is kept, carried over by the retry queue and waited out by the next run
+def test_long_retry_after_is_carried_to_the_next_run(stub_server, tmp_path):
+    api, stub = stub_server(fail_first=1, fail_status=429, retry_after=120)
+    client = ApiClient(stub.url, {}, rate_limit=1000, max_retries=2, max_retry_after=0.1)
+
+    started = time.time()
+    assert client.get('/cards').status_code == 429 # not retried in-line
+    assert 119 < client.limiter.retry_deadline - started < 121
+
+    queue = RetryQueue(str(tmp_path / 'retry_queue.json'))
+    queue.pause_until(client.limiter.retry_deadline)
+    queue.save()
+    next_run = RetryQueue(str(tmp_path / 'retry_queue.json'))
+    assert next_run.paused_until == client.limiter.retry_deadline and next_run.take('paused_until') == []
+
+    limiter = TokenBucket(1000)
+    limiter.pause(next_run.paused_until - time.time())
+    assert limiter.paused_until - time.monotonic() > 119
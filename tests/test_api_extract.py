@@ -0,0 +1,103 @@
+# set up environment
+from src.api_client import ApiClient
+from src.api_extract import (battle_time_key, build_matches, get_match_card_info, get_matches_info, iter_season_rankings,
+                             parse_battlelog)
+from src.spool import SpooledResponse
+from urllib.parse import parse_qs, urlsplit
+import src.db_ops as db_ops
+import json
+import pandas as pd
+
+# create class serving a paged leaderboard like the api (opaque after cursors), optionally failing from a given page on
+class FakeLeaderboard:
+    def __init__(self, size, fail_from_page=None):
+        self.size = size
+        self.fail_from_page = fail_from_page
+        self.paths = []
+
+    def get(self, path, label=None):
+        self.paths.append(path)
+        query = parse_qs(urlsplit(path).query)
+        start = int(query['after'][0].split('+')[1].split('/')[0]) if 'after' in query else 0 # cursor decoded from the query string
+        if self.fail_from_page is not None and len(self.paths) > self.fail_from_page:
+            return SpooledResponse(503, '{}')
+        end = min(self.size, start + int(query['limit'][0]))
+        items = [{'tag': f'#P{i}', 'rank': i + 1, 'eloRating': 3000 - i} for i in range(start, end)]
+        cursors = {'after': f'pos+{end}/=='} if end < self.size else {} # reserved characters, as in base64 cursors
+        return SpooledResponse(200, json.dumps({'items': items, 'paging': {'cursors': cursors}}))
+
+def test_rankings_follow_cursors_to_depth():
+    client = FakeLeaderboard(2500)
+    pages = list(iter_season_rankings(['2026-09'], client=client, dropped={'#P5'}, depth=2200, page_size=1000))
+
+    assert [len(p) for p in pages] == [999, 1000, 200] # dropped players are filtered out of their page
+    assert pages[-1]['rank'].max() == 2200
+    assert '&after=pos%2B1000%2F%3D%3D' in client.paths[1] # cursor percent-encoded
+
+def test_rankings_report_seasons_not_read_to_the_end():
+    failed = []
+    pages = list(iter_season_rankings(['2026-09', '2026-10'], client=FakeLeaderboard(2500, fail_from_page=1), dropped=set(),
+                                      depth=2500, page_size=1000, failed=failed))
+    assert failed == ['2026-09', '2026-10'] and len(pages) == 1
+
+# create function to build one battle of a battlelog (team player_tag vs opponent_tag)
+def battle(player_tag, opponent_tag, battle_time, battle_type='pathOfLegend', crowns=(3, 1)):
+    def side(tag, side_crowns):
+        return {'tag': tag, 'crowns': side_crowns, 'startingTrophies': 3000, 'trophyChange': 20, 'kingTowerHitPoints': 6000,
+                'princessTowersHitPoints': [3000, 2000], 'elixirLeaked': 1.5, 'cards': [{'id': 26000000 + i} for i in range(8)]}
+    return {'type': battle_type, 'battleTime': battle_time, 'leagueNumber': 7,
+            'team': [side(player_tag, crowns[0])], 'opponent': [side(opponent_tag, crowns[1])]}
+
+# one pass over a battlelog yields each ranked battle's match row together with its 8 card rows; other modes are skipped
+def test_parse_battlelog_emits_match_and_card_rows_together():
+    battlelog = [battle('#A', '#X', '20260910T100000.000Z'),
+                 battle('#A', '#Y', '20260910T090000.000Z', battle_type='clanWar'),
+                 battle('#A', '#Z', '20260910T080000.000Z', crowns=(0, 2))]
+
+    parsed = list(parse_battlelog(battlelog))
+    assert [match_row['opponent_id'] for match_row, _ in parsed] == ['#X', '#Z']
+    assert all(len(card_rows) == 8 and {r['battle_time'] for r in card_rows} == {match_row['battle_time']}
+               for match_row, card_rows in parsed)
+
+    matches = build_matches([match_row for match_row, _ in parsed])
+    match_cards = get_match_card_info([row for _, card_rows in parsed for row in card_rows])
+    assert matches['is_win'].tolist() == [True, False]
+    assert set(match_cards['match_key']) == set(matches['match_key'])
+
+# each battlelog is requested and parsed once into both dfs, which share their match keys
+def test_get_matches_info_fetches_each_battlelog_once(stub_server):
+    api, stub = stub_server(10)
+    client = ApiClient(stub.url, {}, rate_limit=1000)
+    matches, match_cards, failed = get_matches_info(api.player_tags(url_encoded=True), client=client)
+
+    assert failed == [] and not matches.empty
+    assert set(stub.path_counts.values()) == {1} and len(stub.path_counts) == 10
+    assert match_cards.groupby('match_key', observed=True).size().eq(8).all()
+    assert set(match_cards['match_key']) == set(matches['match_key'])
+
+# battles before the watermark are dropped to the millisecond; a battle at the watermark is left to the match_key check
+def test_watermark_drops_only_older_battles():
+    battlelog = [battle('#A', '#X', '20260910T100000.500Z'), # same second as the watermark, later millisecond
+                 battle('#A', '#Y', '20260910T100000.000Z'), # the stored battle itself
+                 battle('#A', '#Z', '20260910T095959.999Z')]
+
+    watermark = battle_time_key(pd.Timestamp('2026-09-10 10:00:00'))
+    assert [m['opponent_id'] for m, _ in parse_battlelog(battlelog, watermark=watermark)] == ['#X', '#Y']
+
+# a battle between two tracked players is parsed once, from whichever log comes first, into both views of one unique match
+def test_shared_battle_is_parsed_once_for_both_views(seeded_engine):
+    shared = battle('#A', '#B', '20260911T100000.000Z')
+    mirrored = battle('#B', '#A', '20260911T100000.000Z', crowns=(1, 3))
+    seen = set()
+    parsed = list(parse_battlelog([shared], tracked={'#A', '#B'}, seen=seen))
+    parsed += list(parse_battlelog([mirrored, battle('#B', '#X', '20260911T090000.000Z')], tracked={'#A', '#B'}, seen=seen))
+
+    matches = build_matches([match_row for match_row, _ in parsed])
+    assert matches[['player_id', 'opponent_id', 'is_win', 'own_log']].astype(object).values.tolist() == [
+        ['#A', '#B', True, True], ['#B', '#A', False, False], ['#B', '#X', True, True]]
+    assert matches['unique_match_key'].nunique() == 2
+    assert sum(len(card_rows) for _, card_rows in parsed) == 24
+
+    db_ops.insert_matches(seeded_engine, matches)
+    with seeded_engine.connect() as conn:
+        assert conn.exec_driver_sql('SELECT COUNT(*) FROM unique_matches').scalar() == 3 # u1 from the seeded db
@@ -0,0 +1,30 @@
+# set up environment
+from benchmarks.api_fixtures import SyntheticApi
+from datetime import datetime, timedelta, timezone
+
+now = datetime(2026, 10, 17, 12, tzinfo=timezone.utc)
+
+# payloads depend only on (seed, now), and a battle of a shared slot shows up in both players' logs with sides swapped
+def test_synthetic_battlelogs_are_deterministic_and_mirrored():
+    api = SyntheticApi(n_players=4, missing_every=4, now=now)
+    status, log_0 = api.route('/players/%23SYN000000/battlelog')
+
+    assert status == 200 and len(log_0) == api.battles_per_log
+    assert SyntheticApi(n_players=4, missing_every=4, now=now).route('/players/%23SYN000000/battlelog') == (200, log_0)
+
+    log_1 = {b['battleTime']: b for b in api.route('/players/%23SYN000001/battlelog')[1]}
+    shared = [b for b in log_0 if b['opponent'][0]['tag'] == '#SYN000001']
+    assert shared
+    for battle in shared:
+        mirrored = log_1[battle['battleTime']]
+        assert (mirrored['team'][0]['tag'], mirrored['opponent'][0]['tag']) == ('#SYN000001', '#SYN000000')
+        assert mirrored['team'][0]['cards'] == battle['opponent'][0]['cards']
+
+    assert api.route('/players/%23SYN000003')[0] == 404 # every 4th player answers like a deleted account
+
+# battles are fixed on a time grid, so a later poll sees the same battles plus the new ones on top
+def test_synthetic_battlelog_grows_over_time():
+    earlier = SyntheticApi(n_players=2, now=now).battlelog_payload(0)
+    later = SyntheticApi(n_players=2, now=now + timedelta(minutes=12)).battlelog_payload(0) # player 0 battles every 4 minutes
+
+    assert later[3:] == earlier[:-3]
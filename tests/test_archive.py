@@ -0,0 +1,41 @@
+# set up environment
+from src.archive import BattlelogArchive, read_archive, reprocess_archive
+from tests.conftest import table_counts
+from tests.test_api_extract import battle
+import src.archive as archive_module
+import pytest
+
+pytest.importorskip('pyarrow')
+
+# every battle type is archived once: the archive keeps its own watermarks instead of the ranked-only match watermarks
+def test_archive_skips_battles_archived_by_earlier_runs(tmp_path):
+    battlelog = [battle('#A', '#X', '20260910T100000.000Z', battle_type='PvP'),
+                 battle('#A', '#Y', '20260910T090000.000Z')]
+    archive = BattlelogArchive(str(tmp_path))
+    archive.add('#A', battlelog)
+    assert archive.write(run_id='run-1') == 2
+
+    archive = BattlelogArchive(str(tmp_path)) # next run
+    archive.add('#A', [battle('#A', '#Z', '20260910T100000.001Z', battle_type='PvP')] + battlelog)
+    assert archive.write(run_id='run-2') == 1
+    assert sorted(read_archive(str(tmp_path))['opponent_id']) == ['#X', '#Y', '#Z']
+
+# a rebuild deletes and reloads the seasons in one transaction, so a failed reload keeps the stored matches
+def test_failed_rebuild_keeps_stored_matches(seeded_engine, tmp_path, monkeypatch):
+    archive = BattlelogArchive(str(tmp_path / 'archive'))
+    archive.add('#A', [battle('#A', '#B', '20260911T100000.000Z')])
+    archive.write(run_id='run-1')
+    battles = read_archive(str(tmp_path / 'archive')).assign(season_id='2026-09')
+    before = table_counts(seeded_engine)
+
+    def fail(engine, match_cards_df, chunksize=None):
+        raise RuntimeError('injected failure')
+    monkeypatch.setattr(archive_module, 'insert_match_cards', fail)
+    with pytest.raises(RuntimeError, match='injected failure'):
+        reprocess_archive(seeded_engine, battles, ['2026-09'], rebuild=True)
+    assert table_counts(seeded_engine) == before
+
+    monkeypatch.undo()
+    assert reprocess_archive(seeded_engine, battles, ['2026-09'], rebuild=True)[0] == 2 # both players' views of the battle
+    with seeded_engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM matches WHERE match_key IN ('m1', 'm2')").scalar() == 0
@@ -0,0 +1,13 @@
+# set up environment
+from src.dashboard_extract import write_extract
+from sqlalchemy import text
+
+# a completed season is only rewritten when its data or the dimensions its rollups read (clan membership) change
+def test_extract_rewrites_seasons_when_clan_membership_changes(seeded_engine, tmp_path):
+    assert write_extract(seeded_engine, str(tmp_path)) == ['2026-09']
+    assert write_extract(seeded_engine, str(tmp_path)) == []
+
+    with seeded_engine.begin() as conn:
+        conn.execute(text("INSERT INTO clans (clan_id, clan_name) VALUES ('#C1', 'c')"))
+        conn.execute(text("UPDATE players SET clan_id = '#C1' WHERE player_id = '#A'"))
+    assert write_extract(seeded_engine, str(tmp_path)) == ['2026-09']
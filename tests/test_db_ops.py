@@ -0,0 +1,117 @@
+# set up environment
+from src.api_extract import build_matches, get_match_card_info, parse_battlelog
+from tests.conftest import match_views, table_counts
+from tests.test_api_extract import battle
+import src.db_ops as db_ops
+import json
+import pandas as pd
+import pytest
+
+# the sql server engine must not open odbc connections in autocommit mode, which would make engine.begin() a no-op
+def test_mssql_connection_is_not_autocommit(tmp_path, monkeypatch):
+    config_path = tmp_path / 'config.json'
+    config_path.write_text(json.dumps({'server': 'localhost', 'database': 'cr', 'username': 'u', 'password': 'p'}))
+    created = {}
+    monkeypatch.setattr(db_ops, 'create_engine', lambda url, **kwargs: created.setdefault('url', url))
+
+    db_ops.get_engine(str(config_path))
+    assert 'autocommit' not in created['url'].lower()
+
+def test_purge_failed_players(seeded_engine):
+    deleted = db_ops.purge_failed_players(seeded_engine, ['#A'])
+
+    assert deleted['matches'] == 1 and deleted['players'] == 1
+    assert deleted['unique_matches'] == 0 # still referenced by #B's view
+    counts = table_counts(seeded_engine)
+    assert counts['players'] == 1 and counts['match_cards'] == 2
+    with seeded_engine.connect() as conn:
+        assert conn.exec_driver_sql('SELECT match_views FROM season_match_stats').scalar() == 1
+
+# a failure part way through the purge (after every DELETE ran) rolls back every table
+def test_purge_failure_rolls_back_every_table(seeded_engine, monkeypatch):
+    before = table_counts(seeded_engine)
+
+    def fail(conn, season_ids=None):
+        raise RuntimeError('injected failure')
+    monkeypatch.setattr(db_ops, 'rebuild_stats', fail)
+
+    with pytest.raises(RuntimeError, match='injected failure'):
+        db_ops.purge_failed_players(seeded_engine, ['#A', '#B'])
+    assert table_counts(seeded_engine) == before
+
+# the season aggregates only move together with the match views they count
+def test_insert_matches_failure_leaves_matches_and_stats_unchanged(seeded_engine, monkeypatch):
+    views = match_views([{'match_key': 'm3', 'battle_time': '2026-09-12T10:00:00', 'is_win': True, 'player_id': '#A',
+                          'opponent_id': '#C', 'season_id': '2026-09', 'crowns': 1, 'opp_crowns': 0, 'own_log': True}])
+    before = table_counts(seeded_engine)
+
+    def fail(conn, table, stats_df, key_columns):
+        raise RuntimeError('injected failure')
+    monkeypatch.setattr(db_ops, 'increment_stats', fail)
+
+    with pytest.raises(RuntimeError, match='injected failure'):
+        db_ops.insert_matches(seeded_engine, views)
+    assert table_counts(seeded_engine) == before
+    with seeded_engine.connect() as conn:
+        watermark = conn.exec_driver_sql("SELECT last_battle_time FROM player_watermarks WHERE player_id = '#A'").scalar()
+    assert watermark.startswith('2026-09-10')
+
+    monkeypatch.undo()
+    db_ops.insert_matches(seeded_engine, views)
+    with seeded_engine.connect() as conn:
+        assert conn.exec_driver_sql('SELECT match_views, wins FROM season_match_stats').one() == (3, 2)
+
+# both upsert paths report how many rows were inserted vs updated, and an empty df is a no-op
+@pytest.mark.parametrize('mode', ['bulk', 'row'])
+def test_upsert_reports_inserted_and_updated(seeded_engine, mode):
+    players = pd.DataFrame({'player_id': ['#A', '#C', '#D'], 'player_name': ['a2', 'c', 'd']})
+
+    assert db_ops.upsert_player_info(seeded_engine, players, mode=mode) == (2, 1)
+    assert db_ops.upsert_player_info(seeded_engine, players.iloc[:0], mode=mode) == (0, 0)
+    with seeded_engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT player_name FROM players WHERE player_id = '#A'").scalar() == 'a2'
+        assert conn.exec_driver_sql('SELECT COUNT(*) FROM players').scalar() == 4
+
+# the returned map holds the generated match_view_id of just the inserted views, across insert chunks
+def test_insert_matches_returns_ids_of_inserted_views(seeded_engine):
+    views = match_views([{'match_key': f'm{i}', 'battle_time': '2026-09-12T10:00:00', 'is_win': True, 'player_id': '#A',
+                          'opponent_id': '#C', 'season_id': '2026-09', 'crowns': 1, 'opp_crowns': 0} for i in (3, 4, 5)])
+
+    match_key_map = db_ops.insert_matches(seeded_engine, views, chunksize=2)
+
+    with seeded_engine.connect() as conn:
+        stored = dict(conn.exec_driver_sql("SELECT match_key, match_view_id FROM matches WHERE match_key NOT IN ('m1', 'm2')").all())
+    assert dict(zip(match_key_map['match_key'], match_key_map['match_view_id'])) == stored
+    assert sorted(stored) == ['m3', 'm4', 'm5']
+
+# a backend that leaves out part of the interface cannot be instantiated
+def test_incomplete_backend_fails_at_instantiation(engine):
+    class NoBulkBackend(db_ops.StorageBackend):
+        def create_schema(self, engine):
+            pass
+
+        def merge_query(self, table, columns, key_columns, updates=None, update_when=None):
+            return ''
+
+    with pytest.raises(TypeError, match='bulk_upsert'):
+        NoBulkBackend()
+    assert isinstance(db_ops.get_backend(engine), db_ops.SqliteBackend)
+
+# parsed matches use compact nullable dtypes and categorical tags; missing api fields load as NULL across insert chunks
+def test_typed_frames_load_in_chunks(seeded_engine):
+    missing_hp = battle('#A', '#X', '20260910T100000.000Z')
+    del missing_hp['team'][0]['kingTowerHitPoints']
+    parsed = list(parse_battlelog([missing_hp, battle('#A', '#Y', '20260911T100000.000Z')]))
+    matches = build_matches([match_row for match_row, _ in parsed])
+    match_cards = get_match_card_info([row for _, card_rows in parsed for row in card_rows])
+
+    assert str(matches['crowns'].dtype) == 'Int8' and str(matches['king_tower_hp'].dtype) == 'Int16'
+    assert isinstance(matches['player_id'].dtype, pd.CategoricalDtype)
+    assert isinstance(match_cards['card_id'].dtype, pd.CategoricalDtype)
+
+    match_key_map = db_ops.insert_matches(seeded_engine, matches, chunksize=1)
+    assert len(match_key_map) == 2
+    with seeded_engine.connect() as conn:
+        stored = conn.exec_driver_sql("SELECT opponent_id, king_tower_hp, crowns FROM matches WHERE player_id = '#A' "
+                                      "AND match_key NOT IN ('m1') ORDER BY battle_time").all()
+    assert stored == [('#X', None, 3), ('#Y', 6000, 3)]
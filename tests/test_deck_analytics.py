@@ -0,0 +1,25 @@
+# set up environment
+from src.deck_analytics import assign_deck_ids, cooccurrence, ids_to_masks, masks_to_ids
+import pandas as pd
+
+# card order does not change a deck id; a view holding a card without a bit position gets none, and each deck is stored once
+def test_deck_ids_are_canonical_and_stored_once(seeded_engine):
+    match_cards = pd.DataFrame({'match_key': ['m3', 'm3', 'm4', 'm4', 'm5', 'm5'],
+                                'card_id': ['1', '2', '2', '1', '1', '99']})
+
+    deck_ids = assign_deck_ids(seeded_engine, match_cards)
+
+    assert set(deck_ids) == {'m3', 'm4'} and deck_ids['m3'] == deck_ids['m4']
+    assert masks_to_ids(ids_to_masks([deck_ids['m3']])) == [deck_ids['m3']]
+    assign_deck_ids(seeded_engine, match_cards) # a later batch with the same deck adds no row
+    with seeded_engine.connect() as conn:
+        assert conn.exec_driver_sql('SELECT deck_id, card_ids FROM decks').all() == [(deck_ids['m3'], '1-2')]
+
+# pair counts (and wins) of two cards come from the views holding both
+def test_cooccurrence_counts_views_holding_both_cards(seeded_engine):
+    match_cards = pd.DataFrame({'match_key': ['w', 'w', 'l', 'x'], 'card_id': ['1', '2', '1', '2']})
+    masks = ids_to_masks(list(assign_deck_ids(seeded_engine, match_cards).values())) # views w, l, x
+
+    pairs, pair_wins = cooccurrence(masks, [True, False, True], n_bits=2)
+    assert pairs.tolist() == [[2, 1], [1, 2]]
+    assert pair_wins.tolist() == [[1, 1], [1, 2]]
@@ -0,0 +1,38 @@
+# set up environment
+from datetime import datetime, timedelta
+from src.entity_cache import EntityCache
+import src.db_ops as db_ops
+import pandas as pd
+import pytest
+
+def players(*names):
+    return pd.DataFrame({'player_id': ['#A', '#C'][:len(names)], 'player_name': list(names)})
+
+# fetched rows only become fresh / unchanged once their upsert succeeded; the cache keeps no copy of the row itself
+def test_cache_updates_only_after_a_successful_write(seeded_engine, monkeypatch, tmp_path):
+    cache = EntityCache(str(tmp_path / 'cache.json'))
+
+    def fail(engine, df, target_table, key_column):
+        raise RuntimeError('injected failure')
+    monkeypatch.setattr(db_ops, 'bulk_upsert', fail)
+    with pytest.raises(RuntimeError):
+        db_ops.upsert_player_info(seeded_engine, players('a2', 'c'), cache=cache)
+    assert cache.stale_ids('players', ['#A', '#C'], timedelta(hours=1)) == ['#A', '#C']
+
+    monkeypatch.undo()
+    assert db_ops.upsert_player_info(seeded_engine, players('a2', 'c'), cache=cache) == (1, 1)
+    assert cache.stale_ids('players', ['#A', '#C'], timedelta(hours=1)) == []
+    assert set(cache.entries['players']['#A']) == {'fetched_at', 'hash'}
+
+    assert db_ops.upsert_player_info(seeded_engine, players('a2', 'c'), cache=cache) == (0, 0) # unchanged rows are skipped
+    assert db_ops.upsert_player_info(seeded_engine, players('a3'), cache=cache) == (0, 1)
+
+# unchanged rows still refresh their fetch time, and entries older than the ttl are due again
+def test_unchanged_rows_refresh_fetch_time(seeded_engine, tmp_path):
+    cache = EntityCache(str(tmp_path / 'cache.json'))
+    db_ops.upsert_player_info(seeded_engine, players('a2'), cache=cache)
+    cache.entries['players']['#A']['fetched_at'] = (datetime.utcnow() - timedelta(days=2)).isoformat()
+    assert cache.stale_ids('players', ['#A'], timedelta(days=1)) == ['#A']
+
+    db_ops.upsert_player_info(seeded_engine, players('a2'), cache=cache)
+    assert cache.stale_ids('players', ['#A'], timedelta(days=1)) == []
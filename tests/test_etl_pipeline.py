@@ -0,0 +1,46 @@
+# set up environment
+from src.api_client import TokenBucket
+from tests.conftest import table_counts
+import importlib
+import json
+import os
+import pytest
+
+# the pipeline module pointed at a scratch db, scratch files and a local api stub (as benchmarks/bench_suite.py does);
+# returns (etl module, stub)
+@pytest.fixture
+def etl(engine, stub_server, tmp_path, monkeypatch):
+    monkeypatch.setenv('CR_DB_CONFIG', str(tmp_path / 'config.json')) # written by the engine fixture
+    monkeypatch.setenv('CR_LOG_DIR', str(tmp_path / 'logs'))
+    etl = importlib.import_module('etl_pipeline_script')
+    import src.api_extract as api_extract
+    import src.metrics as run_metrics
+
+    api, stub = stub_server(n_players=30)
+    dropped_path = tmp_path / 'dropped_players.json'
+    dropped_path.write_text(json.dumps([]))
+    monkeypatch.setattr(etl, 'engine', engine)
+    monkeypatch.setattr(etl, 'dropped_players_path', str(dropped_path))
+    monkeypatch.setattr(api_extract, 'dropped_players_path', str(dropped_path))
+    monkeypatch.setattr(etl, 'entity_cache_path', str(tmp_path / 'entity_cache.json'))
+    monkeypatch.setattr(etl, 'spool_dir', str(tmp_path / 'spool'))
+    monkeypatch.setattr(etl, 'retry_queue_path', str(tmp_path / 'spool' / 'retry_queue.json'))
+    monkeypatch.setattr(etl, 'archive_dir', str(tmp_path / 'archive'))
+    monkeypatch.setattr(etl, 'extract_dir', str(tmp_path / 'extract'))
+    monkeypatch.setattr(run_metrics, 'metrics_dir', str(tmp_path / 'metrics'))
+    monkeypatch.setattr(api_extract.client, 'base_url', stub.url)
+    monkeypatch.setattr(api_extract.client, 'limiter', TokenBucket(2000))
+    return etl, stub
+
+# battlelogs wait for this run's rankings, so the first run on an empty db already loads every ranked player's matches
+def test_first_run_on_empty_db_loads_matches(etl):
+    etl, stub = etl
+    etl.run_etl_script()
+
+    counts = table_counts(etl.engine)
+    assert counts['season_rankings'] > 0 and counts['matches'] > 0 and counts['match_cards'] > 0
+    with etl.engine.connect() as conn:
+        fetched = {p for p, in conn.exec_driver_sql('SELECT DISTINCT player_id FROM season_rankings')}
+        watermarked = {p for p, in conn.exec_driver_sql('SELECT player_id FROM player_watermarks')}
+    assert watermarked == fetched
+    assert stub.path_counts.keys() >= {f'/players/{p.replace("#", "%23")}/battlelog' for p in fetched}
@@ -0,0 +1,19 @@
+# set up environment
+from src.helper_functions import SeasonCalendar, last_n_completed_seasons
+from datetime import datetime
+import pandas as pd
+
+# seasons run from the first monday of a month 09:05 utc to one second before the next one's
+def test_assign_maps_battle_times_to_seasons_in_bulk():
+    calendar = SeasonCalendar(past_n=3, ref_date=datetime(2026, 10, 17))
+    battle_times = pd.Series(pd.to_datetime(['2026-09-07T09:05:00Z', # first second of 2026-09
+                                             '2026-10-05T09:04:59Z', # last second of 2026-09
+                                             '2026-10-05T09:05:00Z', # first second of the current season
+                                             '2020-01-01T00:00:00Z', # before every known season
+                                             None]), index=[10, 11, 12, 13, 14])
+
+    season_ids = calendar.assign(battle_times)
+    assert season_ids.tolist() == ['2026-09', '2026-09', '2026-10', None, None]
+    assert season_ids.index.tolist() == [10, 11, 12, 13, 14]
+    assert calendar.completed().equals(last_n_completed_seasons(n=3, ref_date=datetime(2026, 10, 17)))
+    assert calendar.current()['season_id'].tolist() == ['2026-10']
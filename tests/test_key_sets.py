@@ -0,0 +1,26 @@
+# set up environment
+from datetime import timedelta
+from src.key_sets import KeySets
+from tests.conftest import match_views
+
+# key sets are read once, kept in step with writes and purges, and re-read once older than the ttl
+def test_key_sets_follow_writes_until_reloaded(seeded_engine):
+    keys = KeySets(seeded_engine)
+    assert keys.get('season_rankings', 'player_id') == {'#A', '#B'}
+    keys.add('season_rankings', 'player_id', ['#C'])
+    keys.remove_players(['#A'])
+    assert keys.get('season_rankings', 'player_id') == {'#B', '#C'} and keys.loads == 1
+
+    keys.ttl = timedelta(0) # stale: the next read comes from the db again
+    assert keys.get('season_rankings', 'player_id') == {'#A', '#B'} and keys.loads == 2
+
+# watermarks only move forward, to the newest battle of inserted match views
+def test_watermarks_advance_with_inserted_views(seeded_engine):
+    keys = KeySets(seeded_engine)
+    before = keys.get_watermarks()['#A']
+    keys.advance_watermarks(match_views([{'player_id': '#A', 'battle_time': '2026-09-12T10:00:00'},
+                                         {'player_id': '#B', 'battle_time': '2026-09-01T10:00:00'}]))
+
+    watermarks = keys.get_watermarks()
+    assert watermarks['#A'] > before and str(watermarks['#A']) == '2026-09-12 10:00:00'
+    assert watermarks['#B'] == before
@@ -0,0 +1,29 @@
+# set up environment
+from src.api_client import ApiClient
+from src.metrics import RunMetrics
+from src.pipeline import Stage, run_stages
+import src.api_client as api_client
+
+# requests sent by an extractor (including from the api client's worker threads) count for the extractor and its stage
+def test_extractor_requests_roll_up_into_their_stage(stub_server, monkeypatch, tmp_path):
+    api, stub = stub_server(n_players=6)
+    metrics = RunMetrics()
+    monkeypatch.setattr(api_client, 'metrics', metrics)
+    client = ApiClient(stub.url, {}, rate_limit=1000, max_workers=3)
+
+    def battlelogs(ctx):
+        client.get('/cards') # sent by the stage itself
+        with metrics.scope('extractor', 'get_matches_info'):
+            responses = list(client.fetch_all(api.player_tags(url_encoded=True), lambda p: f'/players/{p}/battlelog'))
+        return len(responses)
+
+    metrics.reset(run_id='test')
+    run_stages([Stage('battlelogs', battlelogs, [])], {}, metrics=metrics)
+    metrics.write(str(tmp_path))
+    scopes = {s['name']: s for s in metrics.summary()['scopes']}
+
+    extractor, stage = scopes['get_matches_info'], scopes['battlelogs']
+    assert extractor['parent_id'] == stage['scope_id'] and stage['parent_id'] is None
+    assert extractor['request_count'] == 6 and extractor['status_counts'] == {'200': 6}
+    assert stage['request_count'] == 7 and stage['rows'] == 6
+    assert set(stage['latency_ms']) == {'p50', 'p90', 'p99'}
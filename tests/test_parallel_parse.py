@@ -0,0 +1,28 @@
+# set up environment
+from src.api_extract import build_matches, get_match_card_info
+from src.parallel_parse import concat_chunks, parse_batch
+import json
+
+# create function to build a raw ranked battlelog response for one player (ranked=False: no global ranks, like players
+# outside the top leaderboard; whole-number elixir leaked)
+def raw_battlelog(tag, opponent_tag, battle_time, ranked=True):
+    def side(player_tag, crowns):
+        return {'tag': player_tag, 'crowns': crowns, 'startingTrophies': 3000, 'trophyChange': 20 if crowns else -20,
+                'kingTowerHitPoints': 6000, 'princessTowersHitPoints': [3000], 'elixirLeaked': 1.5 if ranked else 0,
+                'cards': [{'id': 26000000 + i} for i in range(8)], **({'globalRank': 10} if ranked else {})}
+    battle = {'type': 'pathOfLegend', 'battleTime': battle_time, 'leagueNumber': 7,
+              'team': [side(tag, 3)], 'opponent': [side(opponent_tag, 1)]}
+    return json.dumps([battle]).encode()
+
+# batches parsed in different workers infer nothing per batch: an all-null rank column still joins an int one
+def test_batches_with_all_null_rank_column_concatenate():
+    unranked = parse_batch([('#A', None, raw_battlelog('#A', '#X', '20260910T100000.000Z', ranked=False), None)])
+    ranked = parse_batch([('#B', None, raw_battlelog('#B', '#Y', '20260910T110000.000Z'), None)])
+
+    match_rows = concat_chunks([unranked[0], ranked[0]])
+    card_rows = concat_chunks([unranked[1], ranked[1]])
+
+    matches = build_matches(match_rows)
+    assert len(matches) == 2 and len(get_match_card_info(card_rows)) == 16
+    assert matches['current_global_rank'].isna().tolist() == [True, False]
+    assert matches['elixir_leaked'].tolist() == [0, 1.5]
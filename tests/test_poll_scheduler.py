@@ -0,0 +1,30 @@
+# set up environment
+from datetime import datetime, timedelta
+from src.poll_scheduler import PollScheduler, get_battle_rates
+
+now = datetime(2026, 10, 17, 12)
+
+# never polled players come first, then those whose log is expected to be fullest; idle players wait for max_interval
+def test_due_players_follow_expected_log_fill(tmp_path):
+    scheduler = PollScheduler(str(tmp_path / 'poll_state.json'))
+    scheduler.mark_polled(['#BUSY', '#IDLE', '#RECENT'], polled_at=now - timedelta(hours=2))
+    scheduler.mark_polled(['#RECENT'], polled_at=now - timedelta(minutes=5))
+    rates = {'#BUSY': 10.0, '#IDLE': 0.1, '#RECENT': 100.0} # ranked battles per hour
+
+    assert scheduler.due(['#IDLE', '#BUSY', '#RECENT', '#NEW'], rates, now) == ['#NEW', '#BUSY']
+    assert scheduler.due(['#IDLE', '#BUSY', '#NEW'], rates, now, budget=1) == ['#NEW']
+    assert '#IDLE' in scheduler.due(['#IDLE'], rates, now + timedelta(hours=10)) # 12 hours since its last poll
+
+    scheduler.save(tracked_ids=['#BUSY'])
+    assert list(PollScheduler(str(tmp_path / 'poll_state.json')).last_polled) == ['#BUSY']
+
+# battle rates are the faster of the last day's and the last week's pace of stored matches
+def test_battle_rates_prefer_a_recent_burst(seeded_engine):
+    with seeded_engine.begin() as conn:
+        conn.exec_driver_sql('''INSERT INTO matches (match_key, battle_time, is_win, player_id, opponent_id, season_id, crowns, opp_crowns)
+                                VALUES ('b1', '2026-09-10 10:00:00', 1, '#B', '#X', '2026-09', 1, 0),
+                                       ('b2', '2026-09-10 11:00:00', 1, '#B', '#X', '2026-09', 1, 0)''')
+
+    rates = get_battle_rates(seeded_engine, now=datetime(2026, 9, 10, 12))
+    assert rates['#B'] == 3 / 24 # three matches in the last 24 hours (m2 plus b1, b2)
+    assert rates['#A'] == 1 / 24
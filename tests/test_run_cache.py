@@ -0,0 +1,18 @@
+# set up environment
+from src.run_cache import RunCache
+
+# a write (invalidation) landing while a read is loading must not leave the value loaded before it in the cache
+def test_invalidation_during_load_is_not_lost():
+    cache = RunCache()
+    cache.reset()
+    stored = {'rows': 1}
+
+    def load_then_write():
+        value = dict(stored) # read before the write below
+        stored['rows'] = 2
+        cache.invalidate('players') # e.g. a concurrent stage inserting players
+        return value
+
+    assert cache.read('keys', ('keys', 'players'), load_then_write, ['players']) == {'rows': 1}
+    assert cache.read('keys', ('keys', 'players'), lambda: dict(stored), ['players']) == {'rows': 2}
+    assert cache.read('keys', ('keys', 'players'), lambda: {'rows': 3}, ['players']) == {'rows': 2} # now cached
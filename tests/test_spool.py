@@ -0,0 +1,32 @@
+# set up environment
+from src.spool import RunSpool, SpooledResponse
+import src.spool as spool_module
+
+# create class to stand in for the api client, counting the requests that reach it
+class FakeClient:
+    def __init__(self):
+        self.paths = []
+
+    def get(self, path, label=None):
+        self.paths.append(path)
+        return SpooledResponse(200, f'{{"path": "{path}"}}')
+
+# a normal run only writes its spool; a resumed run replays it, reading each kind's spool file once
+def test_spool_replays_only_on_resume(tmp_path, monkeypatch):
+    api = FakeClient()
+    spool = RunSpool(str(tmp_path), 'run-1')
+    for _ in range(2): # a fresh client per fetch, as the pipeline does
+        assert spool.client('cards', api).get('/cards').json() == {'path': '/cards'}
+    spool.close(complete=False)
+    assert api.paths == ['/cards', '/cards'] and not spool.replayed
+
+    loads = []
+    load = RunSpool.load
+    monkeypatch.setattr(spool_module.RunSpool, 'load', lambda self, kind: loads.append(kind) or load(self, kind))
+    resumed = RunSpool(str(tmp_path), RunSpool.latest_incomplete(str(tmp_path)), resume=True)
+    for _ in range(2):
+        assert resumed.client('cards', api).get('/cards').json() == {'path': '/cards'}
+    resumed.close(complete=True)
+
+    assert api.paths == ['/cards', '/cards'] and resumed.replayed['cards'] == 2
+    assert loads == ['cards']
@@ -0,0 +1,17 @@
+# set up environment
+from src.status_server import StatusServer
+import requests
+
+# /health answers 503 with the reason once the report turns unhealthy; /status always returns the full report
+def test_health_follows_the_report():
+    state = {'healthy': True, 'status': {'cycles': 3, 'reason': None}}
+    server = StatusServer(lambda: (state['healthy'], state['status']), port=0).start()
+    try:
+        assert requests.get(f'{server.url}/health').json() == {'status': 'ok'}
+        state.update(healthy=False, status={'cycles': 3, 'reason': 'last run failed'})
+        health = requests.get(f'{server.url}/health')
+        assert health.status_code == 503 and health.json()['reason'] == 'last run failed'
+        assert requests.get(f'{server.url}/status/').json()['cycles'] == 3
+        assert requests.get(f'{server.url}/other').status_code == 404
+    finally:
+        server.stop()